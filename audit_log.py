@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Audit log of MCP tool calls
+Events are queued in memory and written in batches by a background task
+to rotating gzip-compressed JSONL files
+"""
+
+import asyncio
+import contextvars
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from result_store import encode_compact
+
+AUDIT_FILE_PATTERN = "audit-*.jsonl.gz"
+
+# Token usage of the tool call running in this context (see AuditLog.call_started)
+_call_tokens: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar("audit_call_tokens", default=None)
+
+
+def add_call_tokens(usage: Dict[str, Any]):
+    """Attribute API usage to the tool call in the current context, if any"""
+    tokens = _call_tokens.get()
+    if tokens is None:
+        return
+    for key, value in usage.items():
+        if key.endswith("_tokens") and isinstance(value, int):
+            tokens[key] = tokens.get(key, 0) + value
+
+
+def hash_arguments(arguments: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(arguments, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def iter_events(directory: str) -> Iterator[Dict[str, Any]]:
+    """Stream events from every audit file in directory, oldest file first"""
+    for path in sorted(glob.glob(os.path.join(directory, AUDIT_FILE_PATTERN))):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile):
+            continue  # a segment cut short by a crash; earlier members were already read
+
+
+class AuditLog:
+    """Non-blocking audit writer
+
+    record() only appends to an in-memory list and never waits. At most
+    max_queue events are held; further events are dropped and counted.
+    A background task flushes every flush_interval seconds, or sooner once
+    batch_size events are pending. Each flush appends one gzip member to
+    the current file, which is rotated past rotate_bytes; the oldest files
+    beyond keep_files are deleted.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_queue: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        rotate_bytes: Optional[int] = None,
+        keep_files: Optional[int] = None,
+    ):
+        self.directory = directory or os.getenv(
+            "AUDIT_LOG_DIR",
+            os.path.join(os.path.expanduser("~"), ".cache", "claude-deployment", "audit"),
+        )
+        self.enabled = self.directory.lower() != "off"
+        self.max_queue = max_queue or int(os.getenv("AUDIT_LOG_MAX_QUEUE", "10000"))
+        self.batch_size = batch_size or int(os.getenv("AUDIT_LOG_BATCH_SIZE", "500"))
+        self.flush_interval = flush_interval or float(os.getenv("AUDIT_LOG_FLUSH_INTERVAL", "2"))
+        self.rotate_bytes = rotate_bytes or int(os.getenv("AUDIT_LOG_ROTATE_BYTES", str(16 * 1024 * 1024)))
+        self.keep_files = keep_files or int(os.getenv("AUDIT_LOG_KEEP_FILES", "20"))
+        self.pending: List[Dict[str, Any]] = []
+        self.current_path: Optional[str] = None
+        # A flush interrupted by stop() keeps running in its thread; never interleave two writers
+        self._write_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "batches": 0, "rotations": 0, "write_errors": 0}
+
+    def call_started(self) -> contextvars.Token:
+        """Start collecting token usage for the tool call running in this context"""
+        return _call_tokens.set({})
+
+    def call_finished(
+        self,
+        context_token: contextvars.Token,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        seconds: float,
+        outcome: str,
+    ):
+        tokens = _call_tokens.get() or {}
+        _call_tokens.reset(context_token)
+        if not self.enabled:
+            return
+        self.record({
+            "ts": round(time.time(), 3),
+            "tool": tool_name,
+            # Hashed here so a queued event never keeps large inputs (code, logs) alive
+            "args_sha256": hash_arguments(arguments),
+            "duration_ms": round(seconds * 1000, 2),
+            "outcome": outcome,
+            "tokens": tokens,
+        })
+
+    def record(self, event: Dict[str, Any]):
+        if not self.enabled:
+            return
+        if len(self.pending) >= self.max_queue:
+            self.stats["dropped"] += 1
+            return
+        self.pending.append(event)
+        self.stats["recorded"] += 1
+        if len(self.pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _new_path(self) -> str:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+        return os.path.join(self.directory, f"audit-{stamp}-{os.getpid()}-{self.stats['rotations']}.jsonl.gz")
+
+    def _prune(self):
+        files = sorted(glob.glob(os.path.join(self.directory, AUDIT_FILE_PATTERN)), key=os.path.getmtime)
+        for path in files[:-self.keep_files]:
+            if path != self.current_path:
+                os.remove(path)
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        """Encode and append one batch (runs in a worker thread)"""
+        data = b"\n".join(encode_compact(event) for event in batch) + b"\n"
+
+        with self._write_lock:
+            self._append(data)
+
+    def _append(self, data: bytes):
+        if self.current_path is None or (
+            os.path.exists(self.current_path) and os.path.getsize(self.current_path) >= self.rotate_bytes
+        ):
+            os.makedirs(self.directory, exist_ok=True)
+            self.current_path = self._new_path()
+            self.stats["rotations"] += 1
+            self._prune()
+        # Each batch is a complete gzip member, so a crash never corrupts earlier batches
+        with open(self.current_path, "ab") as f:
+            f.write(gzip.compress(data))
+
+    async def flush(self):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+        except OSError:
+            self.stats["write_errors"] += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop the background writer and flush whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["queued"] = len(self.pending)
+        stats["enabled"] = self.enabled
+        return stats
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Query the tool call audit log written by audit_log.AuditLog
+Streams the gzip JSONL files event by event, so memory stays flat however large the logs are
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterator, Optional
+
+from audit_log import iter_events
+from server_metrics import LATENCY_BUCKETS
+
+DEFAULT_AUDIT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "claude-deployment", "audit")
+
+
+class ToolAggregate:
+    """Count, sum, max and bucketed durations; percentiles are bucket upper bounds"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.tokens = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, event: Dict[str, Any]):
+        duration_ms = float(event.get("duration_ms", 0))
+        self.count += 1
+        self.errors += event.get("outcome") != "ok"
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.tokens += sum(event.get("tokens", {}).values())
+        seconds = duration_ms / 1000
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile_ms(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets[:-1]):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS[i] * 1000
+        return self.max_ms
+
+
+def filtered(directory: str, since_hours: Optional[float], tool: Optional[str]) -> Iterator[Dict[str, Any]]:
+    cutoff = time.time() - since_hours * 3600 if since_hours else None
+    for event in iter_events(directory):
+        if cutoff is not None and event.get("ts", 0) < cutoff:
+            continue
+        if tool and event.get("tool") != tool:
+            continue
+        yield event
+
+
+def slowest_tools(args: argparse.Namespace):
+    aggregates: Dict[str, ToolAggregate] = defaultdict(ToolAggregate)
+    for event in filtered(args.dir, args.since, args.tool):
+        aggregates[event.get("tool", "?")].add(event)
+    ranked = sorted(aggregates.items(), key=lambda item: item[1].total_ms / item[1].count, reverse=True)
+
+    print(f"{'tool':<32} {'calls':>8} {'errors':>7} {'avg ms':>10} {'p95 ms <=':>10} {'max ms':>10} {'tokens':>10}")
+    for tool_name, agg in ranked[:args.top]:
+        p95 = agg.percentile_ms(0.95)
+        print(f"{tool_name:<32} {agg.count:>8} {agg.errors:>7} {agg.total_ms / agg.count:>10.1f} "
+              f"{p95:>10.0f} {agg.max_ms:>10.1f} {agg.tokens:>10}")
+
+
+def busiest_hours(args: argparse.Namespace):
+    calls: Dict[str, int] = defaultdict(int)
+    errors: Dict[str, int] = defaultdict(int)
+    for event in filtered(args.dir, args.since, args.tool):
+        hour = time.strftime("%Y-%m-%d %H:00", time.gmtime(event.get("ts", 0)))
+        calls[hour] += 1
+        errors[hour] += event.get("outcome") != "ok"
+    ranked = sorted(calls.items(), key=lambda item: item[1], reverse=True)
+
+    print(f"{'hour (UTC)':<18} {'calls':>8} {'errors':>7}")
+    for hour, count in ranked[:args.top]:
+        print(f"{hour:<18} {count:>8} {errors[hour]:>7}")
+
+
+def outcomes_by_tool(args: argparse.Namespace):
+    counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for event in filtered(args.dir, args.since, args.tool):
+        counts[event.get("tool", "?")][event.get("outcome", "?")] += 1
+    ranked = sorted(counts.items(), key=lambda item: sum(item[1].values()) - item[1].get("ok", 0), reverse=True)
+
+    print(f"{'tool':<32} {'outcome':<20} {'calls':>8}")
+    for tool_name, outcomes in ranked[:args.top]:
+        for outcome, count in sorted(outcomes.items(), key=lambda item: item[1], reverse=True):
+            print(f"{tool_name:<32} {outcome:<20} {count:>8}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Aggregate the MCP tool call audit log")
+    parser.add_argument("--dir", default=os.getenv("AUDIT_LOG_DIR", DEFAULT_AUDIT_DIR), help="Audit log directory")
+    parser.add_argument("--since", type=float, metavar="HOURS", help="Only events from the last HOURS hours")
+    parser.add_argument("--tool", help="Only events for this tool")
+    parser.add_argument("--top", type=int, default=10, help="Rows to show")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("slowest", help="Tools by average duration").set_defaults(func=slowest_tools)
+    subcommands.add_parser("busiest-hours", help="Hours with the most calls").set_defaults(func=busiest_hours)
+    subcommands.add_parser("outcomes", help="Calls per tool and outcome, tools with the most failures first").set_defaults(func=outcomes_by_tool)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if not os.path.isdir(args.dir):
+        print(f"No audit log directory at {args.dir}", file=sys.stderr)
+        sys.exit(1)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Load generator for claude_integrated_deployment.py
+Drives the server over MCP stdio with concurrent call_tool requests against a mock API
+and reports throughput and latency percentiles
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_anthropic_server import build_parser as build_mock_parser, from_args as mock_from_args
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPT = os.path.join(REPO_ROOT, "claude_integrated_deployment.py")
+
+# Error prefixes the server uses for failures reported as text
+ERROR_PREFIXES = ("Claude API Error", "Error ", "Tool '", "Invalid arguments", "Input budget exceeded", "ANTHROPIC_API_KEY not set")
+
+SAMPLE_CODE = '''def process(items):
+    result = []
+    for i in range(len(items)):
+        if items[i] != None:
+            result.append(items[i].strip().upper())
+    return result
+'''
+
+SAMPLE_LOG = '''2024-05-01T12:00:01Z ERROR deploy[4211]: container web-1 exited with code 137
+2024-05-01T12:00:01Z ERROR deploy[4211]: OOMKilled: memory limit 512Mi exceeded
+2024-05-01T12:00:02Z WARN  deploy[4211]: restarting web-1 (attempt 3/5)
+'''
+
+
+def tool_arguments(
+    tool_name: str,
+    index: int,
+    unique: bool,
+    deployment_args: Dict[str, Any],
+    input_scale: int = 1,
+    vary_details: bool = False,
+) -> Dict[str, Any]:
+    """Arguments for one call; unique=True defeats the response cache and coalescing
+
+    input_scale repeats the sample input to make it larger. With vary_details
+    the unique marker goes into a small per-call field instead of the main
+    input, so calls share their prompt prefix (prompt caching).
+    """
+    marker = f"request {index}" if unique else ""
+    suffix = f"\n# {marker}" if marker and not vary_details else ""
+    detail = f" ({marker})" if marker and vary_details else ""
+    if tool_name == "claude_code_review":
+        return {"code": SAMPLE_CODE * input_scale + suffix, "language": "python", "context": "Batch job helper" + detail}
+    if tool_name == "claude_error_diagnosis":
+        return {"error_log": SAMPLE_LOG * input_scale + suffix, "system_info": "Ubuntu 22.04, Docker 24" + detail}
+    if tool_name == "claude_optimize_config":
+        config = "FROM python:3.11\nCOPY . .\nRUN pip install -r requirements.txt\n" * input_scale
+        return {"config_content": config + suffix, "config_type": "docker", "optimization_goals": "Smaller image" + detail}
+    if tool_name == "claude_deployment_planning":
+        return {"project_type": "python web service" + suffix + detail, "requirements": "zero downtime\n" * input_scale}
+    return dict(deployment_args)
+
+
+def parse_mix(mix: str) -> List[Tuple[str, float]]:
+    weights = []
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights.append((name.strip(), float(weight or 1)))
+    return weights
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50": percentile(ordered, 0.50),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "max": round(ordered[-1], 4) if ordered else None,
+    }
+
+
+async def run_load(args: argparse.Namespace, api_url: str) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env.update({
+        "ANTHROPIC_API_KEY": env.get("BENCH_API_KEY", "mock-key"),
+        "ANTHROPIC_API_URL": api_url,
+        "CLAUDE_CACHE_PATH": os.path.join(tempfile.mkdtemp(prefix="claude-bench-"), "cache.sqlite3"),
+        "PYTHONPATH": os.pathsep.join(p for p in (REPO_ROOT, env.get("PYTHONPATH")) if p),
+    })
+    params = StdioServerParameters(command=sys.executable, args=[SERVER_SCRIPT], env=env)
+
+    mix = parse_mix(args.mix)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    rng = random.Random(args.seed)
+    plan = [rng.choices(names, weights)[0] for _ in range(args.requests)]
+    deployment_args = json.loads(args.deployment_args)
+
+    per_tool: Dict[str, List[float]] = {name: [] for name in names}
+    per_tool_errors: Dict[str, int] = {name: 0 for name in names}
+    all_latencies: List[float] = []
+    errors = 0
+
+    async with stdio_client(params) as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            init_started = time.perf_counter()
+            await session.initialize()
+            initialize_seconds = time.perf_counter() - init_started
+
+            for _ in range(args.warmup):
+                await session.call_tool(
+                    plan[0], tool_arguments(plan[0], -1, False, deployment_args, args.input_scale, args.vary_details)
+                )
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def one(index: int, tool_name: str):
+                nonlocal errors
+                arguments = tool_arguments(tool_name, index, args.unique, deployment_args, args.input_scale, args.vary_details)
+                if args.stream is not None and tool_name.startswith("claude_"):
+                    arguments["stream"] = args.stream
+                async with semaphore:
+                    started = time.perf_counter()
+                    try:
+                        result = await session.call_tool(tool_name, arguments)
+                        text = result.content[0].text if result.content else ""
+                        failed = bool(result.isError) or text.startswith(ERROR_PREFIXES)
+                    except Exception:
+                        failed = True
+                    latency = time.perf_counter() - started
+                per_tool[tool_name].append(latency)
+                all_latencies.append(latency)
+                if failed:
+                    errors += 1
+                    per_tool_errors[tool_name] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*[one(i, name) for i, name in enumerate(plan)])
+            elapsed = time.perf_counter() - started
+
+            server_metrics = None
+            try:
+                metrics = await session.read_resource("metrics://server")
+                server_metrics = json.loads(metrics.contents[0].text)
+            except Exception:
+                pass
+
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "unique": args.unique,
+            "stream": args.stream,
+            "input_scale": args.input_scale,
+            "vary_details": args.vary_details,
+        },
+        "initialize_seconds": round(initialize_seconds, 4),
+        "elapsed_seconds": round(elapsed, 3),
+        "overall": summarize(all_latencies, errors, elapsed),
+        "tools": {name: summarize(per_tool[name], per_tool_errors[name], elapsed) for name in names if per_tool[name]},
+        "server_components": server_metrics.get("components") if server_metrics else None,
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    def row(label: str, stats: Dict[str, Any], base: Optional[Dict[str, Any]]):
+        cells = [f"{label:<28}", f"{stats['requests']:>6}", f"{stats['errors']:>6}"]
+        for key in ("throughput_rps", "p50", "p95", "p99", "max"):
+            value = stats.get(key)
+            cell = "-" if value is None else f"{value:.3f}"
+            if base and base.get(key) and value is not None:
+                cell += f" ({(value - base[key]) / base[key] * 100:+.0f}%)"
+            cells.append(f"{cell:>18}")
+        print(" ".join(cells))
+
+    print(f"initialize: {report['initialize_seconds']}s, run: {report['elapsed_seconds']}s")
+    print(" ".join([f"{'tool':<28}", f"{'reqs':>6}", f"{'errors':>6}"] + [f"{k:>18}" for k in ("rps", "p50 s", "p95 s", "p99 s", "max s")]))
+    row("overall", report["overall"], baseline["overall"] if baseline else None)
+    for name, stats in report["tools"].items():
+        row(name, stats, baseline["tools"].get(name) if baseline else None)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Benchmark claude_integrated_deployment.py over MCP stdio",
+        parents=[build_mock_parser()],
+        conflict_handler="resolve",
+    )
+    parser.add_argument("--requests", type=int, default=200, help="Total call_tool requests")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent in-flight requests")
+    parser.add_argument("--mix", default="claude_code_review=2,claude_error_diagnosis=1,claude_optimize_config=1",
+                        help="Weighted tool mix, e.g. claude_code_review=3,list_containers=1")
+    parser.add_argument("--deployment-args", default="{}", help="JSON arguments for deployment tools in the mix")
+    parser.add_argument("--unique", action="store_true", help="Make every prompt unique (no cache hits or coalescing)")
+    parser.add_argument("--input-scale", type=int, default=1, help="Repeat the sample inputs this many times")
+    parser.add_argument("--vary-details", action="store_true",
+                        help="With --unique, vary a small per-call field instead of the main input (shared prompt prefix)")
+    parser.add_argument("--stream", type=lambda v: v.lower() in ("1", "true", "yes"), default=None,
+                        help="Force stream=true/false on Claude tools")
+    parser.add_argument("--warmup", type=int, default=1, help="Sequential warm-up calls before measuring")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--api-url", help="Use an already running (mock) API instead of starting one in-process")
+    parser.add_argument("--port", type=int, default=0, help="Port for the in-process mock API (0 = any free port)")
+    parser.add_argument("--json", dest="json_path", help="Write the report as JSON (use as a later --baseline)")
+    parser.add_argument("--baseline", help="Compare against a previous --json report")
+    return parser
+
+
+async def main():
+    args = build_parser().parse_args()
+    mock = None
+    api_url = args.api_url
+    if not api_url:
+        mock = mock_from_args(args)
+        api_url = await mock.start(args.host, args.port)
+    try:
+        report = await run_load(args, api_url)
+    finally:
+        if mock is not None:
+            report_mock = dict(mock.stats)
+            await mock.stop()
+    if mock is not None:
+        report["mock_api"] = report_mock
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
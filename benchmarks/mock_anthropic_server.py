@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Local mock of the Anthropic Messages API for benchmarks
+Configurable latency, token rate, streaming, rate-limit headers, prompt caching, error injection and outages
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+class MockAnthropicServer:
+    """In-process /v1/messages (+ count_tokens and batches) with fault injection
+
+    Latency model: first_byte_latency before the response starts, then
+    output_tokens generated at tokens_per_second (streamed as deltas when
+    the request asks for stream=true). Input not read from the prompt cache
+    adds prefill time at prefill_tokens_per_second (0: none). Prefixes
+    ending at a cache_control breakpoint are cached for five minutes once
+    they reach min_cache_tokens, and usage reports cache reads and writes
+    like the real API. During an outage (outage_duration
+    seconds starting outage_start seconds after start()) every request
+    fails with outage_status.
+    """
+
+    def __init__(
+        self,
+        first_byte_latency: float = 0.3,
+        latency_jitter: float = 0.1,
+        tokens_per_second: float = 200.0,
+        output_tokens: int = 150,
+        error_rate: float = 0.0,
+        error_statuses: Optional[List[int]] = None,
+        retry_after: float = 1.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 5.0,
+        requests_per_minute: int = 4000,
+        outage_start: float = 0.0,
+        outage_duration: float = 0.0,
+        outage_status: int = 503,
+        prefill_tokens_per_second: float = 0.0,
+        min_cache_tokens: int = 1024,
+    ):
+        self.first_byte_latency = first_byte_latency
+        self.latency_jitter = latency_jitter
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses or [429, 529]
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.requests_per_minute = requests_per_minute
+        self.outage_start = outage_start
+        self.outage_duration = outage_duration
+        self.outage_status = outage_status
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.min_cache_tokens = min_cache_tokens
+        # prefix digest -> monotonic expiry
+        self.prompt_cache: Dict[str, float] = {}
+        self.started_at = time.monotonic()
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"requests": 0, "streamed": 0, "injected_errors": 0, "slow_responses": 0, "count_tokens": 0, "outage_errors": 0,
+                      "cache_read_tokens": 0, "cache_write_tokens": 0}
+        self.runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/messages", self.messages)
+        app.router.add_post("/v1/messages/count_tokens", self.count_tokens)
+        app.router.add_post("/v1/messages/batches", self.create_batch)
+        app.router.add_get("/v1/messages/batches/{batch_id}", self.get_batch)
+        app.router.add_get("/v1/messages/batches/{batch_id}/results", self.batch_results)
+        app.router.add_get("/stats", self.get_stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving; returns the Messages endpoint URL"""
+        self.started_at = time.monotonic()
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound_port}/v1/messages"
+        return self.url
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def _rate_limit_headers(self) -> Dict[str, str]:
+        return {
+            "anthropic-ratelimit-requests-limit": str(self.requests_per_minute),
+            "anthropic-ratelimit-requests-remaining": str(self.requests_per_minute - 1),
+        }
+
+    @staticmethod
+    def _blocks(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """System and message content as a flat list of content blocks"""
+        blocks = []
+        for content in [body.get("system")] + [message.get("content") for message in body.get("messages", [])]:
+            if isinstance(content, str):
+                blocks.append({"type": "text", "text": content})
+            elif content:
+                blocks.extend(content)
+        return blocks
+
+    def _input_tokens(self, body: Dict[str, Any]) -> int:
+        return max(1, sum(len(json.dumps(block)) for block in self._blocks(body)) // 4)
+
+    def _prompt_usage(self, body: Dict[str, Any]) -> Dict[str, int]:
+        """Input tokens split into uncached, cache writes and cache reads"""
+        digest = hashlib.sha256(str(body.get("model")).encode("utf-8"))
+        tokens = 0
+        prefixes = []
+        breakpoints = []
+        for index, block in enumerate(self._blocks(body)):
+            digest.update(json.dumps({k: v for k, v in block.items() if k != "cache_control"}, sort_keys=True).encode("utf-8"))
+            tokens += max(1, len(json.dumps(block)) // 4)
+            prefixes.append((digest.hexdigest(), tokens))
+            if "cache_control" in block and tokens >= self.min_cache_tokens:
+                breakpoints.append((digest.hexdigest(), tokens, index))
+
+        now = time.monotonic()
+        # Like the API, each breakpoint also finds prefixes cached at up to 20 earlier block boundaries
+        lookback = {prefixes[i] for _, _, index in breakpoints for i in range(max(0, index - 20), index + 1)}
+        read = max((upto for key, upto in lookback if self.prompt_cache.get(key, 0) > now), default=0)
+        written = breakpoints[-1][1] - read if breakpoints else 0
+        for key, _, _ in breakpoints:
+            self.prompt_cache[key] = now + 300
+        self.stats["cache_read_tokens"] += read
+        self.stats["cache_write_tokens"] += written
+        return {"input_tokens": tokens - read - written, "cache_creation_input_tokens": written, "cache_read_input_tokens": read}
+
+    def _reply_text(self, body: Dict[str, Any]) -> List[str]:
+        words = [f"token{i % 50}" for i in range(min(self.output_tokens, body.get("max_tokens", self.output_tokens)))]
+        return [word + " " for word in words]
+
+    def _in_outage(self) -> bool:
+        elapsed = time.monotonic() - self.started_at
+        return self.outage_start <= elapsed < self.outage_start + self.outage_duration
+
+    async def messages(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        body = await request.json()
+
+        outage = self._in_outage()
+        if outage or random.random() < self.error_rate:
+            self.stats["outage_errors" if outage else "injected_errors"] += 1
+            status = self.outage_status if outage else random.choice(self.error_statuses)
+            error_type = {429: "rate_limit_error", 529: "overloaded_error"}.get(status, "api_error")
+            return web.json_response(
+                {"type": "error", "error": {"type": error_type, "message": "Injected by mock server"}},
+                status=status,
+                headers={"retry-after": str(self.retry_after), **self._rate_limit_headers()},
+            )
+
+        prompt_usage = self._prompt_usage(body)
+        latency = self.first_byte_latency + random.uniform(0, self.latency_jitter)
+        if self.prefill_tokens_per_second:
+            uncached = prompt_usage["input_tokens"] + prompt_usage["cache_creation_input_tokens"]
+            latency += uncached / self.prefill_tokens_per_second
+        if random.random() < self.slow_rate:
+            self.stats["slow_responses"] += 1
+            latency += self.slow_latency
+        await asyncio.sleep(latency)
+
+        pieces = self._reply_text(body)
+        usage = dict(prompt_usage, output_tokens=len(pieces))
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"
+
+        if not body.get("stream"):
+            await asyncio.sleep(len(pieces) / self.tokens_per_second)
+            return web.json_response({
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": body.get("model"),
+                "content": [{"type": "text", "text": "".join(pieces)}],
+                "stop_reason": "end_turn",
+                "usage": usage,
+            }, headers=self._rate_limit_headers())
+
+        self.stats["streamed"] += 1
+        response = web.StreamResponse(headers={"content-type": "text/event-stream", **self._rate_limit_headers()})
+        await response.prepare(request)
+
+        async def send(event: Dict[str, Any]):
+            await response.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+
+        await send({"type": "message_start", "message": {
+            "id": message_id, "type": "message", "role": "assistant", "model": body.get("model"),
+            "content": [], "usage": dict(prompt_usage, output_tokens=0),
+        }})
+        await send({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for piece in pieces:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            await send({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}})
+        await send({"type": "content_block_stop", "index": 0})
+        await send({"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": len(pieces)}})
+        await send({"type": "message_stop"})
+        await response.write_eof()
+        return response
+
+    async def count_tokens(self, request: web.Request) -> web.Response:
+        self.stats["count_tokens"] += 1
+        return web.json_response({"input_tokens": self._input_tokens(await request.json())})
+
+    async def create_batch(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        self.batches[batch_id] = {"requests": body["requests"], "created": time.monotonic()}
+        return web.json_response(self._batch_view(batch_id, request))
+
+    def _batch_view(self, batch_id: str, request: web.Request) -> Dict[str, Any]:
+        batch = self.batches[batch_id]
+        # Batches "finish" after the same latency a single interactive call would take
+        ended = time.monotonic() - batch["created"] >= self.first_byte_latency
+        count = len(batch["requests"])
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "results_url": f"{request.url.origin()}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    async def get_batch(self, request: web.Request) -> web.Response:
+        batch_id = request.match_info["batch_id"]
+        if batch_id not in self.batches:
+            return web.json_response({"type": "error", "error": {"type": "not_found_error"}}, status=404)
+        return web.json_response(self._batch_view(batch_id, request))
+
+    async def batch_results(self, request: web.Request) -> web.StreamResponse:
+        batch_id = request.match_info["batch_id"]
+        if batch_id not in self.batches:
+            return web.json_response({"type": "error", "error": {"type": "not_found_error"}}, status=404)
+        response = web.StreamResponse(headers={"content-type": "application/x-jsonl"})
+        await response.prepare(request)
+        for item in self.batches[batch_id]["requests"]:
+            pieces = self._reply_text(item["params"])
+            line = {"custom_id": item["custom_id"], "result": {"type": "succeeded", "message": {
+                "id": f"msg_{uuid.uuid4().hex[:24]}",
+                "type": "message",
+                "role": "assistant",
+                "model": item["params"].get("model"),
+                "content": [{"type": "text", "text": "".join(pieces)}],
+                "stop_reason": "end_turn",
+                "usage": {"input_tokens": self._input_tokens(item["params"]), "output_tokens": len(pieces)},
+            }}}
+            await response.write((json.dumps(line) + "\n").encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Mock Anthropic Messages API for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random extra latency (seconds)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Output generation rate")
+    parser.add_argument("--output-tokens", type=int, default=150, help="Output tokens per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-statuses", default="429,529", help="Comma-separated statuses to inject")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry-after sent with injected errors")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests that are very slow")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="Extra seconds for slow requests")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=0.0,
+                        help="Extra first-byte latency per uncached input token (0 = none)")
+    parser.add_argument("--outage-start", type=float, default=0.0, help="Seconds after start when the outage begins")
+    parser.add_argument("--outage-duration", type=float, default=0.0, help="Seconds during which every request fails")
+    parser.add_argument("--outage-status", type=int, default=503, help="Status returned during the outage")
+    return parser
+
+
+def from_args(args: argparse.Namespace) -> MockAnthropicServer:
+    return MockAnthropicServer(
+        first_byte_latency=args.latency,
+        latency_jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(",") if s],
+        retry_after=args.retry_after,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        outage_start=args.outage_start,
+        outage_duration=args.outage_duration,
+        outage_status=args.outage_status,
+        prefill_tokens_per_second=args.prefill_tokens_per_second,
+    )
+
+
+async def main():
+    args = build_parser().parse_args()
+    server = from_args(args)
+    url = await server.start(args.host, args.port)
+    print(f"Mock Anthropic API listening on {url}")
+    print(f"Run the MCP server with ANTHROPIC_API_URL={url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
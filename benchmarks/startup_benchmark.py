@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for claude_integrated_deployment.py
+Spawns a fresh server over MCP stdio per run and times initialize, list_tools
+and the first tool call; optionally profiles module imports
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load_generator import REPO_ROOT, SERVER_SCRIPT, percentile
+
+PHASES = ("initialize", "list_tools", "first_call")
+
+
+def server_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("ANTHROPIC_API_KEY", "mock-key")
+    env["CLAUDE_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="claude-startup-"), "cache.sqlite3")
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (REPO_ROOT, env.get("PYTHONPATH")) if p)
+    return env
+
+
+async def one_run(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, float]:
+    """Seconds from spawning the process to the end of each phase"""
+    params = StdioServerParameters(command=sys.executable, args=[SERVER_SCRIPT], env=server_env())
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    with open(os.devnull, "w") as errlog:  # the server prints its stats to stderr on exit
+        async with stdio_client(params, errlog=errlog) as (read_stream, write_stream):
+            async with ClientSession(read_stream, write_stream) as session:
+                await session.initialize()
+                timings["initialize"] = time.perf_counter() - started
+                await session.list_tools()
+                timings["list_tools"] = time.perf_counter() - started
+                await session.call_tool(tool_name, arguments)
+                timings["first_call"] = time.perf_counter() - started
+    return timings
+
+
+def import_profile(top: int) -> List[Dict[str, Any]]:
+    """Slowest imports (cumulative microseconds) from python -X importtime"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import claude_integrated_deployment"],
+        cwd=REPO_ROOT,
+        env=server_env(),
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append({"module": module.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    rows.sort(key=lambda row: row["cumulative_us"], reverse=True)
+    return rows[:top]
+
+
+def summarize(samples: List[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(samples)
+    return {
+        "min": round(ordered[0], 4) if ordered else None,
+        "p50": percentile(ordered, 0.50),
+        "p95": percentile(ordered, 0.95),
+        "max": round(ordered[-1], 4) if ordered else None,
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    arguments = json.loads(args.arguments)
+    samples: Dict[str, List[float]] = {phase: [] for phase in PHASES}
+    for _ in range(args.warmup):
+        await one_run(args.tool, arguments)
+    for _ in range(args.runs):
+        timings = await one_run(args.tool, arguments)
+        for phase in PHASES:
+            samples[phase].append(timings[phase])
+    report: Dict[str, Any] = {
+        "config": {"runs": args.runs, "tool": args.tool, "arguments": arguments},
+        "phases": {phase: summarize(samples[phase]) for phase in PHASES},
+    }
+    if args.imports:
+        report["slowest_imports"] = import_profile(args.imports)
+    return report
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    print(f"{report['config']['runs']} cold starts, first call: {report['config']['tool']}")
+    print(" ".join([f"{'phase (s since spawn)':<24}"] + [f"{k:>18}" for k in ("min", "p50", "p95", "max")]))
+    for phase, stats in report["phases"].items():
+        base = baseline["phases"].get(phase) if baseline else None
+        cells = [f"{phase:<24}"]
+        for key in ("min", "p50", "p95", "max"):
+            value = stats.get(key)
+            cell = "-" if value is None else f"{value:.3f}"
+            if base and base.get(key) and value is not None:
+                cell += f" ({(value - base[key]) / base[key] * 100:+.0f}%)"
+            cells.append(f"{cell:>18}")
+        print(" ".join(cells))
+    for row in report.get("slowest_imports", []):
+        print(f"  {row['cumulative_us'] / 1000:8.1f} ms  {row['module']}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Measure cold-start time of claude_integrated_deployment.py")
+    parser.add_argument("--runs", type=int, default=10, help="Measured cold starts")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured starts first (fills the OS file cache)")
+    parser.add_argument("--tool", default="claude_code_review", help="Tool for the first call")
+    parser.add_argument("--arguments", default='{"code": "x = 1", "dry_run": true}',
+                        help="JSON arguments for the first call (the default needs no API access)")
+    parser.add_argument("--imports", type=int, default=0, metavar="N", help="Also list the N slowest imports")
+    parser.add_argument("--json", dest="json_path", help="Write the report as JSON (use as a later --baseline)")
+    parser.add_argument("--baseline", help="Compare against a previous --json report")
+    return parser
+
+
+async def main():
+    args = build_parser().parse_args()
+    report = await run_benchmark(args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
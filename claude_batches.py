@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Message Batches support for offline claude_* traffic
+Submits many prompts as one batch, tracks it, and feeds results into the response cache
+"""
+
+import json
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from claude_http_client import ClaudeHTTPClient
+from claude_response_cache import ClaudeResponseCache
+
+CUSTOM_ID_PATTERN = re.compile(r"^[a-zA-Z0-9_-]{1,64}$")
+
+
+class BatchError(Exception):
+    pass
+
+
+class ClaudeBatchManager:
+    """Message Batches client with a small on-disk manifest per batch
+
+    The manifest maps each custom_id to the tool and response cache key of
+    its prompt, so results can be cached even if the server restarted
+    between submission and collection.
+    """
+
+    def __init__(
+        self,
+        http_client: ClaudeHTTPClient,
+        response_cache: ClaudeResponseCache,
+        manifest_dir: Optional[str] = None,
+    ):
+        self.http_client = http_client
+        self.response_cache = response_cache
+        self.manifest_dir = manifest_dir or os.getenv(
+            "CLAUDE_BATCH_DIR",
+            os.path.join(os.path.expanduser("~"), ".cache", "claude-deployment", "batches"),
+        )
+        self.stats = {"submitted_batches": 0, "submitted_requests": 0, "results_read": 0, "results_cached": 0}
+
+    @property
+    def batches_url(self) -> str:
+        return f"{self.http_client.api_url}/batches"
+
+    def _manifest_path(self, batch_id: str) -> str:
+        if not CUSTOM_ID_PATTERN.match(batch_id.replace("msgbatch_", "")):
+            raise BatchError(f"Invalid batch id '{batch_id}'")
+        return os.path.join(self.manifest_dir, f"{batch_id}.json")
+
+    def _load_manifest(self, batch_id: str) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path(batch_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"requests": {}}
+
+    async def submit(self, headers: Dict[str, str], requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create a batch; each request is {custom_id, tool, cache_key, params}"""
+        for request in requests:
+            if not CUSTOM_ID_PATTERN.match(request["custom_id"]):
+                raise BatchError(f"custom_id '{request['custom_id']}' must match {CUSTOM_ID_PATTERN.pattern}")
+        payload = {"requests": [{"custom_id": r["custom_id"], "params": r["params"]} for r in requests]}
+        response = await self.http_client.request_json("POST", self.batches_url, headers, payload)
+        if response.status != 200:
+            raise BatchError(f"Batch submission failed ({response.status}): {response.body}")
+
+        batch = response.json()
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        with open(self._manifest_path(batch["id"]), "w") as f:
+            json.dump({
+                "id": batch["id"],
+                "submitted_at": time.time(),
+                "requests": {r["custom_id"]: {"tool": r["tool"], "cache_key": r["cache_key"]} for r in requests},
+            }, f)
+        self.stats["submitted_batches"] += 1
+        self.stats["submitted_requests"] += len(requests)
+        return batch
+
+    async def status(self, headers: Dict[str, str], batch_id: str) -> Dict[str, Any]:
+        self._manifest_path(batch_id)
+        response = await self.http_client.request_json("GET", f"{self.batches_url}/{batch_id}", headers)
+        if response.status != 200:
+            raise BatchError(f"Batch status failed ({response.status}): {response.body}")
+        return response.json()
+
+    async def results(self, headers: Dict[str, str], batch_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield {custom_id, status, text|error} per request as the results file streams in
+
+        Succeeded results are written to the response cache under the key
+        recorded at submission time.
+        """
+        batch = await self.status(headers, batch_id)
+        if batch.get("processing_status") != "ended" or not batch.get("results_url"):
+            raise BatchError(f"Batch {batch_id} is not finished yet (status: {batch.get('processing_status')})")
+
+        manifest = self._load_manifest(batch_id)["requests"]
+        async for line in self.http_client.iter_lines(batch["results_url"], headers):
+            entry = json.loads(line)
+            result = entry.get("result", {})
+            item: Dict[str, Any] = {"custom_id": entry.get("custom_id"), "status": result.get("type")}
+            if result.get("type") == "succeeded":
+                text = "".join(
+                    block.get("text", "") for block in result["message"].get("content", []) if block.get("type") == "text"
+                )
+                item["text"] = text
+                known = manifest.get(entry.get("custom_id"))
+                if known:
+                    await self.response_cache.put(known["cache_key"], known["tool"], text)
+                    self.stats["results_cached"] += 1
+            else:
+                item["error"] = result.get("error")
+            self.stats["results_read"] += 1
+            yield item
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
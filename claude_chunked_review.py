@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Chunked (map-reduce) code review helpers
+Splits large inputs along function/class boundaries and merges per-chunk findings
+"""
+
+import ast
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+# Lines that start a new top-level definition in common non-Python languages
+DEFINITION_PATTERN = re.compile(
+    r"^(?:export\s+)?(?:default\s+)?(?:public\s+|private\s+|protected\s+|internal\s+|static\s+|async\s+|abstract\s+|final\s+)*"
+    r"(?:def|class|function|func|fn|interface|struct|enum|impl|trait|module|type|const|let|var)\b"
+)
+
+
+@dataclass
+class CodeChunk:
+    index: int
+    text: str
+    start_line: int
+    end_line: int
+    label: str
+
+
+def should_chunk_review(arguments: Dict[str, Any]) -> bool:
+    """Explicit 'chunked' argument wins; otherwise chunk inputs above CLAUDE_CHUNK_THRESHOLD characters"""
+    if "chunked" in arguments:
+        return bool(arguments["chunked"])
+    return len(arguments.get("code", "")) > int(os.getenv("CLAUDE_CHUNK_THRESHOLD", "24000"))
+
+
+def _python_segments(code: str, lines: List[str]) -> List[Tuple[int, int, str]]:
+    """(start, end, label) line ranges for top-level statements and class members"""
+    tree = ast.parse(code)
+    segments = []
+    previous_end = 0
+
+    def add(node: ast.AST, label: str):
+        nonlocal previous_end
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        # Attach leading comments/blank lines (and a class header) to the following segment
+        start = min(start, previous_end + 1)
+        end = node.end_lineno or node.lineno
+        segments.append((start, end, label))
+        previous_end = end
+
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.body:
+            # Members become separate segments so big classes split between methods
+            for member in node.body:
+                name = getattr(member, "name", None)
+                add(member, f"{node.name}.{name}" if name else f"class {node.name}")
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            add(node, f"function {node.name}")
+        else:
+            add(node, "module code")
+    if previous_end < len(lines):
+        segments.append((previous_end + 1, len(lines), "module code"))
+    return segments
+
+
+def _generic_segments(lines: List[str]) -> List[Tuple[int, int, str]]:
+    """Split where an unindented line starts a new definition"""
+    starts = [1]
+    for number, line in enumerate(lines, start=1):
+        if number > 1 and DEFINITION_PATTERN.match(line):
+            starts.append(number)
+    bounds = starts + [len(lines) + 1]
+    segments = []
+    for start, next_start in zip(bounds, bounds[1:]):
+        first = lines[start - 1].strip() if start <= len(lines) else ""
+        segments.append((start, next_start - 1, first[:60] or "code"))
+    return segments
+
+
+def split_code(code: str, language: str, max_chars: int) -> List[CodeChunk]:
+    """Split code into chunks of at most ~max_chars along definition boundaries
+
+    Adjacent small definitions are packed together; a single definition
+    larger than max_chars is cut on line boundaries.
+    """
+    lines = code.splitlines()
+    segments: List[Tuple[int, int, str]] = []
+    if language.lower() in ("python", "py", ""):
+        try:
+            segments = _python_segments(code, lines)
+        except SyntaxError:
+            segments = []
+    if not segments:
+        segments = _generic_segments(lines)
+
+    # Cut oversized segments on line boundaries
+    pieces: List[Tuple[int, int, str]] = []
+    for start, end, label in segments:
+        size = 0
+        piece_start = start
+        for number in range(start, end + 1):
+            size += len(lines[number - 1]) + 1
+            if size > max_chars and number > piece_start:
+                pieces.append((piece_start, number - 1, label))
+                piece_start, size = number, len(lines[number - 1]) + 1
+        pieces.append((piece_start, end, label))
+
+    # Pack adjacent pieces up to max_chars
+    chunks: List[CodeChunk] = []
+    group: List[Tuple[int, int, str]] = []
+    group_size = 0
+
+    def flush():
+        if group:
+            start, end = group[0][0], group[-1][1]
+            labels = [label for _, _, label in group]
+            label = labels[0] if len(labels) == 1 else f"{labels[0]} .. {labels[-1]}"
+            chunks.append(CodeChunk(len(chunks), "\n".join(lines[start - 1:end]), start, end, label))
+
+    for start, end, label in pieces:
+        size = sum(len(line) + 1 for line in lines[start - 1:end])
+        if group and group_size + size > max_chars:
+            flush()
+            group, group_size = [], 0
+        group.append((start, end, label))
+        group_size += size
+    flush()
+    return chunks
+
+
+def reduce_sections(chunks: List[CodeChunk], reviews: List[str]) -> str:
+    """The per-chunk reviews, one headed section per part"""
+    return "\n\n".join(
+        f"### Part {chunk.index + 1}: {chunk.label} (lines {chunk.start_line}-{chunk.end_line})\n{review}"
+        for chunk, review in zip(chunks, reviews)
+    )
+
+
+def build_reduce_prompt(language: str, sections: str) -> str:
+    """Merge step: one report out of the per-chunk reviews (see reduce_sections)"""
+    return f"""The following are independent reviews of consecutive parts of one {language} file.
+Merge them into a single review of the whole file. Remove duplicates, keep line references,
+and call out issues that span parts (shared state, inconsistent conventions, interface mismatches).
+
+{sections}
+
+Please provide:
+1. Code quality assessment
+2. Potential bugs or issues
+3. Performance improvements
+4. Best practices recommendations
+5. Security considerations (if applicable)
+"""
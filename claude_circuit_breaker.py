@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Circuit breaker for the Claude API
+Stops sending to a model whose recent calls mostly fail, so callers fail
+fast (or get a stale cached answer) instead of waiting out retries
+"""
+
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a model whose circuit is open"""
+
+
+def is_failure(status: Optional[int]) -> bool:
+    """Outcomes that count against the API: network errors (None) and 5xx/529; 4xx are the caller's fault"""
+    return status is None or status >= 500
+
+
+@dataclass
+class _Circuit:
+    state: str = CLOSED
+    outcomes: Deque[Tuple[float, bool]] = field(default_factory=deque)
+    opened_at: float = 0.0
+    probe_started: Optional[float] = None
+
+
+class CircuitBreaker:
+    """Per-model breaker over a sliding window of call outcomes
+
+    A model's circuit opens when, among at least min_calls outcomes in the
+    last window seconds, the failure ratio reaches error_rate. After
+    open_seconds one probe call is let through (half-open): success closes
+    the circuit, failure opens it again. A probe that never reports (its
+    caller was cancelled) is replaced after another open_seconds.
+    """
+
+    def __init__(
+        self,
+        error_rate: Optional[float] = None,
+        min_calls: Optional[int] = None,
+        window: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+        serve_stale: Optional[bool] = None,
+    ):
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv("CLAUDE_BREAKER_ERROR_RATE", "0.5"))
+        self.min_calls = min_calls or int(os.getenv("CLAUDE_BREAKER_MIN_CALLS", "10"))
+        self.window = window or float(os.getenv("CLAUDE_BREAKER_WINDOW", "60"))
+        self.open_seconds = open_seconds or float(os.getenv("CLAUDE_BREAKER_OPEN_SECONDS", "30"))
+        self.serve_stale = serve_stale if serve_stale is not None else (
+            os.getenv("CLAUDE_BREAKER_SERVE_STALE", "true").lower() in ("1", "true", "yes")
+        )
+        self.enabled = self.error_rate > 0
+        self.circuits: Dict[str, _Circuit] = {}
+        self.stats = {"trips": 0, "rejected": 0, "probes": 0, "recoveries": 0, "stale_served": 0, "failed_fast": 0}
+
+    def _circuit(self, model: str) -> _Circuit:
+        circuit = self.circuits.get(model)
+        if circuit is None:
+            circuit = self.circuits[model] = _Circuit()
+        return circuit
+
+    def is_open(self, model: str) -> bool:
+        """Whether calls to model are being refused right now (does not claim the half-open probe)"""
+        circuit = self.circuits.get(model)
+        if not self.enabled or circuit is None or circuit.state == CLOSED:
+            return False
+        now = time.monotonic()
+        if circuit.state == OPEN:
+            return now - circuit.opened_at < self.open_seconds
+        return circuit.probe_started is not None and now - circuit.probe_started < self.open_seconds
+
+    def allow(self, model: str) -> bool:
+        """Whether a call to model may be sent now (a True in half-open state is the probe)"""
+        if not self.enabled:
+            return True
+        circuit = self._circuit(model)
+        now = time.monotonic()
+        if circuit.state == OPEN and now - circuit.opened_at >= self.open_seconds:
+            circuit.state = HALF_OPEN
+            circuit.probe_started = None
+        if circuit.state == HALF_OPEN and (
+            circuit.probe_started is None or now - circuit.probe_started >= self.open_seconds
+        ):
+            circuit.probe_started = now
+            self.stats["probes"] += 1
+            return True
+        if circuit.state == CLOSED:
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def record(self, model: str, status: Optional[int]):
+        """Report the outcome of a call to model (status None for a network error)"""
+        if not self.enabled:
+            return
+        circuit = self._circuit(model)
+        now = time.monotonic()
+        failed = is_failure(status)
+        if circuit.state == HALF_OPEN:
+            if failed:
+                circuit.state, circuit.opened_at = OPEN, now
+            else:
+                circuit.state = CLOSED
+                circuit.outcomes.clear()
+                self.stats["recoveries"] += 1
+            return
+        if circuit.state == OPEN:
+            return  # a call sent before the circuit opened
+
+        circuit.outcomes.append((now, failed))
+        while circuit.outcomes and circuit.outcomes[0][0] < now - self.window:
+            circuit.outcomes.popleft()
+        failures = sum(1 for _, outcome in circuit.outcomes if outcome)
+        if len(circuit.outcomes) >= self.min_calls and failures / len(circuit.outcomes) >= self.error_rate:
+            circuit.state, circuit.opened_at = OPEN, now
+            self.stats["trips"] += 1
+
+    def retry_after(self, model: str) -> float:
+        """Seconds until model's circuit lets a probe through"""
+        circuit = self.circuits.get(model)
+        if circuit is None or circuit.state != OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - circuit.opened_at))
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.stats)
+        stats["enabled"] = self.enabled
+        stats["open_circuits"] = sum(1 for circuit in self.circuits.values() if circuit.state != CLOSED)
+        stats["states"] = {model: circuit.state for model, circuit in self.circuits.items()}
+        return stats
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Hedged Claude requests
+When a call is slower than a recent latency percentile, a duplicate is sent
+and whichever answers first is used; the other is cancelled
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from claude_http_client import ClaudeAPIResponse
+
+OnText = Callable[[str], Awaitable[None]]
+# Takes rate-limit budget and a concurrency slot for the duplicate; False when none is free
+Reserve = Callable[[], Awaitable[bool]]
+# One upstream attempt; receives the progress sink it should stream to (None for a plain request)
+Attempt = Callable[[Optional[OnText]], Awaitable[ClaudeAPIResponse]]
+
+
+class RequestHedger:
+    """Hedge slow calls once their latency passes the percentile-th recent latency
+
+    Latencies are kept per key (model and streaming mode): time to the first
+    streamed text, or to the full response. Until min_samples are known
+    nothing is hedged. At most budget (a fraction of all calls) may be
+    hedged, so a degraded API does not get twice the traffic. For streamed
+    calls the attempt that produces text first owns the progress stream and
+    the other is cancelled at that moment. With reserve/release, the
+    duplicate is only sent when reserve() grants it capacity of its own,
+    which release() returns once it finishes.
+    """
+
+    def __init__(
+        self,
+        percentile: Optional[float] = None,
+        min_delay: Optional[float] = None,
+        min_samples: Optional[int] = None,
+        budget: Optional[float] = None,
+        window: int = 500,
+    ):
+        self.percentile = percentile if percentile is not None else float(os.getenv("CLAUDE_HEDGE_PERCENTILE", "0"))
+        self.min_delay = min_delay if min_delay is not None else float(os.getenv("CLAUDE_HEDGE_MIN_DELAY", "0.25"))
+        self.min_samples = min_samples or int(os.getenv("CLAUDE_HEDGE_MIN_SAMPLES", "20"))
+        self.budget = budget if budget is not None else float(os.getenv("CLAUDE_HEDGE_BUDGET", "0.1"))
+        self.enabled = 0 < self.percentile < 1
+        self.window = window
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.stats = {
+            "requests": 0, "hedged": 0, "hedge_wins": 0, "losers_cancelled": 0,
+            "budget_exhausted": 0, "no_capacity": 0,
+        }
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples"""
+        samples = self.latencies.get(key)
+        if not self.enabled or samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return max(self.min_delay, ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))])
+
+    def observe(self, key: str, seconds: float):
+        samples = self.latencies.get(key)
+        if samples is None:
+            samples = self.latencies[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    async def run(
+        self,
+        key: str,
+        attempt: Attempt,
+        on_text: Optional[OnText] = None,
+        reserve: Optional[Reserve] = None,
+        release: Optional[Callable[[], None]] = None,
+    ) -> ClaudeAPIResponse:
+        """Run attempt, hedged with a second one if it is slow; returns the first successful response"""
+        if not self.enabled:
+            return await attempt(on_text)
+
+        self.stats["requests"] += 1
+        delay = self.hedge_delay(key)
+        started = time.monotonic()
+        tasks: List[asyncio.Task] = []
+        # Index of the attempt whose text reaches the client, and when the primary produced text
+        stream_owner: List[int] = []
+        primary_first_text: List[float] = []
+
+        def sink_for(index: int) -> Optional[OnText]:
+            if on_text is None:
+                return None
+
+            async def sink(text: str):
+                if not stream_owner:
+                    stream_owner.append(index)
+                    if index == 0:
+                        primary_first_text.append(time.monotonic() - started)
+                    for other, task in enumerate(tasks):
+                        if other != index and not task.done():
+                            task.cancel()
+                            self.stats["losers_cancelled"] += 1
+                if stream_owner[0] == index:
+                    await on_text(text)
+
+            return sink
+
+        tasks.append(asyncio.ensure_future(attempt(sink_for(0))))
+        try:
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+                if not tasks[0].done() and not stream_owner:
+                    if self.stats["hedged"] >= self.budget * self.stats["requests"]:
+                        self.stats["budget_exhausted"] += 1
+                    elif reserve is not None and not await reserve():
+                        self.stats["no_capacity"] += 1
+                    else:
+                        self.stats["hedged"] += 1
+                        hedge = asyncio.ensure_future(attempt(sink_for(1)))
+                        if reserve is not None and release is not None:
+                            # Done callbacks also run when the hedge is cancelled before it starts
+                            hedge.add_done_callback(lambda _: release())
+                        tasks.append(hedge)
+
+            winner: Optional[asyncio.Task] = None
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task in done and not task.cancelled() and task.exception() is None and task.result().status == 200:
+                        winner = task
+                        break
+            if winner is None:
+                # Nothing succeeded: report the primary's outcome (or the hedge's, if the primary was cancelled)
+                winner = next(task for task in tasks if not task.cancelled())
+
+            primary = tasks[0]
+            if winner is not primary:
+                self.stats["hedge_wins"] += 1
+            if primary_first_text:
+                self.observe(key, primary_first_text[0])
+            elif winner is not primary or (primary.exception() is None and primary.result().status == 200):
+                # A beaten primary took at least this long; keeping it stops the percentile drifting down
+                self.observe(key, time.monotonic() - started)
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    self.stats["losers_cancelled"] += 1
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.stats)
+        stats["enabled"] = self.enabled
+        stats["hedged_ratio"] = round(stats["hedged"] / stats["requests"], 3) if stats["requests"] else 0.0
+        delays = {key: self.hedge_delay(key) for key in self.latencies}
+        stats["hedge_delay_seconds"] = {key: round(delay, 3) for key, delay in delays.items() if delay is not None}
+        return stats
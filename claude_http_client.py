@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Pooled HTTP client for the Claude Messages API
+One long-lived aiohttp session shared by every claude_* tool call
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+if TYPE_CHECKING:
+    import aiohttp  # imported on first use, keeping it off the server's startup path
+
+# HTTP status reported for an error event that arrives mid-stream
+STREAM_ERROR_STATUS = {
+    "rate_limit_error": 429,
+    "overloaded_error": 529,
+    "api_error": 500,
+    "timeout_error": 504,
+}
+# HTTP status reported for a stream that ends without message_stop (connection cut mid-answer)
+TRUNCATED_STREAM_STATUS = 502
+
+
+@dataclass
+class ClaudeAPIResponse:
+    """Status, headers and raw body of one Messages API response"""
+    status: int
+    body: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    # Seconds from sending the request to receiving the response headers
+    ttfb: Optional[float] = None
+
+    def json(self) -> Dict[str, Any]:
+        return json.loads(self.body)
+
+
+class ClaudeHTTPClient:
+    """Keep-alive connection pool with DNS caching and configurable timeouts"""
+
+    def __init__(
+        self,
+        api_url: str = "https://api.anthropic.com/v1/messages",
+        limit_per_host: Optional[int] = None,
+        keepalive_timeout: Optional[float] = None,
+        dns_cache_ttl: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        total_timeout: Optional[float] = None,
+    ):
+        self.api_url = api_url
+        self.limit_per_host = limit_per_host or int(os.getenv("CLAUDE_HTTP_LIMIT_PER_HOST", "16"))
+        self.keepalive_timeout = keepalive_timeout or float(os.getenv("CLAUDE_HTTP_KEEPALIVE", "60"))
+        self.dns_cache_ttl = dns_cache_ttl or int(os.getenv("CLAUDE_HTTP_DNS_TTL", "300"))
+        self.connect_timeout = connect_timeout or float(os.getenv("CLAUDE_HTTP_CONNECT_TIMEOUT", "10"))
+        self.read_timeout = read_timeout or float(os.getenv("CLAUDE_HTTP_READ_TIMEOUT", "120"))
+        self.total_timeout = total_timeout or float(os.getenv("CLAUDE_HTTP_TOTAL_TIMEOUT", "300"))
+        self.session: Optional["aiohttp.ClientSession"] = None
+        self.stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+            "truncated_streams": 0,
+        }
+
+    def _trace_config(self) -> "aiohttp.TraceConfig":
+        """Count requests, new connections, reused connections and DNS lookups"""
+        import aiohttp
+
+        trace_config = aiohttp.TraceConfig()
+
+        def counter(key: str):
+            async def increment(session, context, params):
+                self.stats[key] += 1
+            return increment
+
+        trace_config.on_request_start.append(counter("requests"))
+        trace_config.on_connection_create_end.append(counter("connections_created"))
+        trace_config.on_connection_reuseconn.append(counter("connections_reused"))
+        trace_config.on_dns_cache_hit.append(counter("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(counter("dns_cache_misses"))
+        return trace_config
+
+    async def start(self) -> "aiohttp.ClientSession":
+        """Open the shared session (idempotent); every request calls this, so the first one opens it"""
+        if self.session is None or self.session.closed:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+                enable_cleanup_closed=True,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.total_timeout,
+                connect=self.connect_timeout,
+                sock_read=self.read_timeout,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                trace_configs=[self._trace_config()],
+            )
+        return self.session
+
+    async def close(self):
+        """Close the session and release every pooled connection"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def post_message(self, headers: Dict[str, str], payload: Dict[str, Any]) -> ClaudeAPIResponse:
+        """POST a Messages API payload over the pooled session"""
+        session = await self.start()
+        started = time.monotonic()
+        async with session.post(self.api_url, headers=headers, json=payload) as response:
+            ttfb = time.monotonic() - started
+            body = await response.text()
+            return ClaudeAPIResponse(
+                status=response.status,
+                body=body,
+                headers=dict(response.headers),
+                ttfb=ttfb,
+            )
+
+    async def request_json(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> ClaudeAPIResponse:
+        """Any other API call (e.g. Message Batches) over the pooled session"""
+        session = await self.start()
+        async with session.request(method, url, headers=headers, json=payload) as response:
+            return ClaudeAPIResponse(
+                status=response.status,
+                body=await response.text(),
+                headers=dict(response.headers),
+            )
+
+    async def iter_lines(self, url: str, headers: Dict[str, str]) -> AsyncIterator[bytes]:
+        """Yield a (JSONL) response body line by line without buffering it whole"""
+        session = await self.start()
+        async with session.get(url, headers=headers) as response:
+            if response.status != 200:
+                import aiohttp
+
+                raise aiohttp.ClientResponseError(
+                    response.request_info,
+                    response.history,
+                    status=response.status,
+                    message=await response.text(),
+                )
+            # Split chunks ourselves: result lines can exceed aiohttp's readline limit
+            buffer = b""
+            async for chunk in response.content.iter_chunked(65536):
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        yield line
+            if buffer.strip():
+                yield buffer
+
+    async def count_tokens(self, headers: Dict[str, str], payload: Dict[str, Any]) -> ClaudeAPIResponse:
+        """Exact input token count via the count_tokens endpoint (no generation)"""
+        session = await self.start()
+        request = {key: payload[key] for key in ("model", "messages", "system", "tools") if key in payload}
+        async with session.post(f"{self.api_url}/count_tokens", headers=headers, json=request) as response:
+            return ClaudeAPIResponse(
+                status=response.status,
+                body=await response.text(),
+                headers=dict(response.headers),
+            )
+
+    async def stream_message(
+        self,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        on_text: Callable[[str], Awaitable[None]],
+    ) -> ClaudeAPIResponse:
+        """POST with stream=true, forwarding text deltas to on_text as they arrive
+
+        The server-sent events are reassembled into a regular Messages API
+        body, so callers handle streamed and non-streamed responses the same way.
+        A stream that ends before message_stop is reported as a 502, never as
+        a (partial) 200 answer.
+        """
+        session = await self.start()
+        started = time.monotonic()
+        async with session.post(self.api_url, headers=headers, json={**payload, "stream": True}) as response:
+            ttfb = time.monotonic() - started
+            response_headers = dict(response.headers)
+            if response.status != 200:
+                return ClaudeAPIResponse(status=response.status, body=await response.text(), headers=response_headers, ttfb=ttfb)
+
+            message: Dict[str, Any] = {"content": [], "usage": {}}
+            text_parts = []
+            data_lines = []
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").rstrip("\r\n")
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].lstrip())
+                    continue
+                if line or not data_lines:
+                    continue
+
+                event = json.loads("\n".join(data_lines))
+                data_lines = []
+                event_type = event.get("type")
+                if event_type == "message_start":
+                    message.update({k: v for k, v in event["message"].items() if k != "content"})
+                    message["usage"] = dict(event["message"].get("usage", {}))
+                elif event_type == "content_block_delta" and event["delta"].get("type") == "text_delta":
+                    text_parts.append(event["delta"]["text"])
+                    await on_text(event["delta"]["text"])
+                elif event_type == "message_delta":
+                    message.update(event.get("delta", {}))
+                    message["usage"].update(event.get("usage", {}))
+                elif event_type == "error":
+                    error = event.get("error", {})
+                    return ClaudeAPIResponse(
+                        status=STREAM_ERROR_STATUS.get(error.get("type"), 500),
+                        body=json.dumps(event),
+                        headers=response_headers,
+                        ttfb=ttfb,
+                    )
+                elif event_type == "message_stop":
+                    break
+            else:
+                self.stats["truncated_streams"] += 1
+                return ClaudeAPIResponse(
+                    status=TRUNCATED_STREAM_STATUS,
+                    body=json.dumps({"type": "error", "error": {
+                        "type": "api_error",
+                        "message": f"stream ended before message_stop after {len(text_parts)} text deltas",
+                    }}),
+                    headers=response_headers,
+                    ttfb=ttfb,
+                )
+
+            message["content"] = [{"type": "text", "text": "".join(text_parts)}]
+            return ClaudeAPIResponse(status=200, body=json.dumps(message), headers=response_headers, ttfb=ttfb)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Connection pool counters; reuse_ratio near 1.0 means keep-alive is working"""
+        stats = dict(self.stats)
+        connections = stats["connections_created"] + stats["connections_reused"]
+        stats["reuse_ratio"] = round(stats["connections_reused"] / connections, 3) if connections else 0.0
+        stats["limit_per_host"] = self.limit_per_host
+        return stats
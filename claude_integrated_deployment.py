@@ -4,286 +4,1211 @@ Enhanced MCP Deployment Server with Claude Sonnet 4 Integration
 Adds direct Claude API access to your deployment pipeline
 """
 
+import argparse
 import asyncio
 import json
 import sys
 import os
-from typing import Any, Dict, List, Optional
-import aiohttp
-import subprocess
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 # MCP protocol imports
 from mcp.server import Server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 from mcp.server.stdio import stdio_server
-from mcp.types import (
-    Resource,
-    Tool,
-    TextContent,
-    ImageContent,
-    EmbeddedResource,
-    LoggingLevel
-)
-
-# Add tools path
+from mcp.types import Resource, Tool, TextContent
+
+# Add tools path (tools.deployment_tools is imported on first use, see deployment_manager)
 sys.path.append(r"C:\Users\Pirate\Desktop\Advanced_MCP_System")
-from tools.deployment_tools import DeploymentToolsManager
+
+from claude_http_client import ClaudeHTTPClient
+from claude_response_cache import ClaudeResponseCache, make_cache_key
+from claude_rate_limiter import ClaudeRequestScheduler
+from claude_single_flight import SingleFlight
+from claude_token_budget import TokenBudget, TokenBudgetExceeded, estimate_cost, estimate_tokens
+from claude_batches import BatchError, ClaudeBatchManager
+from claude_model_router import ModelRouter, RouteDecision
+from claude_hedging import RequestHedger
+from claude_circuit_breaker import CircuitBreaker, CircuitOpenError
+from claude_similarity_cache import SimilarityCache
+from log_digest import LogDigester
+from file_inputs import FileInput, FileInputs
+from claude_prompts import ClaudePrompt, PromptRegistry, as_prompt
+from claude_sessions import Session, SessionStore, summary_prompt
+from claude_chunked_review import build_reduce_prompt, reduce_sections, should_chunk_review, split_code
+from deployment_executor import DeploymentToolExecutor
+from tool_registry import ToolRegistry
+from tool_deadlines import TIMEOUT_ARGUMENT, TIMEOUT_PROPERTY, ToolDeadlineExceeded, ToolDeadlines
+from server_metrics import ServerMetrics
+from audit_log import AuditLog, add_call_tokens
+from result_store import RESULT_SCHEME, ResultStore
+from deployment_cli import run_bulk, run_one, with_model
+
+
+class ToolCallError(Exception):
+    """A failure a handler reports as text; outcome is what metrics, the audit log and the CLI exit status see"""
+    
+    def __init__(self, outcome: str, text: str):
+        super().__init__(text)
+        self.outcome = outcome
+        self.text = text
+
+# Outcomes of handled claude_* failures
+NO_API_KEY = "no_api_key"
+API_ERROR = "api_error"
+BUDGET_EXCEEDED = "budget_exceeded"
+INVALID_INPUT = "invalid_input"
+BATCH_ERROR = "batch_error"
+MISSING_KEY_TEXT = "ANTHROPIC_API_KEY not set. Please set your API key."
+
+@dataclass
+class ClaudeCallResult:
+    """Outcome of one request_claude call: response text, or error body if status != 200"""
+    status: int
+    text: str
+    cached: bool = False
+    model: Optional[str] = None
+    # Served from an expired cache entry because the API circuit is open
+    stale: bool = False
+    
+    def format(self, note: Optional[str] = None) -> str:
+        if self.status != 200:
+            return f"Claude API Error ({self.status}): {self.text}"
+        cache_note = "stale cache, API unavailable" if self.stale else "cached" if self.cached else None
+        notes = [n for n in (self.model, note, cache_note) if n]
+        suffix = f" ({', '.join(notes)})" if notes else ""
+        return f"Claude Sonnet 4 Response{suffix}:\n\n{self.text}"
+
+# Overloaded responses that trigger a fallback to the next model in the routing table
+OVERLOAD_STATUSES = (529,)
+# Streamed before the text of a retry (or fallback) when a failed attempt already streamed part of an answer
+STREAM_RESET_MARKER = "\n\n[stream interrupted, retrying: discard the partial answer above]\n\n"
+
+# Arguments accepted by every claude_* tool
+CLAUDE_COMMON_PROPERTIES = {
+    "bypass_cache": {"type": "boolean", "description": "Skip the response cache and fetch a fresh answer"},
+    "stream": {"type": "boolean", "description": "Stream partial output as progress notifications (default: on when a progress token is sent)"},
+    "model": {"type": "string", "description": "Preferred model id from the routing table (overrides size-based routing)"},
+    "speed": {"type": "string", "enum": ["fast", "balanced", "best"], "description": "Routing hint: pick the model of this tier"},
+    "max_output_tokens": {"type": "integer", "description": "Output token budget for this call (overrides the routing table)"},
+    "dry_run": {"type": "boolean", "description": "Report estimated input tokens and cost without calling the API"},
+    "exact_token_count": {"type": "boolean", "description": "With dry_run, also ask the count_tokens endpoint for the exact input size"}
+}
+
+# Claude integration tools
+CLAUDE_TOOL_DEFINITIONS = [
+    {
+        "name": "claude_code_review",
+        "description": "Use Claude Sonnet 4 to review code and suggest improvements",
+        "properties": {
+            "code": {"type": "string", "description": "Code to review"},
+            "paths": {"type": "array", "items": {"type": "string"}, "description": "Files or globs (e.g. src/**/*.py) under CLAUDE_FILE_ROOTS to read server-side and review one request per file, instead of code"},
+            "only_changed": {"type": "boolean", "description": "With paths, skip files unchanged since their last review (default: true)"},
+            "language": {"type": "string", "description": "Programming language (default with paths: from the file extension)"},
+            "context": {"type": "string", "description": "Additional context"},
+            "chunked": {"type": "boolean", "description": "Review large code in parallel chunks and merge the findings (default: automatic above CLAUDE_CHUNK_THRESHOLD characters)"}
+        },
+        # One of code / paths, checked by FileInputs.wants_files
+        "required": []
+    },
+    {
+        "name": "claude_deployment_planning",
+        "description": "Use Claude Sonnet 4 to create deployment strategies",
+        "properties": {
+            "project_type": {"type": "string", "description": "Type of project to deploy"},
+            "requirements": {"type": "string", "description": "Deployment requirements"},
+            "constraints": {"type": "string", "description": "Any constraints or limitations"}
+        },
+        "required": ["project_type"]
+    },
+    {
+        "name": "claude_error_diagnosis",
+        "description": "Use Claude Sonnet 4 to diagnose deployment errors",
+        "properties": {
+            "error_log": {"type": "string", "description": "Error log or message; large logs are digested first"},
+            "error_log_path": {"type": "string", "description": "Log file to read and digest instead of (or besides) error_log; must be under CLAUDE_LOG_ROOTS"},
+            "system_info": {"type": "string", "description": "System information"},
+            "deployment_context": {"type": "string", "description": "Deployment context"}
+        },
+        # One of error_log / error_log_path, checked by LogDigester.prepare
+        "required": []
+    },
+    {
+        "name": "claude_optimize_config",
+        "description": "Use Claude Sonnet 4 to optimize configuration files",
+        "properties": {
+            "config_content": {"type": "string", "description": "Configuration file content"},
+            "paths": {"type": "array", "items": {"type": "string"}, "description": "Config files or globs under CLAUDE_FILE_ROOTS to read server-side and optimize one request per file, instead of config_content"},
+            "only_changed": {"type": "boolean", "description": "With paths, skip files unchanged since their last review (default: true)"},
+            "config_type": {"type": "string", "description": "Type of config (docker, yaml, json, etc.); with paths, defaults to the file extension"},
+            "optimization_goals": {"type": "string", "description": "What to optimize for"}
+        },
+        # One of config_content (with config_type) / paths, checked by FileInputs.wants_files
+        "required": []
+    }
+]
+
+# Message Batches tools for offline traffic
+CLAUDE_BATCH_TOOL_DEFINITIONS = [
+    {
+        "name": "claude_batch_submit",
+        "description": "Submit many calls of one claude_* tool as a single Message Batch (cheaper, for offline sweeps)",
+        "properties": {
+            "tool": {"type": "string", "enum": [d["name"] for d in CLAUDE_TOOL_DEFINITIONS], "description": "Claude tool to run for every item"},
+            "items": {"type": "array", "description": "Argument objects for the tool; an optional custom_id names each result"},
+            "skip_cached": {"type": "boolean", "description": "Leave out items already in the response cache (default: true)"}
+        },
+        "required": ["tool", "items"]
+    },
+    {
+        "name": "claude_batch_status",
+        "description": "Check the processing status of a Message Batch",
+        "properties": {
+            "batch_id": {"type": "string", "description": "Batch id returned by claude_batch_submit"}
+        },
+        "required": ["batch_id"]
+    },
+    {
+        "name": "claude_batch_results",
+        "description": "Stream back the results of a finished Message Batch and add them to the response cache",
+        "properties": {
+            "batch_id": {"type": "string", "description": "Batch id returned by claude_batch_submit"},
+            "offset": {"type": "integer", "description": "Number of results to skip"},
+            "limit": {"type": "integer", "description": "Maximum number of results to return (default: 100)"}
+        },
+        "required": ["batch_id"]
+    }
+]
+
+# Multi-turn sessions: the opening call is kept server-side, follow-ups send only the new question
+CLAUDE_SESSION_TOOL_DEFINITIONS = [
+    {
+        "name": "claude_session_open",
+        "description": "Start a multi-turn session with a claude_* tool; returns the first answer and a session_id for follow-ups",
+        "properties": {
+            "tool": {"type": "string", "enum": [d["name"] for d in CLAUDE_TOOL_DEFINITIONS], "description": "Claude tool that opens the session"},
+            "arguments": {"type": "object", "description": "Arguments for the tool, as for a direct call"}
+        },
+        "required": ["tool", "arguments"]
+    },
+    {
+        "name": "claude_session_message",
+        "description": "Ask a follow-up question in a session; earlier turns are sent from server-side history",
+        "properties": {
+            "session_id": {"type": "string", "description": "Session id returned by claude_session_open"},
+            "message": {"type": "string", "description": "Follow-up question"},
+            "stream": {"type": "boolean", "description": "Stream partial output as progress notifications (default: on when a progress token is sent)"}
+        },
+        "required": ["session_id", "message"]
+    },
+    {
+        "name": "claude_session_close",
+        "description": "End a session and free its history",
+        "properties": {
+            "session_id": {"type": "string", "description": "Session id returned by claude_session_open"}
+        },
+        "required": ["session_id"]
+    }
+]
 
 class ClaudeIntegratedDeploymentServer:
     def __init__(self):
-        self.deployment_manager = DeploymentToolsManager()
+        # Built on first use so the initialize handshake does not wait for it
+        self._deployment_manager = None
+        self.deployment_executor = DeploymentToolExecutor(lambda: self.deployment_manager)
+        self.result_store = ResultStore()
         self.server = Server("claude-deployment-tools")
-        self.claude_api_url = "https://api.anthropic.com/v1/messages"
+        self.claude_api_url = os.getenv("ANTHROPIC_API_URL", "https://api.anthropic.com/v1/messages")
+        self.http_client = ClaudeHTTPClient(self.claude_api_url)
+        self.response_cache = ClaudeResponseCache()
+        self.scheduler = ClaudeRequestScheduler()
+        self.single_flight = SingleFlight()
+        self.token_budget = TokenBudget()
+        self.model_router = ModelRouter()
+        self.prompts = PromptRegistry()
+        self.sessions = SessionStore(self.summarize_session, min_cache_tokens=self.prompts.min_cache_tokens)
+        self.hedger = RequestHedger()
+        self.circuit_breaker = CircuitBreaker()
+        self.similarity_cache = SimilarityCache()
+        self.log_digester = LogDigester()
+        self.file_inputs = FileInputs()
+        self.tool_deadlines = ToolDeadlines()
+        self.batch_manager = ClaudeBatchManager(self.http_client, self.response_cache)
+        self.metrics = ServerMetrics()
+        self.audit_log = AuditLog()
+        for name, component in (
+            ("http_pool", self.http_client),
+            ("response_cache", self.response_cache),
+            ("similarity_cache", self.similarity_cache),
+            ("log_digest", self.log_digester),
+            ("file_inputs", self.file_inputs),
+            ("scheduler", self.scheduler),
+            ("single_flight", self.single_flight),
+            ("token_budget", self.token_budget),
+            ("batches", self.batch_manager),
+            ("deployment_executor", self.deployment_executor),
+            ("result_store", self.result_store),
+            ("model_router", self.model_router),
+            ("prompt_cache", self.prompts),
+            ("sessions", self.sessions),
+            ("hedging", self.hedger),
+            ("circuit_breaker", self.circuit_breaker),
+            ("deadlines", self.tool_deadlines),
+            ("audit_log", self.audit_log),
+        ):
+            self.metrics.add_source(name, component.get_stats)
+        self.progress_interval = float(os.getenv("CLAUDE_PROGRESS_INTERVAL", "0.1"))
+        self.chunk_max_chars = int(os.getenv("CLAUDE_CHUNK_MAX_CHARS", "12000"))
+        self.chunk_parallelism = int(os.getenv("CLAUDE_CHUNK_PARALLELISM", "4"))
         self.setup_tools()
     
+    @property
+    def deployment_manager(self):
+        if self._deployment_manager is None:
+            from tools.deployment_tools import DeploymentToolsManager
+            self._deployment_manager = DeploymentToolsManager()
+        return self._deployment_manager
+    
     def setup_tools(self):
         """Setup all MCP tools including Claude integration"""
         
+        self.tool_registry = ToolRegistry(
+            lambda: self.deployment_manager,
+            self.handle_deployment_tool,
+            common_properties={TIMEOUT_ARGUMENT: TIMEOUT_PROPERTY}
+        )
+        for definition in CLAUDE_TOOL_DEFINITIONS:
+            self.tool_registry.register(
+                definition["name"],
+                definition["description"],
+                {
+                    "type": "object",
+                    "properties": {**definition["properties"], **CLAUDE_COMMON_PROPERTIES},
+                    "required": definition["required"]
+                },
+                self.handle_claude_tool
+            )
+        
+        for definition in CLAUDE_BATCH_TOOL_DEFINITIONS:
+            self.tool_registry.register(
+                definition["name"],
+                definition["description"],
+                {
+                    "type": "object",
+                    "properties": definition["properties"],
+                    "required": definition["required"]
+                },
+                self.handle_batch_tool
+            )
+        
+        for definition in CLAUDE_SESSION_TOOL_DEFINITIONS:
+            self.tool_registry.register(
+                definition["name"],
+                definition["description"],
+                {
+                    "type": "object",
+                    "properties": definition["properties"],
+                    "required": definition["required"]
+                },
+                self.handle_session_tool
+            )
+        
         @self.server.list_tools()
         async def handle_list_tools() -> List[Tool]:
             """List all available deployment tools + Claude integration"""
-            tools = []
-            
-            # Original deployment tools
-            available_tools = self.deployment_manager.get_available_tools()
-            for tool_name, tool_info in available_tools.items():
-                tools.append(Tool(
-                    name=tool_name,
-                    description=tool_info["description"],
-                    inputSchema={
-                        "type": "object",
-                        "properties": tool_info.get("parameters", {}),
-                    }
-                ))
-            
-            # Claude integration tools
-            claude_tools = [
-                Tool(
-                    name="claude_code_review",
-                    description="Use Claude Sonnet 4 to review code and suggest improvements",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "code": {"type": "string", "description": "Code to review"},
-                            "language": {"type": "string", "description": "Programming language"},
-                            "context": {"type": "string", "description": "Additional context"}
-                        },
-                        "required": ["code"]
-                    }
-                ),
-                Tool(
-                    name="claude_deployment_planning",
-                    description="Use Claude Sonnet 4 to create deployment strategies",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "project_type": {"type": "string", "description": "Type of project to deploy"},
-                            "requirements": {"type": "string", "description": "Deployment requirements"},
-                            "constraints": {"type": "string", "description": "Any constraints or limitations"}
-                        },
-                        "required": ["project_type"]
-                    }
-                ),
-                Tool(
-                    name="claude_error_diagnosis",
-                    description="Use Claude Sonnet 4 to diagnose deployment errors",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "error_log": {"type": "string", "description": "Error log or message"},
-                            "system_info": {"type": "string", "description": "System information"},
-                            "deployment_context": {"type": "string", "description": "Deployment context"}
-                        },
-                        "required": ["error_log"]
-                    }
+            return self.tool_registry.list_tools()
+        
+        # Arguments are checked by the registry's precompiled validators, so skip
+        # the SDK's per-call jsonschema validation where the SDK supports that
+        try:
+            call_tool_decorator = self.server.call_tool(validate_input=False)
+        except TypeError:
+            call_tool_decorator = self.server.call_tool()
+        
+        @call_tool_decorator
+        async def handle_call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
+            """Execute deployment tools with Claude integration"""
+            content, _ = await self.execute_tool(name, arguments)
+            return content
+        
+        @self.server.list_resources()
+        async def handle_list_resources() -> List[Resource]:
+            """Expose server metrics and spilled deployment tool results as resources"""
+            stored_results = [
+                Resource(
+                    uri=uri,
+                    name=f"{entry['tool']} result",
+                    description=f"{entry['size']} bytes in {entry['pages']} pages; read with ?page=N or ?offset=&length=",
+                    mimeType="application/json",
+                    size=entry["size"]
+                )
+                for uri, entry in self.result_store.list_entries()
+            ]
+            return stored_results + [
+                Resource(
+                    uri="metrics://server",
+                    name="Server metrics",
+                    description="Per-tool calls, latency percentiles, upstream TTFB, tokens, errors, event loop lag and component stats",
+                    mimeType="application/json"
                 ),
-                Tool(
-                    name="claude_optimize_config",
-                    description="Use Claude Sonnet 4 to optimize configuration files",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "config_content": {"type": "string", "description": "Configuration file content"},
-                            "config_type": {"type": "string", "description": "Type of config (docker, yaml, json, etc.)"},
-                            "optimization_goals": {"type": "string", "description": "What to optimize for"}
-                        },
-                        "required": ["config_content", "config_type"]
-                    }
+                Resource(
+                    uri="metrics://prometheus",
+                    name="Server metrics (Prometheus)",
+                    description="The same metrics in Prometheus text exposition format",
+                    mimeType="text/plain"
                 )
             ]
-            
-            tools.extend(claude_tools)
-            return tools
+        
+        @self.server.read_resource()
+        async def handle_read_resource(uri) -> List[ReadResourceContents]:
+            """Serve metrics resources"""
+            uri = str(uri)
+            if uri == "metrics://server":
+                return [ReadResourceContents(content=json.dumps(self.metrics.snapshot(), indent=2), mime_type="application/json")]
+            if uri == "metrics://prometheus":
+                return [ReadResourceContents(content=self.metrics.to_prometheus(), mime_type="text/plain")]
+            if uri.startswith(f"{RESULT_SCHEME}://"):
+                content = await asyncio.to_thread(self.result_store.read, uri)
+                return [ReadResourceContents(content=content, mime_type="application/json")]
+            raise ValueError(f"Unknown resource: {uri}")
 
-        @self.server.call_tool()
-        async def handle_call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
-            """Execute deployment tools with Claude integration"""
+    async def execute_tool(self, name: str, arguments: Dict[str, Any]) -> Tuple[List[TextContent], str]:
+        """Validate and run one tool call under its deadline; returns the content and the call outcome
+
+        Used by the MCP call_tool handler and by the command line mode, so
+        both get the same validation, metrics and audit log.
+        """
+        
+        started = time.monotonic()
+        outcome = "ok"
+        audit_token = self.audit_log.call_started()
+        try:
+            spec = self.tool_registry.get(name)
+            if spec is None:
+                outcome = "not_found"
+                return [TextContent(
+                    type="text",
+                    text=f"Tool '{name}' not found"
+                )], outcome
             
-            try:
-                # Claude integration tools
-                if name.startswith("claude_"):
-                    return await self.handle_claude_tool(name, arguments)
-                
-                # Original deployment tools
-                elif hasattr(self.deployment_manager, name):
-                    tool_method = getattr(self.deployment_manager, name)
-                    result = tool_method(**arguments)
-                    result_text = json.dumps(result, indent=2)
-                    
-                    return [TextContent(
-                        type="text",
-                        text=result_text
-                    )]
-                else:
-                    return [TextContent(
-                        type="text",
-                        text=f"Tool '{name}' not found"
-                    )]
-                    
-            except Exception as e:
+            arguments = arguments or {}
+            errors = spec.validate(arguments)
+            if errors:
+                outcome = "invalid_arguments"
                 return [TextContent(
-                    type="text", 
-                    text=f"Error executing {name}: {str(e)}"
-                )]
+                    type="text",
+                    text=f"Invalid arguments for {name}: {'; '.join(errors)}"
+                )], outcome
+            
+            # The deadline argument is consumed here, not passed on to the tool
+            timeout = self.tool_deadlines.timeout_for(name, arguments)
+            arguments = {key: value for key, value in arguments.items() if key != TIMEOUT_ARGUMENT}
+            content = await self.tool_deadlines.run(name, timeout, spec.handler(name, arguments))
+            return content, outcome
+        
+        except ToolCallError as e:
+            outcome = e.outcome
+            return [TextContent(type="text", text=e.text)], outcome
+        except ToolDeadlineExceeded as e:
+            outcome = "timeout"
+            return [TextContent(
+                type="text",
+                text=f"Error executing {name}: {str(e)}"
+            )], outcome
+        except asyncio.CancelledError:
+            # Client sent notifications/cancelled: upstream work was aborted with us
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            outcome = "exception"
+            return [TextContent(
+                type="text", 
+                text=f"Error executing {name}: {str(e)}"
+            )], outcome
+        finally:
+            elapsed = time.monotonic() - started
+            self.metrics.record_call(name, elapsed, outcome)
+            # Only queues the event; the audit writer task does the I/O
+            self.audit_log.call_finished(audit_token, name, arguments or {}, elapsed, outcome)
+
+    async def handle_deployment_tool(self, tool_name: str, arguments: Dict[str, Any]) -> List[TextContent]:
+        """Run an original deployment tool off the event loop"""
+        
+        if not hasattr(self.deployment_manager, tool_name):
+            raise ToolCallError("not_found", f"Tool '{tool_name}' not found")
+        
+        result = await self.deployment_executor.run(tool_name, arguments)
+        # Large results are spilled to the result store and returned as a result:// URI
+        result_text = await asyncio.to_thread(self.result_store.render, tool_name, result)
+        
+        return [TextContent(
+            type="text",
+            text=result_text
+        )]
 
     async def handle_claude_tool(self, tool_name: str, arguments: Dict[str, Any]) -> List[TextContent]:
         """Handle Claude Sonnet 4 API calls"""
         
         # Get API key from environment or prompt
         api_key = os.getenv('ANTHROPIC_API_KEY')
+        digest_note = None
+        if tool_name == "claude_error_diagnosis":
+            # Long logs are mostly repeats: send counts, templates and error context instead
+            try:
+                arguments, digest_note = await asyncio.to_thread(self.log_digester.prepare, arguments)
+            except (OSError, ValueError) as e:
+                raise ToolCallError(INVALID_INPUT, f"Invalid error log input: {str(e)}")
+        try:
+            paths = None
+            if self.file_inputs.wants_files(tool_name, arguments):
+                paths = await asyncio.to_thread(self.file_inputs.resolve, arguments["paths"])
+        except (OSError, ValueError) as e:
+            raise ToolCallError(INVALID_INPUT, f"Invalid file input: {str(e)}")
+        if paths:
+            return await self.handle_file_inputs(tool_name, arguments, paths, api_key)
+        if arguments.get("dry_run"):
+            return await self.handle_dry_run(tool_name, arguments, api_key)
         if not api_key:
-            return [TextContent(
-                type="text",
-                text="ANTHROPIC_API_KEY not set. Please set your API key."
-            )]
+            raise ToolCallError(NO_API_KEY, MISSING_KEY_TEXT)
         
-        # Prepare prompts based on tool
+        try:
+            result, note = await self.call_claude_tool(tool_name, arguments, api_key, self.make_progress_forwarder(arguments))
+        except TokenBudgetExceeded as e:
+            raise ToolCallError(BUDGET_EXCEEDED, f"Input budget exceeded: {str(e)}")
+        except Exception as e:
+            raise ToolCallError(API_ERROR, f"Error calling Claude API: {str(e)}")
+        text = result.format(note=", ".join(note for note in (digest_note, note) if note) or None)
+        if result.status != 200:
+            raise ToolCallError(API_ERROR, text)
+        return [TextContent(
+            type="text",
+            text=text
+        )]
+
+    async def call_claude_tool(
+        self, tool_name: str, arguments: Dict[str, Any], api_key: str, on_text=None
+    ) -> Tuple[ClaudeCallResult, Optional[str]]:
+        """Answer one prepared claude_* call; returns the result and a note on how the input was handled"""
+        
+        if tool_name == "claude_code_review" and should_chunk_review(arguments):
+            return await self.review_in_chunks(arguments, api_key, on_text)
+        
+        # Repeats of a recent incident differ only in timestamps, PIDs, ids: answer from the similarity cache
+        fingerprint = None
+        if tool_name == "claude_error_diagnosis":
+            fingerprint = await asyncio.to_thread(self.similarity_cache.fingerprint, arguments)
+            match = None if arguments.get("bypass_cache") else self.similarity_cache.lookup(*fingerprint)
+            if match is not None:
+                diagnosis, similarity = match
+                return (
+                    ClaudeCallResult(status=200, text=diagnosis, cached=True),
+                    f"diagnosis of a near-identical log, {similarity:.0%} similar"
+                )
+        
+        # Prepare prompts based on tool, trimmed or rejected to fit the tool's input budget
+        arguments, prompt, input_tokens, budget_note = self.token_budget.apply(
+            tool_name, arguments, self.prepare_claude_prompt
+        )
+        result = await self.request_claude(
+            tool_name,
+            prompt,
+            api_key,
+            bypass_cache=bool(arguments.get("bypass_cache")),
+            on_text=on_text,
+            input_tokens=input_tokens,
+            hints=arguments
+        )
+        if fingerprint is not None and result.status == 200:
+            self.similarity_cache.add(*fingerprint, result.text)
+        return result, budget_note
+
+    async def handle_file_inputs(
+        self, tool_name: str, arguments: Dict[str, Any], paths: List[str], api_key: Optional[str]
+    ) -> List[TextContent]:
+        """Fan a paths/globs call out as one request per resolved file and aggregate the answers"""
+        
+        if not arguments.get("dry_run") and not api_key:
+            raise ToolCallError(NO_API_KEY, MISSING_KEY_TEXT)
+        only_changed = arguments.get("only_changed", True)
+        options = self.file_inputs.options_digest(tool_name, arguments)
+        semaphore = asyncio.Semaphore(self.file_inputs.parallelism)
+        on_text = self.make_progress_forwarder(arguments)
+        done = 0
+        # Outcome of every file that failed, in completion order
+        failures: List[str] = []
+        
+        async def process(path: str) -> Tuple[FileInput, Any]:
+            nonlocal done
+            async with semaphore:
+                file = await asyncio.to_thread(self.file_inputs.load, tool_name, path, only_changed, options)
+                if file.skipped:
+                    outcome: Any = file.skipped
+                elif arguments.get("dry_run"):
+                    outcome = await self.dry_run_report(tool_name, self.file_inputs.arguments_for(tool_name, arguments, file), api_key)
+                else:
+                    # The file text is only needed for this request
+                    item, file.text = self.file_inputs.arguments_for(tool_name, arguments, file), None
+                    try:
+                        result, note = await self.call_claude_tool(tool_name, item, api_key)
+                        if result.status == 200:
+                            self.file_inputs.mark_reviewed(tool_name, file, options)
+                        else:
+                            failures.append(API_ERROR)
+                        outcome = result.format(note=note)
+                    except TokenBudgetExceeded as e:
+                        failures.append(BUDGET_EXCEEDED)
+                        outcome = f"Input budget exceeded: {str(e)}"
+                    except Exception as e:
+                        failures.append(API_ERROR)
+                        outcome = f"Error calling Claude API: {str(e)}"
+            done += 1
+            if on_text is not None:
+                await on_text(f"[{done}/{len(paths)}] {path}\n")
+            return file, outcome
+        
+        outcomes = await asyncio.gather(*[process(path) for path in paths])
+        if on_text is not None:
+            await on_text(None)
+        
+        if arguments.get("dry_run"):
+            reports = [dict(report, path=file.path) for file, report in outcomes if not file.skipped]
+            totals = {
+                key: round(sum(report[key] for report in reports), 6)
+                for key in ("sent_input_tokens", "input_cost_usd", "max_total_cost_usd")
+                if all(key in report for report in reports)
+            }
+            summary = {
+                "tool": tool_name,
+                "files": reports,
+                "skipped": {file.path: outcome for file, outcome in outcomes if file.skipped},
+                "totals": totals
+            }
+            return [TextContent(type="text", text=json.dumps(summary, indent=2))]
+        
+        sections = [f"## {file.path}\n\n{outcome}" for file, outcome in outcomes if not file.skipped]
+        skipped = [f"- {file.path}: {outcome}" for file, outcome in outcomes if file.skipped]
+        header = f"{len(sections)} of {len(paths)} files sent to Claude"
+        if skipped:
+            sections.append("## Skipped\n\n" + "\n".join(skipped))
+        text = header + "\n\n" + "\n\n".join(sections)
+        if failures:
+            # Every file's answer is still returned; the call as a whole failed
+            raise ToolCallError(failures[0], text)
+        return [TextContent(
+            type="text",
+            text=text
+        )]
+
+    async def handle_dry_run(self, tool_name: str, arguments: Dict[str, Any], api_key: Optional[str]) -> List[TextContent]:
+        """Estimate input tokens and cost of a call without sending it"""
+        
+        report = await self.dry_run_report(tool_name, arguments, api_key)
+        return [TextContent(
+            type="text",
+            text=json.dumps(report, indent=2)
+        )]
+
+    async def dry_run_report(self, tool_name: str, arguments: Dict[str, Any], api_key: Optional[str]) -> Dict[str, Any]:
         prompt = self.prepare_claude_prompt(tool_name, arguments)
+        estimated = estimate_tokens(str(prompt))
+        report: Dict[str, Any] = {
+            "tool": tool_name,
+            "estimated_input_tokens": estimated,
+            "input_budget": self.token_budget.budgets.get(tool_name, {}).get("max_input_tokens"),
+        }
+        try:
+            _, prompt, fitted_tokens, note = self.token_budget.apply(tool_name, arguments, self.prepare_claude_prompt)
+            report["budget_action"] = note or "none"
+            report["sent_input_tokens"] = fitted_tokens
+            report["cacheable_prefix_tokens"] = prompt.cacheable_tokens
+        except TokenBudgetExceeded as e:
+            report["budget_action"] = f"reject: {str(e)}"
+            fitted_tokens = estimated
+        
+        route = self.model_router.route(tool_name, fitted_tokens, arguments, record=False)
+        report.update({
+            "model": route.model,
+            "routing_reason": route.reason,
+            "fallback_models": route.candidates[1:],
+            "max_output_tokens": route.max_tokens
+        })
+        
+        if arguments.get("exact_token_count"):
+            if not api_key:
+                report["exact_input_tokens"] = "unavailable: ANTHROPIC_API_KEY not set"
+            else:
+                response = await self.http_client.count_tokens(
+                    self.claude_headers(api_key),
+                    {"model": route.model, **prompt.params()}
+                )
+                if response.status == 200:
+                    report["exact_input_tokens"] = response.json()["input_tokens"]
+                    fitted_tokens = report["exact_input_tokens"]
+                else:
+                    report["exact_input_tokens"] = f"unavailable ({response.status}): {response.body}"
+        
+        report.update(estimate_cost(route.model, fitted_tokens, route.max_tokens))
+        return report
+
+    async def handle_batch_tool(self, tool_name: str, arguments: Dict[str, Any]) -> List[TextContent]:
+        """Submit, poll and collect Message Batches"""
+        
+        api_key = os.getenv('ANTHROPIC_API_KEY')
+        if not api_key:
+            raise ToolCallError(NO_API_KEY, MISSING_KEY_TEXT)
+        headers = self.claude_headers(api_key)
         
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Content-Type": "application/json",
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01"
-                }
-                
-                payload = {
-                    "model": "claude-3-5-sonnet-20241022",  # Latest Sonnet model
-                    "max_tokens": 4000,
-                    "messages": [
-                        {"role": "user", "content": prompt}
-                    ]
+            if tool_name == "claude_batch_submit":
+                report = await self.submit_batch(arguments, headers)
+            elif tool_name == "claude_batch_status":
+                report = await self.batch_manager.status(headers, arguments["batch_id"])
+            else:
+                offset = arguments.get("offset", 0)
+                limit = arguments.get("limit", 100)
+                on_text = self.make_progress_forwarder(arguments)
+                results = []
+                index = 0
+                async for item in self.batch_manager.results(headers, arguments["batch_id"]):
+                    if offset <= index < offset + limit:
+                        results.append(item)
+                        if on_text is not None:
+                            await on_text(json.dumps(item) + "\n")
+                    index += 1
+                if on_text is not None:
+                    await on_text(None)
+                report = {"batch_id": arguments["batch_id"], "total": index, "offset": offset, "results": results}
+        except BatchError as e:
+            raise ToolCallError(BATCH_ERROR, f"Batch error: {str(e)}")
+        
+        text = json.dumps(report, indent=2)
+        if report.get("rejected"):
+            # The other items were submitted; the report names the rejected ones
+            raise ToolCallError(INVALID_INPUT, text)
+        return [TextContent(
+            type="text",
+            text=text
+        )]
+
+    async def submit_batch(self, arguments: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        """Build one batch request per item, skipping items the cache can already answer"""
+        
+        tool_name = arguments["tool"]
+        spec = self.tool_registry.get(tool_name)
+        requests = []
+        cached = []
+        rejected = []
+        for index, item in enumerate(arguments["items"]):
+            item = dict(item) if isinstance(item, dict) else {}
+            custom_id = str(item.pop("custom_id", f"item-{index}"))
+            errors = spec.validate(item)
+            if errors:
+                rejected.append({"custom_id": custom_id, "error": "; ".join(errors)})
+                continue
+            try:
+                if self.file_inputs.wants_files(tool_name, item):
+                    raise ValueError("paths are not supported in batches; pass the content inline")
+                if tool_name == "claude_error_diagnosis":
+                    item, _ = await asyncio.to_thread(self.log_digester.prepare, item)
+                _, prompt, input_tokens, _ = self.token_budget.apply(tool_name, item, self.prepare_claude_prompt)
+            except (TokenBudgetExceeded, OSError, ValueError) as e:
+                rejected.append({"custom_id": custom_id, "error": str(e)})
+                continue
+            
+            # Nobody waits on batch results, so route on size and hints only
+            route = self.model_router.route(tool_name, input_tokens, item, adaptive=False)
+            cache_key = make_cache_key(route.model, route.max_tokens, prompt.params())
+            if arguments.get("skip_cached", True) and await self.response_cache.get(cache_key) is not None:
+                cached.append(custom_id)
+                continue
+            requests.append({
+                "custom_id": custom_id,
+                "tool": tool_name,
+                "cache_key": cache_key,
+                "params": {
+                    "model": route.model,
+                    "max_tokens": route.max_tokens,
+                    **prompt.params()
                 }
-                
-                async with session.post(self.claude_api_url, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        claude_response = result['content'][0]['text']
-                        
-                        return [TextContent(
-                            type="text",
-                            text=f"Claude Sonnet 4 Response:\n\n{claude_response}"
-                        )]
-                    else:
-                        error_text = await response.text()
-                        return [TextContent(
-                            type="text",
-                            text=f"Claude API Error ({response.status}): {error_text}"
-                        )]
-                        
-        except Exception as e:
-            return [TextContent(
-                type="text",
-                text=f"Error calling Claude API: {str(e)}"
-            )]
+            })
+        
+        report: Dict[str, Any] = {"submitted": len(requests), "already_cached": cached, "rejected": rejected}
+        if requests:
+            batch = await self.batch_manager.submit(headers, requests)
+            report.update({
+                "batch_id": batch["id"],
+                "processing_status": batch.get("processing_status"),
+                "request_counts": batch.get("request_counts")
+            })
+        return report
+
+    async def handle_session_tool(self, tool_name: str, arguments: Dict[str, Any]) -> List[TextContent]:
+        """Open, continue and close multi-turn sessions"""
+        
+        if tool_name == "claude_session_close":
+            session = self.sessions.close(arguments["session_id"])
+            if session is None:
+                raise ToolCallError(INVALID_INPUT, f"Unknown or expired session: {arguments['session_id']}")
+            return [TextContent(type="text", text=json.dumps(self.sessions.describe(session), indent=2))]
+        
+        api_key = os.getenv('ANTHROPIC_API_KEY')
+        if not api_key:
+            raise ToolCallError(NO_API_KEY, MISSING_KEY_TEXT)
+        
+        try:
+            if tool_name == "claude_session_open":
+                text = await self.open_session(arguments["tool"], dict(arguments["arguments"]), api_key)
+            else:
+                text = await self.continue_session(arguments, api_key)
+        except TokenBudgetExceeded as e:
+            raise ToolCallError(BUDGET_EXCEEDED, f"Input budget exceeded: {str(e)}")
+        except (OSError, ValueError) as e:
+            raise ToolCallError(INVALID_INPUT, f"Invalid session input: {str(e)}")
+        return [TextContent(type="text", text=text)]
 
-    def prepare_claude_prompt(self, tool_name: str, arguments: Dict[str, Any]) -> str:
-        """Prepare specialized prompts for different Claude tools"""
+    async def open_session(self, tool_name: str, arguments: Dict[str, Any], api_key: str) -> str:
+        """First call of a session: the normal tool prompt, answered and kept as the session's opening"""
         
-        if tool_name == "claude_code_review":
-            return f"""Please review this {arguments.get('language', 'code')} code and provide detailed feedback:
+        errors = self.tool_registry.get(tool_name).validate(arguments)
+        if errors:
+            raise ValueError(f"arguments for {tool_name}: {'; '.join(errors)}")
+        if self.file_inputs.wants_files(tool_name, arguments):
+            raise ValueError("paths are not supported in sessions; pass the content inline")
+        digest_note = None
+        if tool_name == "claude_error_diagnosis":
+            arguments, digest_note = await asyncio.to_thread(self.log_digester.prepare, arguments)
+        arguments, prompt, input_tokens, budget_note = self.token_budget.apply(
+            tool_name, arguments, self.prepare_claude_prompt
+        )
+        result = await self.request_claude(
+            tool_name,
+            prompt,
+            api_key,
+            bypass_cache=bool(arguments.get("bypass_cache")),
+            on_text=self.make_progress_forwarder(arguments),
+            input_tokens=input_tokens,
+            hints=arguments
+        )
+        if result.status != 200:
+            raise ToolCallError(API_ERROR, result.format())
+        session = self.sessions.open(tool_name, arguments, prompt, result.text, model=result.model)
+        note = ", ".join(note for note in (digest_note, budget_note) if note) or None
+        return f"Session {session.session_id} opened; ask follow-ups with claude_session_message.\n\n{result.format(note=note)}"
 
-Code:
-```{arguments.get('language', '')}
-{arguments['code']}
-```
+    async def continue_session(self, arguments: Dict[str, Any], api_key: str) -> str:
+        """Follow-up: opening exchange, compacted history and the new question in one request"""
+        
+        session = self.sessions.get(arguments["session_id"])
+        if session is None:
+            raise ValueError(f"unknown or expired session {arguments['session_id']}")
+        message = arguments["message"]
+        message_tokens = estimate_tokens(message)
+        if message_tokens > self.sessions.history_tokens:
+            raise TokenBudgetExceeded(
+                f"follow-up is ~{message_tokens} tokens, over the session history budget of {self.sessions.history_tokens}."
+            )
+        # One follow-up at a time per session (a pending compaction also holds the lock)
+        async with session.lock:
+            prompt = self.sessions.build_prompt(session, message)
+            result = await self.request_claude(
+                session.tool,
+                prompt,
+                api_key,
+                on_text=self.make_progress_forwarder(arguments),
+                hints=session.hints
+            )
+            if result.status != 200:
+                raise ToolCallError(API_ERROR, result.format())
+            self.sessions.add_turn(session, message, result.text)
+        return result.format(note=f"session turn {session.total_turns}, ~{session.history_tokens} history tokens")
 
-Context: {arguments.get('context', 'No additional context provided')}
+    async def summarize_session(self, session: Session, transcript: str) -> Optional[str]:
+        """Compaction callback: summarize folded follow-ups with the fast model tier"""
+        api_key = os.getenv('ANTHROPIC_API_KEY')
+        if not api_key:
+            return None
+        result = await self.request_claude(
+            "claude_session_summary",
+            summary_prompt(transcript, self.sessions.summary_tokens),
+            api_key,
+            hints={"speed": "fast", "max_output_tokens": self.sessions.summary_tokens}
+        )
+        return result.text if result.status == 200 else None
 
-Please provide:
-1. Code quality assessment
-2. Potential bugs or issues
-3. Performance improvements
-4. Best practices recommendations
-5. Security considerations (if applicable)
-"""
+    def claude_headers(self, api_key: str) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01"
+        }
 
-        elif tool_name == "claude_deployment_planning":
-            return f"""Create a comprehensive deployment strategy for this project:
+    async def request_claude(
+        self,
+        tool_name: str,
+        prompt: Union[str, ClaudePrompt],
+        api_key: str,
+        bypass_cache: bool = False,
+        on_text=None,
+        input_tokens: Optional[int] = None,
+        hints: Optional[Dict[str, Any]] = None
+    ) -> ClaudeCallResult:
+        """Route one prompt to a model, then send it through the response cache, single-flight and scheduler"""
+        
+        prompt = as_prompt(prompt)
+        if input_tokens is None:
+            input_tokens = estimate_tokens(str(prompt))
+        route = self.model_router.route(tool_name, input_tokens, hints)
+        self.metrics.record_route(tool_name, route.model, route.reason)
+        
+        cache_key = make_cache_key(route.model, route.max_tokens, prompt.params())
+        if bypass_cache:
+            self.response_cache.record_bypass()
+        else:
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                return ClaudeCallResult(status=200, text=cached, cached=True, model=route.model)
+        
+        headers = self.claude_headers(api_key)
+        
+        # Whether the current attempt streamed text, and whether a failed one did (so a reset marker is owed)
+        stream_state = {"started": False, "interrupted": False}
+        
+        async def stream_text(text: str):
+            if stream_state["interrupted"]:
+                stream_state["interrupted"] = False
+                await on_text(STREAM_RESET_MARKER)
+            stream_state["started"] = True
+            await on_text(text)
+        
+        def attempt_failed():
+            if stream_state["started"]:
+                stream_state["started"] = False
+                stream_state["interrupted"] = True
+        
+        async def fetch():
+            # Walk the fallback chain: on overload or an open circuit, move to the next model instead of retrying
+            model, response = route.model, None
+            for position, candidate in enumerate(route.candidates):
+                if self.circuit_breaker.is_open(candidate):
+                    self.circuit_breaker.stats["rejected"] += 1
+                    continue
+                model = candidate
+                is_last = position == len(route.candidates) - 1
+                payload = {
+                    "model": model,
+                    "max_tokens": route.max_tokens,
+                    **prompt.params()
+                }
+                
+                def attempt(text_sink, payload=payload):
+                    if text_sink is not None:
+                        return self.http_client.stream_message(headers, payload, text_sink)
+                    return self.http_client.post_message(headers, payload)
+                
+                # Upstream time of the last attempt only: scheduler queueing and retry backoff are not the model's
+                upstream = {"seconds": 0.0}
+                
+                async def send(model=model, attempt=attempt, upstream=upstream):
+                    # Every attempt, retries included, feeds the breaker; retries stop once the circuit opens
+                    if not self.circuit_breaker.allow(model):
+                        raise CircuitOpenError(model)
+                    started = time.monotonic()
+                    try:
+                        # A slow call gets a duplicate request when hedging is enabled, charged to the scheduler like any call
+                        response = await self.hedger.run(
+                            f"{model}:{'stream' if on_text else 'full'}",
+                            attempt,
+                            stream_text if on_text else None,
+                            reserve=lambda: self.scheduler.reserve_extra(input_tokens),
+                            release=self.scheduler.release_extra,
+                        )
+                    except Exception:
+                        self.circuit_breaker.record(model, None)
+                        attempt_failed()
+                        raise
+                    upstream["seconds"] = time.monotonic() - started
+                    self.circuit_breaker.record(model, response.status)
+                    if response.status != 200:
+                        attempt_failed()
+                    return response
+                
+                try:
+                    response = await self.scheduler.submit(
+                        send,
+                        input_tokens=input_tokens,
+                        no_retry_statuses=() if is_last else OVERLOAD_STATUSES
+                    )
+                except CircuitOpenError:
+                    continue
+                if response.status == 200:
+                    output_tokens = response.json().get("usage", {}).get("output_tokens", 0)
+                    self.model_router.observe(tool_name, model, upstream["seconds"], response.status, output_tokens)
+                if response.ttfb is not None:
+                    self.metrics.record_ttfb(tool_name, response.ttfb)
+                if response.status in OVERLOAD_STATUSES and not is_last:
+                    next_model = route.candidates[position + 1]
+                    self.model_router.record_fallback(model, next_model)
+                    self.metrics.record_fallback(tool_name, model, next_model)
+                    continue
+                break
+            
+            if response is None:
+                return model, None  # every candidate's circuit is open
+            if response.status == 200:
+                result = response.json()
+                self.metrics.record_usage(tool_name, result.get("usage", {}))
+                self.prompts.record_usage(tool_name, result.get("usage", {}))
+                add_call_tokens(result.get("usage", {}))
+                # A fallback model's answer is keyed by that model, so it is never served as the primary's
+                answer_key = cache_key if model == route.model else make_cache_key(model, route.max_tokens, prompt.params())
+                await self.response_cache.put(answer_key, tool_name, result['content'][0]['text'])
+            else:
+                self.metrics.record_api_error(tool_name, response.status)
+            return model, response
+        
+        # Identical concurrent calls share one upstream request (only the first streams progress)
+        model, response = await self.single_flight.run(cache_key, fetch)
+        if on_text is not None:
+            await on_text(None)
+        if response is None:
+            return await self.circuit_open_result(route, prompt, bypass_cache)
+        if response.status == 200:
+            return ClaudeCallResult(status=200, text=response.json()['content'][0]['text'], model=model)
+        return ClaudeCallResult(status=response.status, text=response.body, model=model)
 
-Project Type: {arguments['project_type']}
-Requirements: {arguments.get('requirements', 'Standard deployment')}
-Constraints: {arguments.get('constraints', 'None specified')}
+    async def circuit_open_result(self, route: RouteDecision, prompt: ClaudePrompt, bypass_cache: bool) -> ClaudeCallResult:
+        """Answer without the API: a stale cached response of any model in the chain if allowed, otherwise fail fast"""
+        models = route.candidates
+        if self.circuit_breaker.serve_stale and not bypass_cache:
+            for model in models:
+                stale = await self.response_cache.get_stale(make_cache_key(model, route.max_tokens, prompt.params()))
+                if stale is not None:
+                    self.circuit_breaker.stats["stale_served"] += 1
+                    return ClaudeCallResult(status=200, text=stale, cached=True, model=model, stale=True)
+        self.circuit_breaker.stats["failed_fast"] += 1
+        retry_after = min(self.circuit_breaker.retry_after(model) for model in models)
+        return ClaudeCallResult(
+            status=503,
+            text=f"circuit open after repeated API errors for {', '.join(models)}; retry in {retry_after:.0f}s",
+            model=models[0]
+        )
 
-Please provide:
-1. Deployment architecture recommendation
-2. Step-by-step deployment plan
-3. Required infrastructure
-4. Security considerations
-5. Monitoring and maintenance strategy
-6. Rollback procedures
-"""
+    async def review_in_chunks(self, arguments: Dict[str, Any], api_key: str, on_text=None) -> Tuple[ClaudeCallResult, Optional[str]]:
+        """Map-reduce review: review chunks concurrently, then merge the findings"""
+        
+        chunks = split_code(arguments["code"], arguments.get("language", ""), self.chunk_max_chars)
+        bypass_cache = bool(arguments.get("bypass_cache"))
+        if len(chunks) <= 1:
+            # Nothing to split (e.g. one huge minified line): the whole file is held to the tool's budget
+            arguments, prompt, input_tokens, budget_note = self.token_budget.apply(
+                "claude_code_review", arguments, self.prepare_claude_prompt
+            )
+            result = await self.request_claude(
+                "claude_code_review",
+                prompt,
+                api_key,
+                bypass_cache=bypass_cache,
+                on_text=on_text,
+                input_tokens=input_tokens,
+                hints=arguments
+            )
+            return result, budget_note
+        
+        # Every part prompt is checked before any is sent, so a rejection costs no upstream calls
+        prepared = []
+        for chunk in chunks:
+            chunk_arguments = dict(arguments)
+            chunk_arguments["code"] = chunk.text
+            chunk_arguments["context"] = (
+                f"{arguments.get('context', 'No additional context provided')}\n"
+                f"This is part {chunk.index + 1} of {len(chunks)} ({chunk.label}, lines {chunk.start_line}-{chunk.end_line}) of a larger file."
+            )
+            try:
+                _, prompt, input_tokens, _ = self.token_budget.apply(
+                    "claude_code_review", chunk_arguments, self.prepare_claude_prompt
+                )
+            except TokenBudgetExceeded as e:
+                raise TokenBudgetExceeded(f"part {chunk.index + 1} of {len(chunks)} (lines {chunk.start_line}-{chunk.end_line}): {e}") from e
+            prepared.append((prompt, input_tokens))
+        
+        semaphore = asyncio.Semaphore(self.chunk_parallelism)
+        
+        async def review_chunk(prompt: ClaudePrompt, input_tokens: int) -> ClaudeCallResult:
+            async with semaphore:
+                return await self.request_claude(
+                    "claude_code_review", prompt, api_key, bypass_cache=bypass_cache, input_tokens=input_tokens, hints=arguments
+                )
+        
+        results = await asyncio.gather(*[review_chunk(prompt, input_tokens) for prompt, input_tokens in prepared])
+        failed = [(chunk, result) for chunk, result in zip(chunks, results) if result.status != 200]
+        if failed:
+            chunk, result = failed[0]
+            return ClaudeCallResult(
+                status=result.status,
+                text=f"reviewing lines {chunk.start_line}-{chunk.end_line}: {result.text}",
+                model=result.model
+            ), None
+        
+        # The merge step is held to claude_code_review's budget too, with the part reviews in place of the code
+        language = arguments.get("language", "code")
+        try:
+            _, reduce_prompt, _, budget_note = self.token_budget.apply(
+                "claude_code_review",
+                {"code": reduce_sections(chunks, [result.text for result in results])},
+                lambda tool_name, reduce_arguments: build_reduce_prompt(language, reduce_arguments["code"]),
+            )
+        except TokenBudgetExceeded as e:
+            raise TokenBudgetExceeded(f"merging the reviews of {len(chunks)} parts: {e}") from e
+        merged = await self.request_claude(
+            "claude_code_review",
+            reduce_prompt,
+            api_key,
+            bypass_cache=bypass_cache,
+            on_text=on_text,
+            hints=arguments
+        )
+        note = f"chunked review of {len(chunks)} parts"
+        return merged, f"{note} (merge step: {budget_note})" if budget_note else note
 
-        elif tool_name == "claude_error_diagnosis":
-            return f"""Diagnose this deployment error and provide solutions:
+    def make_progress_forwarder(self, arguments: Dict[str, Any]):
+        """Build a callback that relays streamed text as MCP progress notifications
 
-Error Log:
-{arguments['error_log']}
+        Returns None when the call should not stream: either the caller passed
+        stream=false, or there is no MCP progress token to report against.
+        Text is batched so a notification goes out at most every
+        progress_interval seconds; calling the forwarder with None flushes.
+        """
+        if arguments.get("stream") is False:
+            return None
+        try:
+            ctx = self.server.request_context
+        except LookupError:
+            return None
+        progress_token = ctx.meta.progressToken if ctx.meta else None
+        if progress_token is None:
+            return None
 
-System Info: {arguments.get('system_info', 'Not provided')}
-Deployment Context: {arguments.get('deployment_context', 'Not provided')}
+        pending: List[str] = []
+        state = {"chars": 0, "last_sent": 0.0}
 
-Please provide:
-1. Root cause analysis
-2. Immediate fix recommendations
-3. Prevention strategies
-4. Related issues to check
-5. Step-by-step troubleshooting guide
-"""
+        async def forward(text: Optional[str]):
+            if text:
+                pending.append(text)
+                state["chars"] += len(text)
+            now = time.monotonic()
+            if not pending or (text is not None and now - state["last_sent"] < self.progress_interval):
+                return
+            chunk = "".join(pending)
+            pending.clear()
+            state["last_sent"] = now
+            await ctx.session.send_progress_notification(
+                progress_token,
+                state["chars"],
+                message=chunk,
+                related_request_id=str(ctx.request_id),
+            )
 
-        elif tool_name == "claude_optimize_config":
-            return f"""Optimize this {arguments['config_type']} configuration:
+        return forward
 
-Configuration:
-```{arguments['config_type']}
-{arguments['config_content']}
-```
+    def prepare_claude_prompt(self, tool_name: str, arguments: Dict[str, Any]) -> ClaudePrompt:
+        """Prepare specialized prompts for different Claude tools (see claude_prompts.DEFAULT_TEMPLATES)"""
+        return self.prompts.render(tool_name, arguments)
 
-Optimization Goals: {arguments.get('optimization_goals', 'General optimization')}
+    async def run(self, transport: Optional[str] = None, host: Optional[str] = None, port: Optional[int] = None):
+        """Run the enhanced MCP server over stdio (default) or HTTP
 
-Please provide:
-1. Optimized configuration
-2. Explanation of changes
-3. Performance impact
-4. Security improvements
-5. Best practices applied
-"""
+        In http mode one process serves any number of streamable HTTP and SSE
+        sessions, all sharing the connection pool, caches and rate limiter.
+        """
+        transport = transport or os.getenv("MCP_TRANSPORT", "stdio")
+        self.start()
+        try:
+            if transport == "http":
+                # Imported here so stdio clients do not pay for starlette/uvicorn
+                from http_transport import build_http_app, serve_http
+                session_stats: Dict[str, Any] = {}
+                self.metrics.add_source("http_transport", lambda: dict(session_stats))
+                app = build_http_app(self.server, self.metrics.to_prometheus, session_stats)
+                await serve_http(app, host, port)
+            elif transport == "stdio":
+                async with stdio_server() as (read_stream, write_stream):
+                    await self.server.run(
+                        read_stream,
+                        write_stream,
+                        self.server.create_initialization_options()
+                    )
+            else:
+                raise ValueError(f"Unknown transport '{transport}' (expected stdio or http)")
+        finally:
+            await self.close()
 
-        return f"Process this request: {json.dumps(arguments, indent=2)}"
+    def start(self):
+        """Start background tasks (metrics sampling, audit writer); the HTTP session opens on the first Claude request"""
+        self.metrics.start()
+        self.audit_log.start()
 
-    async def run(self):
-        """Run the enhanced MCP server"""
-        async with stdio_server() as (read_stream, write_stream):
-            await self.server.run(
-                read_stream,
-                write_stream,
-                self.server.create_initialization_options()
-            )
+    async def close(self):
+        await self.audit_log.stop()
+        await self.metrics.stop()
+        await self.http_client.close()
+        self.response_cache.close()
+        self.deployment_executor.shutdown(wait=False)
+        self.result_store.close()
 
-async def main():
-    """Main entry point"""
+async def main() -> int:
+    """Main entry point: the MCP server, or a direct tool call with --task/--tool/--deploy/--bulk"""
+    parser = argparse.ArgumentParser(description="MCP deployment server with Claude integration")
+    parser.add_argument("--transport", choices=["stdio", "http"], default=os.getenv("MCP_TRANSPORT", "stdio"),
+                        help="stdio for one client per process, http to serve many clients (streamable HTTP at /mcp, SSE at /sse)")
+    parser.add_argument("--host", default=os.getenv("MCP_HOST", "127.0.0.1"), help="HTTP bind address")
+    parser.add_argument("--port", type=int, default=int(os.getenv("MCP_PORT", "8000")), help="HTTP port")
+    cli = parser.add_argument_group("command line mode", "run tool calls directly instead of serving MCP")
+    mode = cli.add_mutually_exclusive_group()
+    mode.add_argument("--task", help="Plan this deployment task with claude_deployment_planning")
+    mode.add_argument("--tool", help="Call this tool once with --args")
+    mode.add_argument("--deploy", action="store_true", help="Run the 'deploy' deployment tool with --args")
+    mode.add_argument("--bulk", metavar="FILE", help='JSONL of {"tool", "arguments", "id"} calls ("-" for stdin); results are written as JSONL')
+    cli.add_argument("--args", default="{}", help="JSON arguments for --tool/--deploy")
+    cli.add_argument("--project-type", default="unspecified", help="project_type for --task")
+    cli.add_argument("--model", help="Model for claude_* calls that do not name one")
+    cli.add_argument("--parallelism", type=int, default=int(os.getenv("CLAUDE_CLI_PARALLELISM", "8")), help="Calls in flight in --bulk mode")
+    cli.add_argument("--output", metavar="FILE", help="Write results here instead of stdout")
+    args = parser.parse_args()
+    try:
+        tool_arguments = json.loads(args.args)
+    except json.JSONDecodeError as e:
+        parser.error(f"--args is not valid JSON: {e}")
+    if not isinstance(tool_arguments, dict):
+        parser.error("--args must be a JSON object")
+    
     server = ClaudeIntegratedDeploymentServer()
-    await server.run()
+    if not (args.task or args.tool or args.deploy or args.bulk):
+        await server.run(args.transport, args.host, args.port)
+        return 0
+    
+    claude_tools = [definition["name"] for definition in CLAUDE_TOOL_DEFINITIONS]
+    out = open(args.output, "w") if args.output else sys.stdout
+    server.start()
+    try:
+        if args.bulk:
+            source = sys.stdin if args.bulk == "-" else open(args.bulk)
+            try:
+                ok = await run_bulk(server, source, out, max(1, args.parallelism), args.model, claude_tools)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+        else:
+            if args.task:
+                tool, arguments = "claude_deployment_planning", {"project_type": args.project_type, "requirements": args.task}
+            else:
+                tool, arguments = args.tool or "deploy", tool_arguments
+            ok = await run_one(server, tool, with_model(tool, arguments, args.model, claude_tools), out)
+    finally:
+        await server.close()
+        if out is not sys.stdout:
+            out.close()
+    return 0 if ok else 1
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Model routing for the claude_* tools
+Picks model and output budget from a routing table, input size, latency targets and caller hints
+"""
+
+import json
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+DEFAULT_ROUTING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "claude_routing.json")
+
+# Used when no routing table file exists: the server's original fixed model and budget
+BUILTIN_ROUTING_TABLE = {
+    "models": {"claude-3-5-sonnet-20241022": {"tier": "balanced"}},
+    "fallbacks": {},
+    "default": {"latency_target_seconds": 60, "routes": [{"model": "claude-3-5-sonnet-20241022", "max_tokens": 4000}]},
+    "tools": {},
+}
+
+# Weight of the newest sample in the per-model and per-tool averages
+LATENCY_EWMA_ALPHA = 0.2
+
+
+@dataclass
+class RouteDecision:
+    model: str
+    max_tokens: int
+    reason: str
+    # model first, then its fallbacks in order
+    candidates: List[str] = field(default_factory=list)
+
+
+def load_routing_table(path: Optional[str] = None) -> Dict[str, Any]:
+    path = path or os.getenv("CLAUDE_ROUTING_TABLE", DEFAULT_ROUTING_PATH)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return BUILTIN_ROUTING_TABLE
+
+
+class ModelRouter:
+    """Routing policy: size tier -> caller hints -> latency-target downgrade -> fallback chain
+
+    The latency downgrade compares a tool's target with the model's
+    expected upstream time for that tool: the model's average seconds per
+    output token (upstream time of single attempts, no local queueing or
+    backoff) times the tool's average answer length. While a model is
+    skipped for being slow, one call every probe_seconds still goes to it
+    so its average can recover.
+    """
+
+    def __init__(self, table: Optional[Dict[str, Any]] = None, probe_seconds: Optional[float] = None):
+        self.table = table or load_routing_table()
+        self.models: Dict[str, Dict[str, Any]] = self.table.get("models", {})
+        self.fallbacks: Dict[str, List[str]] = self.table.get("fallbacks", {})
+        self.probe_seconds = probe_seconds or float(os.getenv("CLAUDE_ROUTER_PROBE_SECONDS", "30"))
+        # model -> upstream seconds per output token; tool -> output tokens per answer
+        self.seconds_per_token: Dict[str, float] = {}
+        self.output_tokens: Dict[str, float] = {}
+        # model -> when it was last sent a call despite being over a latency target
+        self.last_probe: Dict[str, float] = {}
+        self.stats = {
+            "decisions": defaultdict(int),
+            "reasons": defaultdict(int),
+            "fallbacks": defaultdict(int),
+        }
+
+    def tool_config(self, tool_name: str) -> Dict[str, Any]:
+        return self.table.get("tools", {}).get(tool_name) or self.table["default"]
+
+    def fallback_chain(self, model: str) -> List[str]:
+        chain = [model]
+        for candidate in chain:
+            for fallback in self.fallbacks.get(candidate, []):
+                if fallback not in chain:
+                    chain.append(fallback)
+        return chain
+
+    def _model_for_tier(self, tier: str) -> Optional[str]:
+        for model, info in self.models.items():
+            if info.get("tier") == tier:
+                return model
+        return None
+
+    def expected_seconds(self, tool_name: str, model: str) -> Optional[float]:
+        """Upstream time model is expected to take for an average tool_name answer (None: no samples yet)"""
+        if model not in self.seconds_per_token or tool_name not in self.output_tokens:
+            return None
+        return self.seconds_per_token[model] * self.output_tokens[tool_name]
+
+    def _too_slow(self, tool_name: str, model: str, target: float, claim_probe: bool) -> bool:
+        expected = self.expected_seconds(tool_name, model)
+        if expected is None or expected <= target:
+            return False
+        now = time.monotonic()
+        if claim_probe and now - self.last_probe.get(model, 0.0) >= self.probe_seconds:
+            self.last_probe[model] = now
+            return False
+        return True
+
+    def route(
+        self,
+        tool_name: str,
+        input_tokens: int,
+        hints: Optional[Dict[str, Any]] = None,
+        adaptive: bool = True,
+        record: bool = True,
+    ) -> RouteDecision:
+        """Choose model and max_tokens for one call
+
+        hints may carry model (explicit model id), speed (fast/balanced/best)
+        and max_output_tokens. adaptive=False skips the latency-based
+        downgrade, e.g. for batches where nobody waits on the answer;
+        record=False leaves the decision out of the stats (dry runs).
+        """
+        hints = hints or {}
+        config = self.tool_config(tool_name)
+        route = config["routes"][-1]
+        for candidate in config["routes"]:
+            if input_tokens <= candidate.get("max_input_tokens", float("inf")):
+                route = candidate
+                break
+        model = route["model"]
+        max_tokens = route["max_tokens"]
+        reason = "size"
+
+        if hints.get("model") in self.models:
+            model, reason = hints["model"], "caller_model"
+        elif hints.get("speed"):
+            tier_model = self._model_for_tier(hints["speed"])
+            if tier_model:
+                model, reason = tier_model, f"caller_speed_{hints['speed']}"
+        if isinstance(hints.get("max_output_tokens"), int) and hints["max_output_tokens"] > 0:
+            max_tokens = hints["max_output_tokens"]
+
+        target = config.get("latency_target_seconds")
+        if adaptive and reason == "size" and target:
+            # Step down the fallback chain while the model is expected to miss the target (a probe call excepted)
+            chain = self.fallback_chain(model)
+            while len(chain) > 1 and self._too_slow(tool_name, chain[0], target, claim_probe=record):
+                chain.pop(0)
+                reason = "latency_target"
+            model = chain[0]
+
+        if record:
+            self.stats["decisions"][f"{tool_name}:{model}"] += 1
+            self.stats["reasons"][reason] += 1
+        return RouteDecision(model=model, max_tokens=max_tokens, reason=reason, candidates=self.fallback_chain(model))
+
+    @staticmethod
+    def _update(averages: Dict[str, float], key: str, value: float):
+        previous = averages.get(key)
+        averages[key] = value if previous is None else LATENCY_EWMA_ALPHA * value + (1 - LATENCY_EWMA_ALPHA) * previous
+
+    def observe(self, tool_name: str, model: str, upstream_seconds: float, status: int, output_tokens: int = 0):
+        """Feed back one successful attempt: its upstream time and the number of tokens it generated"""
+        if status != 200 or output_tokens <= 0:
+            return
+        self._update(self.seconds_per_token, model, upstream_seconds / output_tokens)
+        self._update(self.output_tokens, tool_name, output_tokens)
+
+    def record_fallback(self, from_model: str, to_model: str):
+        self.stats["fallbacks"][f"{from_model}->{to_model}"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "decisions": dict(self.stats["decisions"]),
+            "reasons": dict(self.stats["reasons"]),
+            "fallbacks": dict(self.stats["fallbacks"]),
+            "seconds_per_output_token": {model: round(value, 4) for model, value in self.seconds_per_token.items()},
+            "output_tokens_per_answer": {tool: round(value, 1) for tool, value in self.output_tokens.items()},
+        }
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Prompt templates for the claude_* tools
+A tool's fixed instructions become the system prompt and its large input
+(code, log, configuration) the first user block, so repeated calls share a
+cacheable prefix; the small per-call details come last
+"""
+
+import json
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from string import Template
+from typing import Any, Dict, List, Optional, Union
+
+from claude_token_budget import estimate_tokens
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# instructions: system prompt, identical for every call of the tool
+# document: the large input; details: everything that varies from call to call
+# Placeholders are $name / ${name}; defaults fill optional arguments
+DEFAULT_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    "claude_code_review": {
+        "instructions": """You review code and provide detailed feedback.
+
+Please provide:
+1. Code quality assessment
+2. Potential bugs or issues
+3. Performance improvements
+4. Best practices recommendations
+5. Security considerations (if applicable)""",
+        "document": """Please review this code:
+
+Code:
+```${language}
+${code}
+```""",
+        "details": "Context: ${context}",
+        "defaults": {"language": "", "context": "No additional context provided"},
+    },
+    "claude_deployment_planning": {
+        "instructions": """You create comprehensive deployment strategies.
+
+Please provide:
+1. Deployment architecture recommendation
+2. Step-by-step deployment plan
+3. Required infrastructure
+4. Security considerations
+5. Monitoring and maintenance strategy
+6. Rollback procedures""",
+        "document": "Requirements: ${requirements}",
+        "details": """Project Type: ${project_type}
+Constraints: ${constraints}""",
+        "defaults": {"requirements": "Standard deployment", "constraints": "None specified"},
+    },
+    "claude_error_diagnosis": {
+        "instructions": """You diagnose deployment errors and provide solutions.
+
+Please provide:
+1. Root cause analysis
+2. Immediate fix recommendations
+3. Prevention strategies
+4. Related issues to check
+5. Step-by-step troubleshooting guide""",
+        "document": """Error Log:
+${error_log}""",
+        "details": """System Info: ${system_info}
+Deployment Context: ${deployment_context}""",
+        "defaults": {"system_info": "Not provided", "deployment_context": "Not provided"},
+    },
+    "claude_optimize_config": {
+        "instructions": """You optimize deployment and infrastructure configuration.
+
+Please provide:
+1. Optimized configuration
+2. Explanation of changes
+3. Performance impact
+4. Security improvements
+5. Best practices applied""",
+        "document": """Optimize this ${config_type} configuration:
+
+Configuration:
+```${config_type}
+${config_content}
+```""",
+        "details": "Optimization Goals: ${optimization_goals}",
+        "defaults": {"optimization_goals": "General optimization"},
+    },
+}
+
+
+@dataclass
+class ClaudePrompt:
+    """System blocks plus user content blocks, in Messages API form"""
+    system: List[Dict[str, Any]]
+    content: List[Dict[str, Any]]
+    # Estimated tokens up to the last cache_control breakpoint (0: nothing cacheable)
+    cacheable_tokens: int = 0
+    # Earlier user/assistant messages of a session, before content
+    history: List[Dict[str, Any]] = field(default_factory=list)
+
+    def params(self) -> Dict[str, Any]:
+        """The system/messages part of a Messages API request"""
+        params: Dict[str, Any] = {"messages": self.history + [{"role": "user", "content": self.content}]}
+        if self.system:
+            params["system"] = self.system
+        return params
+
+    def __str__(self) -> str:
+        blocks = self.system + [block for message in self.history for block in message["content"]] + self.content
+        return "\n\n".join(block["text"] for block in blocks)
+
+
+def as_prompt(prompt: Union[str, ClaudePrompt]) -> ClaudePrompt:
+    """Wrap a plain user prompt (e.g. the chunked review merge step)"""
+    if isinstance(prompt, ClaudePrompt):
+        return prompt
+    return ClaudePrompt(system=[], content=[{"type": "text", "text": prompt}])
+
+
+@dataclass
+class PromptTemplate:
+    instructions: str
+    document: Template
+    details: Template
+    defaults: Dict[str, str] = field(default_factory=dict)
+    # Computed once: the system prompt never changes
+    instruction_tokens: int = 0
+
+
+class PromptRegistry:
+    """Per-tool templates compiled once, plus prompt cache statistics from API usage
+
+    Templates can be overridden per tool from the JSON file named by
+    CLAUDE_PROMPT_TEMPLATES (same keys as DEFAULT_TEMPLATES). A block gets a
+    cache_control breakpoint once the prompt up to and including it reaches
+    min_cache_tokens; the API does not cache shorter prefixes anyway.
+    """
+
+    def __init__(self, overrides_path: Optional[str] = None, min_cache_tokens: Optional[int] = None):
+        self.min_cache_tokens = min_cache_tokens or int(os.getenv("CLAUDE_PROMPT_CACHE_MIN_TOKENS", "1024"))
+        definitions = {tool: dict(definition) for tool, definition in DEFAULT_TEMPLATES.items()}
+        overrides_path = overrides_path or os.getenv("CLAUDE_PROMPT_TEMPLATES")
+        if overrides_path:
+            with open(overrides_path) as f:
+                for tool, definition in json.load(f).items():
+                    definitions.setdefault(tool, {}).update(definition)
+        self.templates = {tool: self.compile(definition) for tool, definition in definitions.items()}
+        self.usage: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    @staticmethod
+    def compile(definition: Dict[str, Any]) -> PromptTemplate:
+        return PromptTemplate(
+            instructions=definition["instructions"],
+            document=Template(definition["document"]),
+            details=Template(definition.get("details", "")),
+            defaults=dict(definition.get("defaults", {})),
+            instruction_tokens=estimate_tokens(definition["instructions"]),
+        )
+
+    def render(self, tool_name: str, arguments: Dict[str, Any]) -> ClaudePrompt:
+        template = self.templates.get(tool_name)
+        if template is None:
+            return as_prompt(f"Process this request: {json.dumps(arguments, indent=2)}")
+
+        values = dict(template.defaults)
+        values.update({key: str(value) for key, value in arguments.items()})
+        document = template.document.safe_substitute(values)
+        details = template.details.safe_substitute(values)
+
+        system_block: Dict[str, Any] = {"type": "text", "text": template.instructions}
+        document_block: Dict[str, Any] = {"type": "text", "text": document}
+        cacheable_tokens = 0
+        if template.instruction_tokens >= self.min_cache_tokens:
+            system_block["cache_control"] = CACHE_CONTROL
+            cacheable_tokens = template.instruction_tokens
+        prefix_tokens = template.instruction_tokens + estimate_tokens(document)
+        if prefix_tokens >= self.min_cache_tokens:
+            document_block["cache_control"] = CACHE_CONTROL
+            cacheable_tokens = prefix_tokens
+
+        content = [document_block]
+        if details.strip():
+            content.append({"type": "text", "text": details})
+        return ClaudePrompt(system=[system_block], content=content, cacheable_tokens=cacheable_tokens)
+
+    def record_usage(self, tool_name: str, usage: Dict[str, Any]):
+        """Count prompt cache reads and writes reported in a response's usage block"""
+        counters = self.usage[tool_name]
+        counters["requests"] += 1
+        read = usage.get("cache_read_input_tokens") or 0
+        written = usage.get("cache_creation_input_tokens") or 0
+        counters["cache_hits"] += read > 0
+        counters["cache_writes"] += written > 0
+        counters["cache_read_input_tokens"] += read
+        counters["cache_creation_input_tokens"] += written
+        counters["uncached_input_tokens"] += usage.get("input_tokens") or 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        totals: Dict[str, Any] = defaultdict(int)
+        for counters in self.usage.values():
+            for key, value in counters.items():
+                totals[key] += value
+        stats: Dict[str, Any] = {
+            key: totals[key] for key in (
+                "requests", "cache_hits", "cache_writes",
+                "cache_read_input_tokens", "cache_creation_input_tokens", "uncached_input_tokens",
+            )
+        }
+        input_tokens = stats["cache_read_input_tokens"] + stats["cache_creation_input_tokens"] + stats["uncached_input_tokens"]
+        stats["hit_ratio"] = round(stats["cache_hits"] / stats["requests"], 3) if stats["requests"] else 0.0
+        stats["cached_input_ratio"] = round(stats["cache_read_input_tokens"] / input_tokens, 3) if input_tokens else 0.0
+        stats["tools"] = {tool: dict(counters) for tool, counters in self.usage.items()}
+        return stats
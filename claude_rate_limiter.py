@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Adaptive rate limiting and retries for Claude API calls
+Token buckets follow the anthropic-ratelimit-* response headers
+"""
+
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple, Type
+
+from claude_http_client import ClaudeAPIResponse
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504, 529}
+
+
+def network_errors() -> Tuple[Type[BaseException], ...]:
+    """Exceptions retried like a 5xx; aiohttp is loaded by the first request anyway"""
+    import aiohttp
+
+    return (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+class TokenBucket:
+    """Classic token bucket; capacity and refill rate can be retuned at runtime"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def delay_for(self, cost: float) -> float:
+        """Seconds until cost tokens are available (0 if they are available now)"""
+        self._refill()
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.refill_per_second
+
+    def consume(self, cost: float):
+        self._refill()
+        self.tokens -= min(cost, self.capacity)
+
+    def sync(self, limit: float, remaining: float, reset_in: Optional[float]):
+        """Adopt the server's view of the limit; limits are per minute"""
+        self._refill()
+        self.capacity = limit
+        self.refill_per_second = limit / 60.0
+        self.tokens = min(remaining, limit)
+        if reset_in is not None and remaining <= 0:
+            # Nothing left until the window resets: hold the bucket empty until then
+            self.tokens = -reset_in * self.refill_per_second
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds until an RFC 3339 reset timestamp"""
+    if not value:
+        return None
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class ClaudeRequestScheduler:
+    """Bounded concurrency + header-driven token buckets + jittered exponential backoff"""
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        requests_per_minute: Optional[float] = None,
+        input_tokens_per_minute: Optional[float] = None,
+    ):
+        self.max_concurrency = max_concurrency or int(os.getenv("CLAUDE_MAX_CONCURRENCY", "8"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("CLAUDE_MAX_RETRIES", "4"))
+        self.base_delay = base_delay or float(os.getenv("CLAUDE_RETRY_BASE_DELAY", "1.0"))
+        self.max_delay = max_delay or float(os.getenv("CLAUDE_RETRY_MAX_DELAY", "60"))
+        rpm = requests_per_minute or float(os.getenv("CLAUDE_REQUESTS_PER_MINUTE", "50"))
+        itpm = input_tokens_per_minute or float(os.getenv("CLAUDE_INPUT_TOKENS_PER_MINUTE", "40000"))
+        self.request_bucket = TokenBucket(rpm, rpm / 60.0)
+        self.input_token_bucket = TokenBucket(itpm, itpm / 60.0)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._bucket_lock = asyncio.Lock()
+        self.in_flight = 0
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "retryable_failures": 0,
+            "gave_up": 0,
+            "throttle_waits": 0,
+            "throttle_wait_seconds": 0.0,
+            "backoff_seconds": 0.0,
+            "max_in_flight": 0,
+            "cancelled": 0,
+            "extra_requests": 0,
+            "extra_refused": 0,
+        }
+
+    async def _acquire_budget(self, input_tokens: int):
+        """Wait until both buckets can cover this request, then spend from them"""
+        async with self._bucket_lock:
+            while True:
+                delay = max(
+                    self.request_bucket.delay_for(1),
+                    self.input_token_bucket.delay_for(input_tokens),
+                )
+                if delay <= 0:
+                    break
+                self.stats["throttle_waits"] += 1
+                self.stats["throttle_wait_seconds"] += delay
+                await asyncio.sleep(delay)
+            self.request_bucket.consume(1)
+            self.input_token_bucket.consume(input_tokens)
+
+    def _observe_headers(self, headers: Dict[str, str]):
+        """Retune the buckets from anthropic-ratelimit-* headers"""
+        lowered = {k.lower(): v for k, v in headers.items()}
+        for prefix, bucket in (
+            ("anthropic-ratelimit-requests", self.request_bucket),
+            ("anthropic-ratelimit-input-tokens", self.input_token_bucket),
+        ):
+            try:
+                limit = float(lowered[f"{prefix}-limit"])
+                remaining = float(lowered[f"{prefix}-remaining"])
+            except (KeyError, ValueError):
+                continue
+            if limit > 0:
+                bucket.sync(limit, remaining, _parse_reset(lowered.get(f"{prefix}-reset")))
+
+    def _backoff(self, attempt: int, headers: Dict[str, str]) -> float:
+        """Full-jitter exponential backoff, never shorter than retry-after"""
+        lowered = {k.lower(): v for k, v in headers.items()}
+        jittered = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = _parse_retry_after(lowered.get("retry-after"))
+        if retry_after is not None:
+            return max(retry_after, jittered)
+        return jittered
+
+    async def submit(
+        self,
+        send: Callable[[], Awaitable[ClaudeAPIResponse]],
+        input_tokens: int = 0,
+        no_retry_statuses: Iterable[int] = (),
+    ) -> ClaudeAPIResponse:
+        """Run send() under the rate limits, retrying retryable failures
+
+        send is called again for every attempt. The last response is returned
+        once retries are exhausted; the last network error is re-raised.
+        Statuses in no_retry_statuses are returned immediately so the caller
+        can react (e.g. fall back to another model on overload).
+        """
+        retryable = RETRYABLE_STATUSES.difference(no_retry_statuses)
+        retryable_errors = network_errors()
+        self.stats["requests"] += 1
+        attempt = 0
+        while True:
+            await self._acquire_budget(input_tokens)
+            async with self.semaphore:
+                self.in_flight += 1
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+                try:
+                    response = await send()
+                    error: Optional[BaseException] = None
+                except retryable_errors as e:
+                    response, error = None, e
+                except asyncio.CancelledError:
+                    # Caller gave up or hit its deadline: the aborted request frees its slot now
+                    self.stats["cancelled"] += 1
+                    raise
+                finally:
+                    self.in_flight -= 1
+
+            headers = response.headers if response is not None else {}
+            self._observe_headers(headers)
+            if response is not None and response.status not in retryable:
+                return response
+
+            self.stats["retryable_failures"] += 1
+            if attempt >= self.max_retries:
+                self.stats["gave_up"] += 1
+                if error is not None:
+                    raise error
+                return response
+
+            delay = self._backoff(attempt, headers)
+            self.stats["retries"] += 1
+            self.stats["backoff_seconds"] += delay
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def reserve_extra(self, input_tokens: int = 0) -> bool:
+        """Charge an extra request (a hedge) to the buckets and take a concurrency slot, only if both are free now
+
+        Never waits: an extra request that has to queue behind other calls
+        is not worth sending. Pair a True result with release_extra().
+        """
+        if self.semaphore.locked() or self._bucket_lock.locked():
+            self.stats["extra_refused"] += 1
+            return False
+        if self.request_bucket.delay_for(1) > 0 or self.input_token_bucket.delay_for(input_tokens) > 0:
+            self.stats["extra_refused"] += 1
+            return False
+        self.request_bucket.consume(1)
+        self.input_token_bucket.consume(input_tokens)
+        # The semaphore is not locked, so this returns without suspending
+        await self.semaphore.acquire()
+        self.stats["extra_requests"] += 1
+        self.in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+        return True
+
+    def release_extra(self):
+        self.in_flight -= 1
+        self.semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["in_flight"] = self.in_flight
+        stats["max_concurrency"] = self.max_concurrency
+        stats["requests_per_minute_limit"] = self.request_bucket.capacity
+        stats["input_tokens_per_minute_limit"] = self.input_token_bucket.capacity
+        return stats
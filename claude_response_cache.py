@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Response cache for the claude_* tools
+In-memory LRU tier in front of a SQLite tier that survives restarts
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Seconds a cached answer stays valid, per tool
+DEFAULT_TOOL_TTLS = {
+    "claude_code_review": 24 * 3600,
+    "claude_deployment_planning": 6 * 3600,
+    "claude_error_diagnosis": 3600,
+    "claude_optimize_config": 24 * 3600,
+}
+DEFAULT_TTL = 3600
+
+
+def make_cache_key(model: str, max_tokens: int, prompt: Any) -> str:
+    """Stable hash of everything that determines the API answer"""
+    material = json.dumps([model, max_tokens, prompt], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ClaudeResponseCache:
+    """Two-tier LRU/TTL cache: OrderedDict in memory, SQLite on disk"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_memory_entries: Optional[int] = None,
+        max_disk_entries: Optional[int] = None,
+        tool_ttls: Optional[Dict[str, int]] = None,
+        stale_seconds: Optional[float] = None,
+    ):
+        self.path = path or os.getenv(
+            "CLAUDE_CACHE_PATH",
+            os.path.join(os.path.expanduser("~"), ".cache", "claude-deployment", "responses.sqlite3"),
+        )
+        self.max_memory_entries = max_memory_entries or int(os.getenv("CLAUDE_CACHE_MEMORY_ENTRIES", "256"))
+        self.max_disk_entries = max_disk_entries or int(os.getenv("CLAUDE_CACHE_DISK_ENTRIES", "5000"))
+        self.tool_ttls = dict(DEFAULT_TOOL_TTLS)
+        self.tool_ttls.update(tool_ttls or {})
+        # Expired answers stay on disk this long, for get_stale() while the API is down
+        self.stale_seconds = stale_seconds if stale_seconds is not None else float(os.getenv("CLAUDE_CACHE_STALE_SECONDS", "86400"))
+        self.memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "bypassed": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "expired": 0,
+            "stale_hits": 0,
+        }
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " tool TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " response TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            self._db.commit()
+        return self._db
+
+    def ttl_for(self, tool_name: str) -> int:
+        return self.tool_ttls.get(tool_name, DEFAULT_TTL)
+
+    def _remember(self, key: str, expires_at: float, response: str):
+        """Insert into the memory tier, evicting least recently used entries"""
+        self.memory[key] = (expires_at, response)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+            self.stats["memory_evictions"] += 1
+
+    def _disk_get(self, key: str, allow_stale: bool = False) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT expires_at, response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if row[0] + self.stale_seconds <= now:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+                self.stats["expired"] += 1
+                return None
+            if row[0] <= now and not allow_stale:
+                self.stats["expired"] += 1
+                return None
+            db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+            return row[0], row[1]
+
+    def _disk_put(self, key: str, tool_name: str, expires_at: float, response: str):
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, tool, expires_at, accessed_at, response) VALUES (?, ?, ?, ?, ?)",
+                (key, tool_name, expires_at, time.time(), response),
+            )
+            db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time() - self.stale_seconds,))
+            (count,) = db.execute("SELECT COUNT(*) FROM responses").fetchone()
+            overflow = count - self.max_disk_entries
+            if overflow > 0:
+                db.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+                self.stats["disk_evictions"] += overflow
+            db.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look up a response: memory first, then SQLite (off the event loop)"""
+        entry = self.memory.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[1]
+            del self.memory[key]
+            self.stats["expired"] += 1
+
+        entry = await asyncio.to_thread(self._disk_get, key)
+        if entry is not None:
+            self._remember(key, entry[0], entry[1])
+            self.stats["disk_hits"] += 1
+            return entry[1]
+
+        self.stats["misses"] += 1
+        return None
+
+    async def get_stale(self, key: str) -> Optional[str]:
+        """Look up a response even if it expired less than stale_seconds ago"""
+        entry = self.memory.get(key)
+        if entry is None or entry[0] + self.stale_seconds <= time.time():
+            entry = await asyncio.to_thread(self._disk_get, key, True)
+        if entry is None:
+            return None
+        self.stats["stale_hits"] += 1
+        return entry[1]
+
+    async def put(self, key: str, tool_name: str, response: str):
+        """Store a response in both tiers with the tool's TTL"""
+        expires_at = time.time() + self.ttl_for(tool_name)
+        self._remember(key, expires_at, response)
+        await asyncio.to_thread(self._disk_put, key, tool_name, expires_at, response)
+        self.stats["stores"] += 1
+
+    def record_bypass(self):
+        self.stats["bypassed"] += 1
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_ratio"] = round(hits / lookups, 3) if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        return stats
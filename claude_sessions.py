@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Multi-turn sessions for the claude_* tools
+The opening call (instructions, large input and first answer) is kept
+server-side, so a follow-up sends only the new question; older follow-ups
+are compacted into a summary to keep the history under a token budget
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from claude_prompts import CACHE_CONTROL, ClaudePrompt
+from claude_token_budget import estimate_tokens, trim_middle
+
+# Arguments of the opening call that keep steering routing for the whole session
+SESSION_HINTS = ("speed", "max_output_tokens")
+
+
+SUMMARY_INSTRUCTIONS = """You condense the earlier part of a conversation so it can continue without it.
+Keep every fact, finding, decision, command and open question; drop pleasantries and repetition.
+Answer with the summary only, at most {words} words."""
+
+
+def _text_block(text: str) -> Dict[str, Any]:
+    return {"type": "text", "text": text}
+
+
+def summary_prompt(transcript: str, max_tokens: int) -> ClaudePrompt:
+    """Request that compacts folded follow-ups (and any earlier summary) into one paragraph"""
+    return ClaudePrompt(
+        system=[_text_block(SUMMARY_INSTRUCTIONS.format(words=max_tokens * 3 // 4))],
+        content=[_text_block(transcript)],
+    )
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+    tokens: int
+
+
+@dataclass
+class Session:
+    session_id: str
+    tool: str
+    hints: Dict[str, Any]
+    # System prompt and first user message (large input plus details), as rendered for the opening call
+    opening: ClaudePrompt
+    first_answer: str
+    opening_tokens: int
+    turns: List[Turn] = field(default_factory=list)
+    # Older follow-ups folded into one paragraph by compaction
+    summary: str = ""
+    summary_tokens: int = 0
+    compacted_turns: int = 0
+    total_turns: int = 0
+    size_bytes: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def history_tokens(self) -> int:
+        """Estimated tokens of the follow-ups kept after the opening exchange"""
+        return self.summary_tokens + sum(turn.tokens for turn in self.turns)
+
+
+def _size_of(*texts: str) -> int:
+    return sum(len(text.encode("utf-8")) for text in texts)
+
+
+class SessionStore:
+    """Live sessions in LRU order, bounded by count, memory and idle time
+
+    After a follow-up pushes the history over history_tokens, the oldest
+    turns beyond the keep_turns most recent are compacted: summarized by
+    the summarize callback (mode "summarize"), or dropped when it is not
+    set, fails, or mode is "drop". The opening exchange is never compacted;
+    it is the cacheable prefix every follow-up reuses.
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Callable[[Session, str], Awaitable[Optional[str]]]] = None,
+        max_sessions: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        idle_seconds: Optional[float] = None,
+        history_tokens: Optional[int] = None,
+        keep_turns: Optional[int] = None,
+        summary_tokens: Optional[int] = None,
+        min_cache_tokens: int = 1024,
+    ):
+        self.summarize = summarize
+        self.mode = os.getenv("CLAUDE_SESSION_COMPACTION", "summarize")
+        self.max_sessions = max_sessions or int(os.getenv("CLAUDE_SESSION_MAX", "100"))
+        self.max_bytes = max_bytes or int(float(os.getenv("CLAUDE_SESSION_MAX_MB", "64")) * 1024 * 1024)
+        self.idle_seconds = idle_seconds or float(os.getenv("CLAUDE_SESSION_IDLE_SECONDS", "3600"))
+        self.history_tokens = history_tokens or int(os.getenv("CLAUDE_SESSION_HISTORY_TOKENS", "8000"))
+        self.keep_turns = keep_turns if keep_turns is not None else int(os.getenv("CLAUDE_SESSION_KEEP_TURNS", "4"))
+        self.summary_tokens = summary_tokens or int(os.getenv("CLAUDE_SESSION_SUMMARY_TOKENS", "800"))
+        self.min_cache_tokens = min_cache_tokens
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.total_bytes = 0
+        # Background compactions, referenced so they are not garbage collected mid-run
+        self.compactions: Set[asyncio.Task] = set()
+        self.stats = {
+            "opened": 0, "closed": 0, "expired": 0, "evicted": 0, "turns": 0,
+            "compactions": 0, "summarized_turns": 0, "dropped_turns": 0,
+            "summary_failures": 0, "compacted_tokens": 0,
+        }
+
+    def _remove(self, session_id: str) -> Optional[Session]:
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.total_bytes -= session.size_bytes
+        return session
+
+    def _resize(self, session: Session, size_bytes: int):
+        if self.sessions.get(session.session_id) is session:
+            self.total_bytes += size_bytes - session.size_bytes
+        session.size_bytes = size_bytes
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if session.last_used > cutoff:
+                break
+            self._remove(session.session_id)
+            self.stats["expired"] += 1
+
+    def _evict(self, keep: Session):
+        """Drop least recently used sessions until both limits hold, sparing keep (the one just used)"""
+        while len(self.sessions) > self.max_sessions or (self.total_bytes > self.max_bytes and len(self.sessions) > 1):
+            oldest = next(iter(self.sessions))
+            if oldest == keep.session_id:
+                self.sessions.move_to_end(oldest)
+                oldest = next(iter(self.sessions))
+            self._remove(oldest)
+            self.stats["evicted"] += 1
+
+    def open(
+        self, tool: str, arguments: Dict[str, Any], opening: ClaudePrompt, first_answer: str, model: Optional[str] = None
+    ) -> Session:
+        """Keep a session whose opening call was answered by model
+
+        Follow-ups are pinned to that model: the prompt cache is per model,
+        and re-routing on the growing history would throw the cached prefix away.
+        """
+        self._expire()
+        hints = {key: arguments[key] for key in SESSION_HINTS if key in arguments}
+        if model or arguments.get("model"):
+            hints["model"] = model or arguments["model"]
+        session = Session(
+            session_id=uuid.uuid4().hex,
+            tool=tool,
+            hints=hints,
+            opening=opening,
+            first_answer=first_answer,
+            opening_tokens=estimate_tokens(str(opening)) + estimate_tokens(first_answer),
+        )
+        self.sessions[session.session_id] = session
+        self._resize(session, _size_of(str(opening), first_answer))
+        self.stats["opened"] += 1
+        self._evict(session)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        self._expire()
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session.last_used = time.monotonic()
+            self.sessions.move_to_end(session_id)
+        return session
+
+    def close(self, session_id: str) -> Optional[Session]:
+        session = self._remove(session_id)
+        if session is not None:
+            self.stats["closed"] += 1
+        return session
+
+    def build_prompt(self, session: Session, message: str) -> ClaudePrompt:
+        """Opening exchange, summary, recent turns and the new message as one request
+
+        The last assistant message carries a cache_control breakpoint, so the
+        next follow-up reads everything before its own question from cache.
+        """
+        history: List[Dict[str, Any]] = [
+            {"role": "user", "content": session.opening.content},
+            {"role": "assistant", "content": [_text_block(session.first_answer)]},
+        ]
+        summary_note = f"Summary of our earlier follow-up discussion:\n{session.summary}\n\n" if session.summary else ""
+        for turn in session.turns:
+            history.append({"role": "user", "content": [_text_block(summary_note + turn.question)]})
+            history.append({"role": "assistant", "content": [_text_block(turn.answer)]})
+            summary_note = ""
+
+        cacheable_tokens = session.opening.cacheable_tokens
+        prefix_tokens = session.opening_tokens + session.history_tokens
+        if prefix_tokens >= self.min_cache_tokens:
+            last = history[-1]["content"][-1]
+            history[-1] = {"role": "assistant", "content": [{**last, "cache_control": CACHE_CONTROL}]}
+            cacheable_tokens = prefix_tokens
+        return ClaudePrompt(
+            system=session.opening.system,
+            content=[_text_block(summary_note + message)],
+            cacheable_tokens=cacheable_tokens,
+            history=history,
+        )
+
+    def add_turn(self, session: Session, question: str, answer: str):
+        session.turns.append(Turn(question, answer, estimate_tokens(question) + estimate_tokens(answer)))
+        session.total_turns += 1
+        self.stats["turns"] += 1
+        self._resize(session, session.size_bytes + _size_of(question, answer))
+        if self.sessions.get(session.session_id) is session:
+            self._evict(session)
+        if session.history_tokens > self.history_tokens:
+            task = asyncio.create_task(self.compact(session))
+            self.compactions.add(task)
+            task.add_done_callback(self.compactions.discard)
+
+    def _fold_count(self, session: Session) -> int:
+        """Oldest turns to compact: all but keep_turns, more if the rest still exceed the budget"""
+        count = max(0, len(session.turns) - self.keep_turns)
+        remaining = sum(turn.tokens for turn in session.turns[count:])
+        while count < len(session.turns) and remaining + self.summary_tokens > self.history_tokens:
+            remaining -= session.turns[count].tokens
+            count += 1
+        return count
+
+    async def compact(self, session: Session):
+        """Fold the oldest turns into the summary; runs under the session lock, between follow-ups"""
+        async with session.lock:
+            count = self._fold_count(session)
+            if session.history_tokens <= self.history_tokens or count == 0:
+                return
+            before = session.history_tokens
+            folded = session.turns[:count]
+            summary = None
+            if self.mode == "summarize" and self.summarize is not None:
+                parts = [f"Earlier summary:\n{session.summary}"] if session.summary else []
+                parts += [f"Question: {turn.question}\n\nAnswer: {turn.answer}" for turn in folded]
+                transcript = "\n\n".join(parts)
+                try:
+                    summary = await self.summarize(session, transcript)
+                except Exception:
+                    summary = None
+                if summary is None:
+                    self.stats["summary_failures"] += 1
+            if summary is not None:
+                self.stats["summarized_turns"] += count
+            else:
+                # Keep what was summarized before; the folded turns are lost
+                summary = session.summary + f"\n({count} earlier follow-ups omitted)"
+                self.stats["dropped_turns"] += count
+            summary = summary.strip()
+            if estimate_tokens(summary) > self.summary_tokens:
+                summary = trim_middle(summary, self.summary_tokens * 4)
+
+            session.turns = session.turns[count:]
+            session.summary = summary
+            session.summary_tokens = estimate_tokens(summary)
+            session.compacted_turns += count
+            self._resize(session, _size_of(str(session.opening), session.first_answer, summary) + sum(
+                _size_of(turn.question, turn.answer) for turn in session.turns
+            ))
+            self.stats["compactions"] += 1
+            self.stats["compacted_tokens"] += before - session.history_tokens
+
+    def describe(self, session: Session) -> Dict[str, Any]:
+        return {
+            "session_id": session.session_id,
+            "tool": session.tool,
+            "turns": session.total_turns,
+            "kept_turns": len(session.turns),
+            "compacted_turns": session.compacted_turns,
+            "opening_tokens": session.opening_tokens,
+            "history_tokens": session.history_tokens,
+            "size_bytes": session.size_bytes,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.stats)
+        stats["active"] = len(self.sessions)
+        stats["bytes"] = self.total_bytes
+        stats["compacting"] = len(self.compactions)
+        return stats
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate cache for claude_error_diagnosis
+Error logs are normalized (timestamps, PIDs, addresses, temp paths, ...),
+fingerprinted with MinHash and indexed by LSH bands, so a repeat of a
+recent incident is answered from cache even when no byte matches
+"""
+
+import hashlib
+import os
+import random
+import re
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Volatile fragments of the lower-cased log, replaced in this order (more specific first)
+VOLATILE_PATTERNS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[t ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:z|[+-]\d{2}:?\d{2})?"), " <ts> "),
+    (re.compile(r"\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\s+\d{1,2}\s+\d{2}:\d{2}:\d{2}\b"), " <ts> "),
+    (re.compile(r"\b\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\b"), " <ts> "),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b"), " <uuid> "),
+    (re.compile(r"\b0x[0-9a-f]+\b"), " <addr> "),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), " <ip> "),
+    (re.compile(r"(?:/tmp|/var/tmp|/var/folders|/private/var/folders)/\S+|[a-z]:\\users\\[^\\\s]+\\appdata\\local\\temp\\\S+"), " <tmpfile> "),
+    (re.compile(r"\b[0-9a-f]{12,64}\b"), " <hex> "),
+    (re.compile(r"\[\d+\]|\bpid[=: ]\s*\d+"), " <pid> "),
+    # Long numbers only: exit codes and HTTP statuses are part of the diagnosis
+    (re.compile(r"\b\d{4,}\b"), " <n> "),
+]
+TOKEN_PATTERN = re.compile(r"<\w+>|[a-z_][a-z0-9_.\-]*|\d+|[^\sa-z0-9]")
+# Arguments a cached diagnosis must share: the environment (normalized) and the caller's routing hints (exact)
+CONTEXT_FIELDS = ("system_info", "deployment_context")
+ROUTING_FIELDS = ("model", "speed", "max_output_tokens")
+
+
+def normalize_log(text: str) -> str:
+    """Lower-case text with volatile fragments replaced by placeholders"""
+    text = text.lower()
+    for pattern, placeholder in VOLATILE_PATTERNS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+
+def _features(normalized: str) -> Iterable[str]:
+    """Token 3-grams (word order matters), plus single tokens for very short logs"""
+    tokens = TOKEN_PATTERN.findall(normalized)
+    if len(tokens) < 3:
+        return tokens
+    return (" ".join(tokens[i:i + 3]) for i in range(len(tokens) - 2))
+
+
+SIGNATURE_SIZE = 64
+BAND_ROWS = 4
+_PRIME = (1 << 61) - 1
+_seeded = random.Random(0x5EED)
+# (a, b) of h -> (a*h + b) mod p; a fixed seed keeps signatures comparable across cache instances
+_PERMUTATIONS = [(_seeded.randrange(1, _PRIME), _seeded.randrange(0, _PRIME)) for _ in range(SIGNATURE_SIZE)]
+
+
+def minhash(normalized: str) -> Tuple[int, ...]:
+    """MinHash signature of the set of 3-gram features (SIGNATURE_SIZE universal hash permutations)"""
+    # Process-salted str hash: fine, signatures never leave this process
+    hashes = [hash(feature) % _PRIME for feature in set(_features(normalized))] or [0]
+    return tuple(min([(a * h + b) % _PRIME for h in hashes]) for a, b in _PERMUTATIONS)
+
+
+def estimate_similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the two feature sets"""
+    return sum(a == b for a, b in zip(first, second)) / SIGNATURE_SIZE
+
+
+@dataclass
+class _Entry:
+    scope: str
+    signature: Tuple[int, ...]
+    response: str
+    expires_at: float
+
+
+class SimilarityCache:
+    """MinHash + LSH index over recent diagnoses
+
+    A log matches a cached one in the same scope (same system info,
+    deployment context and routing hints, so a diagnosis asked of one model
+    is not served for another) when the estimated Jaccard similarity of their
+    normalized 3-gram sets is at least threshold. Signatures are cut into
+    bands of BAND_ROWS values; only entries sharing a whole band with the
+    new log are compared, which finds pairs above ~0.7 similarity almost
+    surely without scanning the cache.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        self.threshold = threshold or float(os.getenv("CLAUDE_SIMILARITY_THRESHOLD", "0.85"))
+        self.max_entries = max_entries or int(os.getenv("CLAUDE_SIMILARITY_ENTRIES", "1000"))
+        self.ttl = ttl or float(os.getenv("CLAUDE_SIMILARITY_TTL", "3600"))
+        self.entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self.index: Dict[Tuple[str, int, Tuple[int, ...]], Set[int]] = defaultdict(set)
+        self.next_id = 0
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "evictions": 0, "compared": 0}
+
+    @staticmethod
+    def scope_for(arguments: Dict[str, Any]) -> str:
+        parts = [normalize_log(str(arguments.get(key, ""))) for key in CONTEXT_FIELDS]
+        parts += [str(arguments.get(key, "")) for key in ROUTING_FIELDS]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _band_keys(scope: str, signature: Tuple[int, ...]) -> List[Tuple[str, int, Tuple[int, ...]]]:
+        return [
+            (scope, start, signature[start:start + BAND_ROWS])
+            for start in range(0, SIGNATURE_SIZE, BAND_ROWS)
+        ]
+
+    def _remove(self, entry_id: int):
+        entry = self.entries.pop(entry_id)
+        for key in self._band_keys(entry.scope, entry.signature):
+            bucket = self.index.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self.index[key]
+
+    def fingerprint(self, arguments: Dict[str, Any]) -> Tuple[str, Tuple[int, ...]]:
+        """(scope, MinHash signature of error_log); CPU-bound for long logs, so callers may run it in a thread"""
+        return self.scope_for(arguments), minhash(normalize_log(arguments["error_log"]))
+
+    def lookup(self, scope: str, signature: Tuple[int, ...]) -> Optional[Tuple[str, float]]:
+        """Return (cached diagnosis, similarity 0..1) for a near-duplicate error_log, or None"""
+        self.stats["lookups"] += 1
+        now = time.time()
+        best: Optional[Tuple[int, float]] = None
+        candidates = set().union(*(self.index.get(key, ()) for key in self._band_keys(scope, signature)))
+        for entry_id in candidates:
+            entry = self.entries.get(entry_id)
+            if entry is None:
+                continue
+            if entry.expires_at <= now:
+                self._remove(entry_id)
+                continue
+            self.stats["compared"] += 1
+            similarity = estimate_similarity(entry.signature, signature)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (entry_id, similarity)
+        if best is None:
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(best[0])
+        self.stats["hits"] += 1
+        return self.entries[best[0]].response, best[1]
+
+    def add(self, scope: str, signature: Tuple[int, ...], response: str):
+        # An identical signature in the same scope is replaced, not duplicated
+        for entry_id in list(self.index.get(self._band_keys(scope, signature)[0], ())):
+            if self.entries[entry_id].signature == signature:
+                self._remove(entry_id)
+
+        entry_id = self.next_id
+        self.next_id += 1
+        self.entries[entry_id] = _Entry(scope, signature, response, time.time() + self.ttl)
+        for key in self._band_keys(scope, signature):
+            self.index[key].add(entry_id)
+        self.stats["stores"] += 1
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["entries"] = len(self.entries)
+        stats["hit_ratio"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        return stats
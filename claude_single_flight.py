@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Single-flight coalescing for identical concurrent Claude requests
+Callers with the same key share one upstream request and its result
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """At most one in-flight call per key; later callers await the first one's task
+
+    The shared task is cancelled only when every caller waiting on it has
+    been cancelled, so one client giving up does not fail the others.
+    """
+
+    def __init__(self):
+        self.in_flight: Dict[str, _Flight] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self.in_flight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self.in_flight[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: str, flight: _Flight):
+        if self.in_flight.get(key) is flight:
+            del self.in_flight[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        calls = stats["leaders"] + stats["coalesced"]
+        stats["coalesced_ratio"] = round(stats["coalesced"] / calls, 3) if calls else 0.0
+        stats["in_flight"] = len(self.in_flight)
+        return stats
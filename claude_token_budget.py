@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Local token estimation and per-tool input budgets for the claude_* tools
+Oversized inputs are trimmed or rejected before any network round trip
+"""
+
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Words, numbers and single punctuation marks; long runs count as several tokens
+TOKEN_PIECE = re.compile(r"\w+|[^\w\s]")
+
+# USD per million tokens: (input, output)
+MODEL_PRICING = {
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+    "claude-opus-4-20250514": (15.00, 75.00),
+}
+DEFAULT_PRICING = (3.00, 15.00)
+
+# mode "trim" cuts the middle of trim_field until the prompt fits; "reject" refuses the call
+DEFAULT_TOOL_BUDGETS = {
+    "claude_code_review": {"max_input_tokens": 60000, "mode": "reject", "trim_field": "code"},
+    "claude_deployment_planning": {"max_input_tokens": 20000, "mode": "trim", "trim_field": "requirements"},
+    "claude_error_diagnosis": {"max_input_tokens": 30000, "mode": "trim", "trim_field": "error_log"},
+    "claude_optimize_config": {"max_input_tokens": 30000, "mode": "reject", "trim_field": "config_content"},
+}
+
+
+class TokenBudgetExceeded(Exception):
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local estimate, usually within ~15% of the real tokenizer for English and code"""
+    count = 0
+    for piece in TOKEN_PIECE.findall(text):
+        count += 1 + (len(piece) - 1) // 6
+    return count
+
+
+def estimate_cost(model: str, input_tokens: int, max_output_tokens: int) -> Dict[str, float]:
+    input_price, output_price = MODEL_PRICING.get(model, DEFAULT_PRICING)
+    input_cost = input_tokens * input_price / 1_000_000
+    return {
+        "input_cost_usd": round(input_cost, 6),
+        "max_total_cost_usd": round(input_cost + max_output_tokens * output_price / 1_000_000, 6),
+    }
+
+
+def trim_middle(text: str, keep_chars: int) -> str:
+    """Keep the head and tail of text (errors usually sit at the end of logs)"""
+    if len(text) <= keep_chars:
+        return text
+    head = keep_chars // 3
+    tail = keep_chars - head
+    removed = text[head:len(text) - tail]
+    marker = f"\n... [{removed.count(chr(10)) + 1} lines / {len(removed)} characters trimmed to fit the input budget] ...\n"
+    return text[:head] + marker + text[len(text) - tail:]
+
+
+class TokenBudget:
+    """Per-tool input budgets; overrides come from the CLAUDE_TOOL_BUDGETS JSON mapping"""
+
+    def __init__(self, budgets: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.budgets = {tool: dict(budget) for tool, budget in DEFAULT_TOOL_BUDGETS.items()}
+        overrides = json.loads(os.getenv("CLAUDE_TOOL_BUDGETS", "{}"))
+        overrides.update(budgets or {})
+        for tool, budget in overrides.items():
+            self.budgets.setdefault(tool, {}).update(budget)
+        self.stats = {"checked": 0, "trimmed": 0, "rejected": 0}
+
+    def apply(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        prepare_prompt: Callable[[str, Dict[str, Any]], Any],
+    ) -> Tuple[Dict[str, Any], Any, int, Optional[str]]:
+        """Return (arguments, prompt, estimated tokens, note) that fit the tool's budget
+
+        prompt is whatever prepare_prompt returns; str(prompt) is what gets measured.
+        Raises TokenBudgetExceeded when the budget mode is "reject" or when
+        trimming cannot bring the prompt under the limit.
+        """
+        self.stats["checked"] += 1
+        prompt = prepare_prompt(tool_name, arguments)
+        estimate = estimate_tokens(str(prompt))
+        budget = self.budgets.get(tool_name)
+        if not budget or estimate <= budget["max_input_tokens"]:
+            return arguments, prompt, estimate, None
+
+        limit = budget["max_input_tokens"]
+        field = budget.get("trim_field")
+        if budget.get("mode") != "trim" or not isinstance(arguments.get(field), str):
+            self.stats["rejected"] += 1
+            raise TokenBudgetExceeded(
+                f"{tool_name} input is ~{estimate} tokens, over its budget of {limit}. "
+                f"Shorten '{field}' or raise the budget in CLAUDE_TOOL_BUDGETS."
+            )
+
+        original_estimate = estimate
+        trimmed = dict(arguments)
+        for _ in range(4):
+            text = trimmed[field]
+            field_tokens = max(1, estimate_tokens(text))
+            chars_per_token = len(text) / field_tokens
+            keep_tokens = field_tokens - (estimate - limit) - 64
+            if keep_tokens <= 0:
+                break
+            trimmed[field] = trim_middle(text, int(keep_tokens * chars_per_token))
+            prompt = prepare_prompt(tool_name, trimmed)
+            estimate = estimate_tokens(str(prompt))
+            if estimate <= limit:
+                self.stats["trimmed"] += 1
+                return trimmed, prompt, estimate, f"'{field}' trimmed from ~{original_estimate} to ~{estimate} input tokens"
+
+        self.stats["rejected"] += 1
+        raise TokenBudgetExceeded(
+            f"{tool_name} input is ~{original_estimate} tokens and could not be trimmed under its budget of {limit}."
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Command line mode for claude_integrated_deployment.py
+Tool calls go straight to the server's handlers, with no MCP handshake:
+one call per run, or a JSONL file of calls whose results are written
+back as JSONL in completion order
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Iterable, Optional, Set, TextIO, Tuple
+
+
+def with_model(tool: str, arguments: Dict[str, Any], model: Optional[str], model_tools: Iterable[str]) -> Dict[str, Any]:
+    """Apply a --model default to claude_* calls that did not pick a model themselves"""
+    if model and tool in model_tools and "model" not in arguments:
+        return dict(arguments, model=model)
+    return arguments
+
+
+def parse_call(line: str, number: int) -> Tuple[str, str, Dict[str, Any]]:
+    """(id, tool, arguments) of one JSONL line: {"tool": ..., "arguments": {...}, "id": optional}"""
+    call = json.loads(line)
+    if not isinstance(call, dict) or not isinstance(call.get("tool"), str):
+        raise ValueError('expected an object with a "tool" name')
+    arguments = call.get("arguments", {})
+    if not isinstance(arguments, dict):
+        raise ValueError('"arguments" must be an object')
+    return str(call.get("id", f"line-{number}")), call["tool"], arguments
+
+
+async def run_one(server, tool: str, arguments: Dict[str, Any], out: TextIO) -> bool:
+    """Run a single call and write its text; True when the call outcome is ok"""
+    content, outcome = await server.execute_tool(tool, arguments)
+    out.write("\n".join(item.text for item in content) + "\n")
+    out.flush()
+    return outcome == "ok"
+
+
+async def run_bulk(
+    server,
+    source: TextIO,
+    out: TextIO,
+    parallelism: int,
+    model: Optional[str] = None,
+    model_tools: Iterable[str] = (),
+) -> bool:
+    """Run every call in source with at most parallelism in flight; True when all outcomes are ok
+
+    Lines are read as slots free up, so input of any length (or a pipe
+    still being written) is fine. Each result is one JSON line with id,
+    tool, outcome, elapsed_seconds and text, written as soon as it finishes.
+    """
+    model_tools = set(model_tools)
+    semaphore = asyncio.Semaphore(parallelism)
+    pending: Set[asyncio.Task] = set()
+    failures = 0
+
+    def emit(record: Dict[str, Any]):
+        nonlocal failures
+        failures += record["outcome"] != "ok"
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+
+    async def run(call_id: str, tool: str, arguments: Dict[str, Any]):
+        started = time.monotonic()
+        try:
+            content, outcome = await server.execute_tool(tool, with_model(tool, arguments, model, model_tools))
+        finally:
+            semaphore.release()
+        emit({
+            "id": call_id,
+            "tool": tool,
+            "outcome": outcome,
+            "elapsed_seconds": round(time.monotonic() - started, 3),
+            "text": "\n".join(item.text for item in content),
+        })
+
+    number = 0
+    while True:
+        await semaphore.acquire()
+        line = await asyncio.to_thread(source.readline)
+        if not line:
+            semaphore.release()
+            break
+        number += 1
+        if not line.strip():
+            semaphore.release()
+            continue
+        try:
+            call_id, tool, arguments = parse_call(line, number)
+        except ValueError as e:
+            semaphore.release()
+            emit({"id": f"line-{number}", "tool": None, "outcome": "invalid_input", "elapsed_seconds": 0.0, "text": str(e)})
+            continue
+        task = asyncio.create_task(run(call_id, tool, arguments))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    if pending:
+        await asyncio.gather(*pending)
+    return failures == 0
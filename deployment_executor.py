@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Executor dispatch for DeploymentToolsManager methods
+Keeps blocking deployment tools off the asyncio event loop
+"""
+
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+EXECUTOR_KINDS = ("thread", "process", "inline")
+
+# Per-process DeploymentToolsManager, built once by the pool initializer
+_process_manager = None
+
+
+def _init_process_worker(manager_class, search_path: List[str]):
+    """Process pool initializer: mirror the parent's sys.path and build a manager"""
+    global _process_manager
+    for entry in search_path:
+        if entry not in sys.path:
+            sys.path.append(entry)
+    _process_manager = manager_class()
+
+
+def _call_in_process(tool_name: str, arguments: Dict[str, Any]) -> Any:
+    return getattr(_process_manager, tool_name)(**arguments)
+
+
+class DeploymentToolExecutor:
+    """Run each deployment tool on a thread pool, a process pool or inline
+
+    The executor for a tool is picked from tool_executors (or the
+    DEPLOYMENT_TOOL_EXECUTORS JSON mapping), falling back to default_kind.
+    Threads suit subprocess/IO-bound tools; CPU-heavy tools go to processes,
+    which run their own DeploymentToolsManager instance. get_manager is
+    called on first use, so the manager is not built until a tool runs.
+    """
+
+    def __init__(
+        self,
+        get_manager: Callable[[], Any],
+        default_kind: Optional[str] = None,
+        tool_executors: Optional[Dict[str, str]] = None,
+        thread_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+    ):
+        self.get_manager = get_manager
+        self.default_kind = default_kind or os.getenv("DEPLOYMENT_DEFAULT_EXECUTOR", "thread")
+        self.tool_executors = json.loads(os.getenv("DEPLOYMENT_TOOL_EXECUTORS", "{}"))
+        self.tool_executors.update(tool_executors or {})
+        for kind in [self.default_kind, *self.tool_executors.values()]:
+            if kind not in EXECUTOR_KINDS:
+                raise ValueError(f"Unknown executor kind '{kind}' (expected one of {', '.join(EXECUTOR_KINDS)})")
+        self.thread_workers = thread_workers or int(os.getenv("DEPLOYMENT_THREAD_WORKERS", "16"))
+        self.process_workers = process_workers or int(os.getenv("DEPLOYMENT_PROCESS_WORKERS", str(os.cpu_count() or 2)))
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self.stats = {kind: 0 for kind in EXECUTOR_KINDS}
+        self.cancel_stats = {"dropped_queued": 0, "abandoned_running": 0}
+
+    def executor_kind(self, tool_name: str) -> str:
+        return self.tool_executors.get(tool_name, self.default_kind)
+
+    def _pool(self, kind: str) -> Executor:
+        """Create pools lazily so unused executors cost nothing"""
+        if kind == "process":
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.process_workers,
+                    initializer=_init_process_worker,
+                    initargs=(type(self.get_manager()), list(sys.path)),
+                )
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.thread_workers,
+                thread_name_prefix="deployment-tool",
+            )
+        return self._thread_pool
+
+    async def run(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        """Run one deployment tool without blocking the event loop"""
+        kind = self.executor_kind(tool_name)
+        self.stats[kind] += 1
+        if kind == "inline":
+            return getattr(self.get_manager(), tool_name)(**arguments)
+
+        if kind == "process":
+            call = partial(_call_in_process, tool_name, arguments)
+        else:
+            call = partial(getattr(self.get_manager(), tool_name), **arguments)
+        future = self._pool(kind).submit(call)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Queued jobs are dropped; a job already running cannot be interrupted
+            # and finishes in the background with its result discarded
+            if future.cancel():
+                self.cancel_stats["dropped_queued"] += 1
+            else:
+                self.cancel_stats["abandoned_running"] += 1
+            raise
+
+    def shutdown(self, wait: bool = True):
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait, cancel_futures=True)
+        self._thread_pool = None
+        self._process_pool = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calls_by_executor": dict(self.stats),
+            "tool_executors": dict(self.tool_executors),
+            **self.cancel_stats,
+        }
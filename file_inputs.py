@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+File and glob inputs for claude_code_review and claude_optimize_config
+Files under the allowed roots are read server-side through mmap, hashed
+in place, and skipped (never decoded) when unchanged since their last review
+"""
+
+import glob
+import hashlib
+import json
+import mmap
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Argument that receives each file's text
+CONTENT_FIELDS = {"claude_code_review": "code", "claude_optimize_config": "config_content"}
+# Argument filled from the file name when the caller leaves it out
+TYPE_FIELDS = {"claude_code_review": "language", "claude_optimize_config": "config_type"}
+EXTENSION_TYPES = {
+    ".py": "python", ".js": "javascript", ".jsx": "javascript", ".ts": "typescript", ".tsx": "typescript",
+    ".go": "go", ".rs": "rust", ".java": "java", ".kt": "kotlin", ".rb": "ruby", ".php": "php",
+    ".c": "c", ".h": "c", ".cc": "cpp", ".cpp": "cpp", ".hpp": "cpp", ".cs": "csharp", ".sh": "bash",
+    ".yaml": "yaml", ".yml": "yaml", ".json": "json", ".toml": "toml", ".ini": "ini", ".tf": "terraform",
+}
+GLOB_CHARACTERS = "*?["
+# Arguments that change how a call is delivered, not what is asked: ignored when deciding whether a file was already reviewed
+DELIVERY_ARGUMENTS = {"paths", "only_changed", "stream", "bypass_cache", "dry_run", "exact_token_count"}
+# Bytes checked for NUL to tell binary files apart
+BINARY_PROBE_BYTES = 8192
+
+
+def type_for(path: str) -> Optional[str]:
+    name = os.path.basename(path).lower()
+    if name.startswith("dockerfile"):
+        return "docker"
+    return EXTENSION_TYPES.get(os.path.splitext(name)[1])
+
+
+@dataclass
+class FileInput:
+    path: str
+    size: int
+    digest: str = ""
+    # None when the file is skipped; skipped says why
+    text: Optional[str] = None
+    skipped: Optional[str] = None
+
+
+class FileInputs:
+    """Resolves paths/globs under allowed_roots and reads the files for one request each
+
+    allowed_roots come from CLAUDE_FILE_ROOTS (os.pathsep separated); with
+    none configured, paths inputs are refused. A glob is only expanded when its
+    fixed leading directory is inside a root, and every match is checked
+    again after symlinks are resolved. The content hash of each reviewed
+    file is remembered per tool together with a hash of the other
+    arguments (context, goals, language, model, ...), so a file is skipped
+    only when both are unchanged (only_changed=false reviews it anyway).
+    """
+
+    def __init__(
+        self,
+        allowed_roots: Optional[List[str]] = None,
+        max_files: Optional[int] = None,
+        max_file_bytes: Optional[int] = None,
+        parallelism: Optional[int] = None,
+        max_remembered: Optional[int] = None,
+    ):
+        roots = allowed_roots or [root for root in os.getenv("CLAUDE_FILE_ROOTS", "").split(os.pathsep) if root]
+        self.allowed_roots = [os.path.realpath(root) for root in roots]
+        self.max_files = max_files or int(os.getenv("CLAUDE_FILE_MAX_FILES", "50"))
+        self.max_file_bytes = max_file_bytes or int(os.getenv("CLAUDE_FILE_MAX_BYTES", str(1024 * 1024)))
+        self.parallelism = parallelism or int(os.getenv("CLAUDE_FILE_PARALLELISM", "4"))
+        self.max_remembered = max_remembered or int(os.getenv("CLAUDE_FILE_HASH_ENTRIES", "10000"))
+        # (tool, real path) -> (sha256 of the content, options_digest) of the last successful review
+        self.reviewed: "OrderedDict[Tuple[str, str], Tuple[str, str]]" = OrderedDict()
+        self.stats = {
+            "requests": 0, "files_matched": 0, "files_read": 0, "bytes_read": 0,
+            "unchanged_skipped": 0, "too_large": 0, "binary_skipped": 0,
+        }
+
+    def _inside_roots(self, path: str) -> bool:
+        real = os.path.realpath(path)
+        return any(real == root or real.startswith(root + os.sep) for root in self.allowed_roots)
+
+    def wants_files(self, tool_name: str, arguments: Dict[str, Any]) -> bool:
+        """Whether the call reads its input from paths; raises ValueError when it has no input at all"""
+        field = CONTENT_FIELDS.get(tool_name)
+        if field is None:
+            return False
+        if arguments.get("paths"):
+            return True
+        if not isinstance(arguments.get(field), str):
+            raise ValueError(f"provide {field} or paths")
+        type_field = TYPE_FIELDS[tool_name]
+        if tool_name == "claude_optimize_config" and not arguments.get(type_field):
+            raise ValueError(f"{type_field} is required with {field}")
+        return False
+
+    def resolve(self, patterns: List[Any]) -> List[str]:
+        """Real paths of the files named or matched by patterns, sorted and de-duplicated"""
+        if not self.allowed_roots:
+            raise ValueError("paths inputs are disabled; set CLAUDE_FILE_ROOTS to the directories they may read")
+        self.stats["requests"] += 1
+        files = set()
+        for pattern in patterns:
+            if not isinstance(pattern, str) or not pattern:
+                raise ValueError(f"paths must be non-empty strings, got {pattern!r}")
+            expanded = os.path.expanduser(pattern)
+            if not any(char in expanded for char in GLOB_CHARACTERS):
+                if not self._inside_roots(expanded):
+                    raise ValueError(f"{pattern} is outside the allowed directories ({os.pathsep.join(self.allowed_roots)})")
+                if not os.path.isfile(expanded):
+                    raise ValueError(f"{pattern} is not a file (use a glob such as {pattern.rstrip('/')}/**/*.py for a directory)")
+                files.add(os.path.realpath(expanded))
+                continue
+
+            # Refuse to walk anything outside the roots, e.g. "/**/*.py"
+            parts = expanded.split(os.sep)
+            fixed = os.sep.join(parts[:next(i for i, part in enumerate(parts) if any(c in part for c in GLOB_CHARACTERS))])
+            if not self._inside_roots(fixed or (os.sep if os.path.isabs(expanded) else os.curdir)):
+                raise ValueError(f"{pattern} is outside the allowed directories ({os.pathsep.join(self.allowed_roots)})")
+            for match in glob.iglob(expanded, recursive=True):
+                if os.path.isfile(match) and self._inside_roots(match):
+                    files.add(os.path.realpath(match))
+                    if len(files) > self.max_files:
+                        break
+
+        if not files:
+            raise ValueError(f"no files match {', '.join(patterns)}")
+        if len(files) > self.max_files:
+            raise ValueError(f"paths match more than {self.max_files} files (CLAUDE_FILE_MAX_FILES); narrow the globs")
+        self.stats["files_matched"] += len(files)
+        return sorted(files)
+
+    @staticmethod
+    def options_digest(tool_name: str, arguments: Dict[str, Any]) -> str:
+        """Hash of the arguments that shape the answer, apart from the file content itself"""
+        options = {
+            key: value for key, value in arguments.items()
+            if key not in DELIVERY_ARGUMENTS and key != CONTENT_FIELDS[tool_name]
+        }
+        return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def load(self, tool_name: str, path: str, only_changed: bool = True, options: str = "") -> FileInput:
+        """Hash the file through mmap and decode it only when it needs a review (blocking I/O)
+
+        options is the options_digest of the call; a file reviewed with other options is reviewed again.
+        """
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > self.max_file_bytes:
+                self.stats["too_large"] += 1
+                return FileInput(path, size, skipped=f"too large ({size} bytes, limit {self.max_file_bytes})")
+            if size == 0:
+                return FileInput(path, 0, hashlib.sha256(b"").hexdigest(), skipped="empty")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest = hashlib.sha256(mapped).hexdigest()
+                if only_changed and self.reviewed.get((tool_name, path)) == (digest, options):
+                    self.stats["unchanged_skipped"] += 1
+                    return FileInput(path, size, digest, skipped="unchanged since its last review")
+                if mapped.find(b"\0", 0, BINARY_PROBE_BYTES) != -1:
+                    self.stats["binary_skipped"] += 1
+                    return FileInput(path, size, digest, skipped="binary file")
+                self.stats["files_read"] += 1
+                self.stats["bytes_read"] += size
+                return FileInput(path, size, digest, text=str(mapped, "utf-8", errors="replace"))
+
+    def arguments_for(self, tool_name: str, arguments: Dict[str, Any], file: FileInput) -> Dict[str, Any]:
+        """The tool's arguments for one file: its text as the content field, type from the file name if unset"""
+        item = {key: value for key, value in arguments.items() if key not in ("paths", "only_changed")}
+        item[CONTENT_FIELDS[tool_name]] = file.text
+        type_field = TYPE_FIELDS[tool_name]
+        if not item.get(type_field):
+            item[type_field] = type_for(file.path) or ("text" if tool_name == "claude_optimize_config" else "")
+        return item
+
+    def mark_reviewed(self, tool_name: str, file: FileInput, options: str = ""):
+        key = (tool_name, file.path)
+        self.reviewed[key] = (file.digest, options)
+        self.reviewed.move_to_end(key)
+        while len(self.reviewed) > self.max_remembered:
+            self.reviewed.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["remembered_hashes"] = len(self.reviewed)
+        return stats
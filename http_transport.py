@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Network transports for the MCP server
+Streamable HTTP (/mcp) and legacy SSE (/sse + /messages/) in one process,
+so many clients share one server and its caches, pool and rate limiter
+"""
+
+import contextlib
+import os
+from typing import Any, Callable, Dict, Optional
+
+import uvicorn
+from mcp.server import Server
+from mcp.server.sse import SseServerTransport
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Mount, Route
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+
+
+class _StreamableHTTPEndpoint:
+    """ASGI endpoint, so /mcp is routed exactly (a Mount would redirect to /mcp/)"""
+
+    def __init__(self, session_manager: StreamableHTTPSessionManager):
+        self.session_manager = session_manager
+
+    async def __call__(self, scope, receive, send):
+        await self.session_manager.handle_request(scope, receive, send)
+
+
+def build_http_app(
+    server: Server,
+    prometheus_text: Optional[Callable[[], str]] = None,
+    session_stats: Optional[Dict[str, Any]] = None,
+    json_response: Optional[bool] = None,
+) -> Starlette:
+    """Starlette app serving one lowlevel MCP Server to any number of sessions
+
+    Routes: /mcp (streamable HTTP), /sse and /messages/ (SSE clients),
+    /healthz, and /metrics (Prometheus text) when prometheus_text is given.
+    session_stats, if passed, is updated with open/total SSE session counts.
+    """
+    if json_response is None:
+        json_response = os.getenv("MCP_HTTP_JSON_RESPONSE", "").lower() in ("1", "true", "yes")
+    stats = session_stats if session_stats is not None else {}
+    stats.setdefault("sse_sessions_open", 0)
+    stats.setdefault("sse_sessions_total", 0)
+
+    session_manager = StreamableHTTPSessionManager(app=server, json_response=json_response)
+    sse = SseServerTransport("/messages/")
+
+    async def handle_sse(request: Request) -> Response:
+        stats["sse_sessions_open"] += 1
+        stats["sse_sessions_total"] += 1
+        try:
+            async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+                await server.run(read_stream, write_stream, server.create_initialization_options())
+        finally:
+            stats["sse_sessions_open"] -= 1
+        return Response()
+
+    async def health(request: Request) -> Response:
+        return JSONResponse({"status": "ok"})
+
+    async def metrics(request: Request) -> Response:
+        return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette):
+        async with session_manager.run():
+            yield
+
+    routes = [
+        Route("/mcp", endpoint=_StreamableHTTPEndpoint(session_manager)),
+        Route("/sse", endpoint=handle_sse, methods=["GET"]),
+        Mount("/messages/", app=sse.handle_post_message),
+        Route("/healthz", endpoint=health, methods=["GET"]),
+    ]
+    if prometheus_text is not None:
+        routes.append(Route("/metrics", endpoint=metrics, methods=["GET"]))
+    return Starlette(routes=routes, lifespan=lifespan)
+
+
+async def serve_http(app: Starlette, host: Optional[str] = None, port: Optional[int] = None):
+    """Serve app with uvicorn on the running event loop until shutdown"""
+    config = uvicorn.Config(
+        app,
+        host=host or os.getenv("MCP_HOST", DEFAULT_HOST),
+        port=port or int(os.getenv("MCP_PORT", str(DEFAULT_PORT))),
+        log_level=os.getenv("MCP_HTTP_LOG_LEVEL", "warning"),
+    )
+    await uvicorn.Server(config).serve()
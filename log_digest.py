@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Streaming digest of large error logs for claude_error_diagnosis
+Repeated lines and stack traces are counted once, lines are clustered by
+template, and context around the first and last errors is kept, all in
+one pass and within a token budget
+"""
+
+import mmap
+import os
+import re
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from claude_similarity_cache import normalize_log
+from claude_token_budget import estimate_tokens
+
+ERROR_PATTERN = re.compile(r"\w*(?:error|exception)\b|\b(?:fatal|panic|traceback|critical|failed|failure|oomkilled|killed)\b", re.IGNORECASE)
+# Every number is a variable for template purposes (counts, durations, ports, line numbers)
+NUMBER_PATTERN = re.compile(r"\d+")
+# Lines that continue a stack trace (Python frames/source, JVM/.NET "at ...", Go goroutine frames)
+TRACE_START = re.compile(r"^(?:Traceback \(most recent call last\):|goroutine \d+ \[|Exception in thread |\S+(?:Exception|Error): )")
+TRACE_CONTINUATION = re.compile(r"^(?:\s+|\tat |Caused by: |\.\.\. \d+ more)")
+# Longest single line kept in the digest
+MAX_LINE_CHARS = 500
+# Lines of a single stack trace kept for the key and the digest
+MAX_TRACE_LINES = 60
+
+
+def template_of(text: str) -> str:
+    """Cluster key: the normalized text with all numbers as placeholders"""
+    return NUMBER_PATTERN.sub("<n>", normalize_log(text))
+
+
+def _clip(line: str) -> str:
+    return line if len(line) <= MAX_LINE_CHARS else line[:MAX_LINE_CHARS] + " ..."
+
+
+@dataclass
+class _Cluster:
+    example: str
+    first_line: int
+    last_line: int = 0
+    count: int = 0
+    is_error: bool = False
+
+
+@dataclass
+class _ErrorWindow:
+    line_number: int
+    before: List[Tuple[int, str]]
+    after: List[Tuple[int, str]] = field(default_factory=list)
+
+
+class LogDigest:
+    """One streaming pass over a log; render() then fits the findings into a token budget"""
+
+    def __init__(self, context_lines: int = 5, max_clusters: int = 5000):
+        self.context_lines = context_lines
+        self.max_clusters = max_clusters
+        self.total_lines = 0
+        self.total_chars = 0
+        self.error_lines = 0
+        self.clusters: "OrderedDict[str, _Cluster]" = OrderedDict()
+        self.traces: "OrderedDict[str, _Cluster]" = OrderedDict()
+        self.overflow_lines = 0
+        self.recent: Deque[Tuple[int, str]] = deque(maxlen=context_lines)
+        self.first_error: Optional[_ErrorWindow] = None
+        self.last_error: Optional[_ErrorWindow] = None
+        self._trace: List[str] = []
+        self._trace_start = 0
+
+    def _count(self, table: "OrderedDict[str, _Cluster]", key: str, example: str, line_number: int, is_error: bool):
+        cluster = table.get(key)
+        if cluster is None:
+            if len(table) >= self.max_clusters:
+                self.overflow_lines += 1
+                return
+            cluster = table[key] = _Cluster(example=example, first_line=line_number, is_error=is_error)
+        cluster.count += 1
+        cluster.last_line = line_number
+
+    def _end_trace(self):
+        if self._trace:
+            text = "\n".join(self._trace)
+            self._count(self.traces, template_of(text), text, self._trace_start, True)
+            self._trace = []
+
+    def feed(self, line: str):
+        self.total_lines += 1
+        self.total_chars += len(line) + 1
+        line_number = self.total_lines
+        line = _clip(line.rstrip("\r\n"))
+        is_error = bool(ERROR_PATTERN.search(line))
+
+        for window in (self.first_error, self.last_error):
+            if window is not None and line_number > window.line_number and len(window.after) < self.context_lines:
+                window.after.append((line_number, line))
+
+        if self._trace and TRACE_CONTINUATION.match(line) and len(self._trace) < MAX_TRACE_LINES:
+            self._trace.append(line)
+        elif self._trace and TRACE_CONTINUATION.match(line):
+            pass  # overlong trace: the head is kept
+        else:
+            if self._trace:
+                # The exception line closing a Python traceback belongs to it
+                closes_trace = self._trace[0].startswith("Traceback") and not line.startswith(" ")
+                if closes_trace:
+                    self._trace.append(line)
+                self._end_trace()
+                if closes_trace:
+                    self._track_error(line_number, line, is_error)
+                    self.recent.append((line_number, line))
+                    return
+            if TRACE_START.match(line):
+                self._trace = [line]
+                self._trace_start = line_number
+            else:
+                self._count(self.clusters, template_of(line), line, line_number, is_error)
+
+        self._track_error(line_number, line, is_error)
+        self.recent.append((line_number, line))
+
+    def _track_error(self, line_number: int, line: str, is_error: bool):
+        if not is_error:
+            return
+        self.error_lines += 1
+        window = _ErrorWindow(line_number, list(self.recent) + [(line_number, line)])
+        if self.first_error is None:
+            self.first_error = window
+        else:
+            self.last_error = window
+
+    def feed_all(self, lines: Iterable[str]) -> "LogDigest":
+        for line in lines:
+            self.feed(line)
+        self._end_trace()
+        return self
+
+    def render(self, target_tokens: int) -> str:
+        """Digest text: summary, error context, repeated traces, then line templates by importance"""
+        header = (
+            f"[Log digest: {self.total_lines} lines, {len(self.clusters)} distinct line templates, "
+            f"{len(self.traces)} distinct stack traces, {self.error_lines} error lines; "
+            f"repeats shown once with xN counts and line ranges]"
+        )
+        parts = [header]
+        used = estimate_tokens(header)
+
+        def add(text: str) -> bool:
+            nonlocal used
+            cost = estimate_tokens(text) + 1
+            if used + cost > target_tokens:
+                return False
+            parts.append(text)
+            used += cost
+            return True
+
+        for title, window in (("First error", self.first_error), ("Last error", self.last_error)):
+            if window is None:
+                continue
+            lines = "\n".join(f"{number}: {text}" for number, text in window.before + window.after)
+            add(f"\n--- {title} (line {window.line_number}) with context ---\n{lines}")
+
+        def ranked(table: "OrderedDict[str, _Cluster]") -> List[_Cluster]:
+            return sorted(table.values(), key=lambda c: (not c.is_error, -c.count, c.first_line))
+
+        def label(cluster: _Cluster) -> str:
+            if cluster.count == 1:
+                return f"[line {cluster.first_line}]"
+            return f"[x{cluster.count}, lines {cluster.first_line}-{cluster.last_line}]"
+
+        if self.traces and add("\n--- Stack traces ---"):
+            for cluster in ranked(self.traces):
+                if not add(f"{label(cluster)}\n{cluster.example}"):
+                    break
+
+        omitted = 0
+        if add("\n--- Line templates (errors first, then by frequency) ---"):
+            clusters = ranked(self.clusters)
+            for position, cluster in enumerate(clusters):
+                if not add(f"{label(cluster)} {cluster.example}"):
+                    omitted = len(clusters) - position
+                    break
+        if omitted or self.overflow_lines:
+            parts.append(f"[{omitted} more templates and {self.overflow_lines} lines beyond the template limit omitted]")
+        return "\n".join(parts)
+
+
+def iter_file_lines(path: str) -> Iterator[str]:
+    """Lines of a (possibly huge) file through mmap, decoded leniently"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for raw in iter(mapped.readline, b""):
+                yield raw.decode("utf-8", errors="replace")
+
+
+class LogDigester:
+    """Decides when to digest claude_error_diagnosis input and where it comes from
+
+    Logs given inline are digested above threshold_chars. error_log_path
+    reads a file under one of allowed_roots (CLAUDE_LOG_ROOTS, os.pathsep
+    separated) so large logs never travel through MCP arguments. With no
+    roots configured, error_log_path is refused.
+    """
+
+    def __init__(
+        self,
+        threshold_chars: Optional[int] = None,
+        target_tokens: Optional[int] = None,
+        context_lines: Optional[int] = None,
+        allowed_roots: Optional[List[str]] = None,
+    ):
+        self.threshold_chars = threshold_chars or int(os.getenv("CLAUDE_LOG_DIGEST_THRESHOLD", "20000"))
+        self.target_tokens = target_tokens or int(os.getenv("CLAUDE_LOG_DIGEST_TOKENS", "6000"))
+        self.context_lines = context_lines or int(os.getenv("CLAUDE_LOG_DIGEST_CONTEXT", "5"))
+        roots = allowed_roots or [root for root in os.getenv("CLAUDE_LOG_ROOTS", "").split(os.pathsep) if root]
+        self.allowed_roots = [os.path.realpath(root) for root in roots]
+        self.stats = {"digested": 0, "files_read": 0, "input_chars": 0, "output_chars": 0}
+
+    def resolve_path(self, path: str) -> str:
+        if not self.allowed_roots:
+            raise ValueError("error_log_path is disabled; set CLAUDE_LOG_ROOTS to the directories it may read")
+        real = os.path.realpath(os.path.expanduser(path))
+        if not any(real == root or real.startswith(root + os.sep) for root in self.allowed_roots):
+            raise ValueError(f"{path} is outside the allowed log directories ({os.pathsep.join(self.allowed_roots)})")
+        if not os.path.isfile(real):
+            raise ValueError(f"{path} is not a file")
+        return real
+
+    def prepare(self, arguments: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Return arguments with error_log replaced by a digest when needed, plus a note"""
+        path = arguments.get("error_log_path")
+        log = arguments.get("error_log")
+        if path:
+            lines: Iterable[str] = iter_file_lines(self.resolve_path(path))
+            self.stats["files_read"] += 1
+        elif isinstance(log, str):
+            if len(log) <= self.threshold_chars:
+                return arguments, None
+            lines = log.splitlines()
+        else:
+            raise ValueError("provide error_log or error_log_path")
+
+        digest = LogDigest(context_lines=self.context_lines).feed_all(lines)
+        text = digest.render(self.target_tokens)
+        if path and log:
+            text = f"{log}\n\n{text}"
+        self.stats["digested"] += 1
+        self.stats["input_chars"] += digest.total_chars
+        self.stats["output_chars"] += len(text)
+        prepared = {key: value for key, value in arguments.items() if key != "error_log_path"}
+        prepared["error_log"] = text
+        return prepared, f"log digest of {digest.total_lines} lines"
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["compression_ratio"] = round(stats["input_chars"] / stats["output_chars"], 1) if stats["output_chars"] else 0.0
+        return stats
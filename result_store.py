@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Spill store for large deployment tool results
+Big outputs are written to disk and served back as paged MCP resources via mmap
+"""
+
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+try:
+    import orjson
+except ImportError:  # optional: faster encoder when installed
+    orjson = None
+
+RESULT_SCHEME = "result"
+
+
+def encode_compact(result: Any) -> bytes:
+    """Compact JSON bytes, using orjson when available"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(result)
+        except TypeError:
+            pass  # types orjson rejects (e.g. big ints) fall back to json
+    return json.dumps(result, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _utf8_boundary(data, position: int) -> int:
+    """Move position back to the start of a UTF-8 character"""
+    while 0 < position < len(data) and (data[position] & 0xC0) == 0x80:
+        position -= 1
+    return position
+
+
+class ResultStore:
+    """Keeps spilled results as files; oldest are deleted past max_entries or ttl"""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        threshold_bytes: Optional[int] = None,
+        page_size: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ):
+        configured = directory or os.getenv("RESULT_STORE_DIR")
+        self.owns_directory = configured is None
+        self.directory = configured or tempfile.mkdtemp(prefix="mcp-results-")
+        os.makedirs(self.directory, exist_ok=True)
+        self.threshold_bytes = threshold_bytes or int(os.getenv("RESULT_INLINE_MAX_BYTES", str(64 * 1024)))
+        self.page_size = page_size or int(os.getenv("RESULT_PAGE_SIZE", str(256 * 1024)))
+        self.max_entries = max_entries or int(os.getenv("RESULT_STORE_MAX_ENTRIES", "100"))
+        self.ttl = ttl or float(os.getenv("RESULT_STORE_TTL", "3600"))
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {"inline": 0, "spilled": 0, "spilled_bytes": 0, "page_reads": 0, "evicted": 0}
+
+    def _path(self, result_id: str) -> str:
+        return os.path.join(self.directory, f"{result_id}.json")
+
+    def _evict(self):
+        now = time.time()
+        while self.entries:
+            result_id, entry = next(iter(self.entries.items()))
+            if len(self.entries) <= self.max_entries and now - entry["created_at"] < self.ttl:
+                break
+            self.entries.popitem(last=False)
+            try:
+                os.remove(self._path(result_id))
+            except FileNotFoundError:
+                pass
+            self.stats["evicted"] += 1
+
+    def render(self, tool_name: str, result: Any) -> str:
+        """Inline compact JSON for small results, or a summary pointing at a result:// URI"""
+        data = encode_compact(result)
+        if len(data) <= self.threshold_bytes:
+            self.stats["inline"] += 1
+            return data.decode("utf-8")
+
+        result_id = uuid.uuid4().hex
+        with open(self._path(result_id), "wb") as f:
+            f.write(data)
+        pages = (len(data) + self.page_size - 1) // self.page_size
+        self.entries[result_id] = {
+            "tool": tool_name,
+            "size": len(data),
+            "pages": pages,
+            "created_at": time.time(),
+        }
+        self.stats["spilled"] += 1
+        self.stats["spilled_bytes"] += len(data)
+        self._evict()
+
+        uri = f"{RESULT_SCHEME}://{result_id}"
+        preview = data[:_utf8_boundary(data, 1000)].decode("utf-8")
+        return (
+            f"Result of {tool_name} is {len(data)} bytes, stored as {uri} "
+            f"({pages} pages of {self.page_size} bytes).\n"
+            f"Read it with read_resource: {uri}?page=1 .. ?page={pages}, or {uri}?offset=<byte>&length=<bytes>.\n\n"
+            f"Preview:\n{preview}..."
+        )
+
+    def list_entries(self) -> List[Tuple[str, Dict[str, Any]]]:
+        self._evict()
+        return [(f"{RESULT_SCHEME}://{result_id}", entry) for result_id, entry in self.entries.items()]
+
+    def read(self, uri: str) -> str:
+        """Return one page (?page=N, 1-based, optional page_size) or byte range (?offset=&length=)"""
+        parsed = urlparse(uri)
+        result_id = parsed.netloc
+        entry = self.entries.get(result_id)
+        if parsed.scheme != RESULT_SCHEME or entry is None:
+            raise ValueError(f"Unknown or expired result: {uri}")
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+
+        if "offset" in query or "length" in query:
+            start = int(query.get("offset", 0))
+            length = int(query.get("length", self.page_size))
+        else:
+            page_size = int(query.get("page_size", self.page_size))
+            start = (int(query.get("page", 1)) - 1) * page_size
+            length = page_size
+        if start < 0 or length <= 0:
+            raise ValueError("offset/page must be >= 0 and length/page_size > 0")
+
+        self.stats["page_reads"] += 1
+        with open(self._path(result_id), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                start = _utf8_boundary(mapped, min(start, len(mapped)))
+                end = _utf8_boundary(mapped, min(start + length, len(mapped)))
+                return mapped[start:end].decode("utf-8")
+
+    def close(self):
+        if self.owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["stored_results"] = len(self.entries)
+        return stats
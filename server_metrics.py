@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Instrumentation for the Claude integrated deployment server
+Per-tool latency/tokens/errors, upstream TTFB and event loop lag,
+readable as JSON (MCP resource) or Prometheus text
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+# Prometheus histogram bucket bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class LatencyHistogram:
+    """Cumulative buckets for Prometheus plus a bounded sample window for percentiles"""
+
+    def __init__(self, window: int = 2048):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+
+    def percentiles(self) -> Dict[str, Optional[float]]:
+        if not self.samples:
+            return {"p50": None, "p95": None, "p99": None}
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return {
+            name: round(ordered[min(last, int(q * len(ordered)))], 4)
+            for name, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {"count": self.count, "sum": round(self.total, 4)}
+        summary.update(self.percentiles())
+        return summary
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _metric_name(value: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", value)
+
+
+class ServerMetrics:
+    """Collects per-tool metrics; other components register their get_stats() as sources"""
+
+    def __init__(self, prometheus_path: Optional[str] = None, write_interval: Optional[float] = None):
+        self.prometheus_path = prometheus_path or os.getenv("CLAUDE_METRICS_FILE")
+        self.write_interval = write_interval or float(os.getenv("CLAUDE_METRICS_INTERVAL", "15"))
+        self.lag_interval = float(os.getenv("CLAUDE_LOOP_LAG_INTERVAL", "0.5"))
+        self.started_at = time.time()
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.latency: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.upstream_ttfb: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.tokens: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.api_errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.routes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.fallbacks: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.loop_lag = LatencyHistogram()
+        self.max_loop_lag = 0.0
+        self.sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def add_source(self, name: str, get_stats: Callable[[], Dict[str, Any]]):
+        self.sources[name] = get_stats
+
+    def record_call(self, tool_name: str, seconds: float, outcome: str = "ok"):
+        self.calls[tool_name] += 1
+        self.outcomes[tool_name][outcome] += 1
+        # Failures (missing key, API errors, budget rejections) return early and would drag the percentiles down
+        if outcome == "ok":
+            self.latency[tool_name].observe(seconds)
+
+    def record_ttfb(self, tool_name: str, seconds: float):
+        self.upstream_ttfb[tool_name].observe(seconds)
+
+    def record_usage(self, tool_name: str, usage: Dict[str, Any]):
+        for key, value in usage.items():
+            if key.endswith("_tokens") and isinstance(value, int):
+                self.tokens[tool_name][key] += value
+
+    def record_api_error(self, tool_name: str, status: Any):
+        self.api_errors[tool_name][str(status)] += 1
+
+    def record_route(self, tool_name: str, model: str, reason: str):
+        self.routes[tool_name][f"{model}|{reason}"] += 1
+
+    def record_fallback(self, tool_name: str, from_model: str, to_model: str):
+        self.fallbacks[tool_name][f"{from_model}|{to_model}"] += 1
+
+    async def _monitor_loop_lag(self):
+        """Sleep a fixed interval and measure how late the loop wakes us up"""
+        while True:
+            expected = time.monotonic() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, time.monotonic() - expected)
+            self.loop_lag.observe(lag)
+            self.max_loop_lag = max(self.max_loop_lag, lag)
+
+    async def _write_periodically(self):
+        while True:
+            await asyncio.sleep(self.write_interval)
+            self.write_prometheus()
+
+    def start(self):
+        """Start the loop lag monitor and, if a file is configured, the Prometheus writer"""
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.ensure_future(self._monitor_loop_lag()))
+        if self.prometheus_path:
+            self._tasks.append(asyncio.ensure_future(self._write_periodically()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.write_prometheus()
+
+    def _error_ratio(self, tool_name: str) -> float:
+        calls = self.calls.get(tool_name, 0)
+        if not calls:
+            return 0.0
+        return round(1 - self.outcomes[tool_name].get("ok", 0) / calls, 4)
+
+    def snapshot(self) -> Dict[str, Any]:
+        tools = {}
+        for tool_name in sorted(set(self.calls) | set(self.upstream_ttfb) | set(self.tokens) | set(self.api_errors) | set(self.routes)):
+            tools[tool_name] = {
+                "calls": self.calls.get(tool_name, 0),
+                "outcomes": dict(self.outcomes.get(tool_name, {})),
+                "error_ratio": self._error_ratio(tool_name),
+                "latency_seconds": self.latency[tool_name].summary() if tool_name in self.latency else None,
+                "upstream_ttfb_seconds": self.upstream_ttfb[tool_name].summary() if tool_name in self.upstream_ttfb else None,
+                "tokens": dict(self.tokens.get(tool_name, {})),
+                "api_errors_by_status": dict(self.api_errors.get(tool_name, {})),
+                "routes": {key.replace("|", " via "): count for key, count in self.routes.get(tool_name, {}).items()},
+                "model_fallbacks": {key.replace("|", " -> "): count for key, count in self.fallbacks.get(tool_name, {}).items()},
+            }
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "event_loop_lag_seconds": {**self.loop_lag.summary(), "max": round(self.max_loop_lag, 4)},
+            "tools": tools,
+            "components": {name: get_stats() for name, get_stats in self.sources.items()},
+        }
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def histogram(name: str, help_text: str, series: Dict[str, LatencyHistogram]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for tool_name, hist in sorted(series.items()):
+                tool = _label(tool_name)
+                for bound, count in zip(LATENCY_BUCKETS, hist.bucket_counts):
+                    lines.append(f'{name}_bucket{{tool="{tool}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{tool="{tool}",le="+Inf"}} {hist.count}')
+                lines.append(f'{name}_sum{{tool="{tool}"}} {hist.total}')
+                lines.append(f'{name}_count{{tool="{tool}"}} {hist.count}')
+
+        lines.append("# HELP mcp_tool_calls_total Tool calls by outcome")
+        lines.append("# TYPE mcp_tool_calls_total counter")
+        for tool_name, outcomes in sorted(self.outcomes.items()):
+            for outcome, count in sorted(outcomes.items()):
+                lines.append(f'mcp_tool_calls_total{{tool="{_label(tool_name)}",outcome="{_label(outcome)}"}} {count}')
+        histogram("mcp_tool_latency_seconds", "Latency of tool calls with outcome ok", self.latency)
+        histogram("claude_upstream_ttfb_seconds", "Time to first byte from the Claude API", self.upstream_ttfb)
+
+        lines.append("# HELP claude_tokens_total Tokens reported in the API usage block")
+        lines.append("# TYPE claude_tokens_total counter")
+        for tool_name, usage in sorted(self.tokens.items()):
+            for kind, count in sorted(usage.items()):
+                lines.append(f'claude_tokens_total{{tool="{_label(tool_name)}",kind="{_label(kind)}"}} {count}')
+
+        lines.append("# HELP claude_api_errors_total Claude API errors by HTTP status")
+        lines.append("# TYPE claude_api_errors_total counter")
+        for tool_name, statuses in sorted(self.api_errors.items()):
+            for status, count in sorted(statuses.items()):
+                lines.append(f'claude_api_errors_total{{tool="{_label(tool_name)}",status="{_label(status)}"}} {count}')
+
+        lines.append("# HELP claude_route_decisions_total Model routing decisions")
+        lines.append("# TYPE claude_route_decisions_total counter")
+        for tool_name, routes in sorted(self.routes.items()):
+            for key, count in sorted(routes.items()):
+                model, reason = key.split("|", 1)
+                lines.append(f'claude_route_decisions_total{{tool="{_label(tool_name)}",model="{_label(model)}",reason="{_label(reason)}"}} {count}')
+
+        lines.append("# HELP claude_model_fallbacks_total Fallbacks to another model after overload errors")
+        lines.append("# TYPE claude_model_fallbacks_total counter")
+        for tool_name, fallbacks in sorted(self.fallbacks.items()):
+            for key, count in sorted(fallbacks.items()):
+                from_model, to_model = key.split("|", 1)
+                lines.append(f'claude_model_fallbacks_total{{tool="{_label(tool_name)}",from_model="{_label(from_model)}",to_model="{_label(to_model)}"}} {count}')
+
+        histogram("event_loop_lag_seconds", "Event loop wake-up delay", {"event_loop": self.loop_lag})
+
+        # Numeric component stats (cache, pool, scheduler, ...) as gauges
+        for source, get_stats in sorted(self.sources.items()):
+            for key, value in sorted(get_stats().items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"{_metric_name(source)}_{_metric_name(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        """Atomically replace the Prometheus text file, if one is configured"""
+        if not self.prometheus_path:
+            return
+        temp_path = f"{self.prometheus_path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, self.prometheus_path)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Message Batches round trip against benchmarks/mock_anthropic_server.py
+Submits a batch, polls it, reads the results, and checks they landed in the response cache
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+from mock_anthropic_server import MockAnthropicServer
+
+CONFIGS = [
+    {"custom_id": "web", "config_content": "server:\n  workers: 2\n", "config_type": "yaml"},
+    {"custom_id": "db", "config_content": "max_connections = 10\n", "config_type": "ini"},
+]
+
+
+async def run_batch_round_trip(state_dir):
+    mock = MockAnthropicServer(first_byte_latency=0.05, latency_jitter=0, output_tokens=20)
+    url = await mock.start()
+    os.environ.update({
+        "ANTHROPIC_API_KEY": "test-key",
+        "ANTHROPIC_API_URL": url,
+        "CLAUDE_CACHE_PATH": os.path.join(state_dir, "responses.sqlite3"),
+        "CLAUDE_BATCH_DIR": os.path.join(state_dir, "batches"),
+        "AUDIT_LOG_DIR": "off",
+    })
+    from claude_integrated_deployment import ClaudeIntegratedDeploymentServer
+
+    server = ClaudeIntegratedDeploymentServer()
+    try:
+        content, outcome = await server.execute_tool(
+            "claude_batch_submit", {"tool": "claude_optimize_config", "items": CONFIGS}
+        )
+        assert outcome == "ok", content[0].text
+        submitted = json.loads(content[0].text)
+        assert submitted["submitted"] == 2 and not submitted["rejected"], submitted
+        batch_id = submitted["batch_id"]
+
+        for _ in range(50):
+            content, _ = await server.execute_tool("claude_batch_status", {"batch_id": batch_id})
+            if json.loads(content[0].text)["processing_status"] == "ended":
+                break
+            await asyncio.sleep(0.05)
+        else:
+            raise AssertionError("batch never ended")
+
+        content, outcome = await server.execute_tool("claude_batch_results", {"batch_id": batch_id})
+        assert outcome == "ok", content[0].text
+        report = json.loads(content[0].text)
+        assert report["total"] == 2
+        results = {item["custom_id"]: item for item in report["results"]}
+        assert {item["status"] for item in results.values()} == {"succeeded"}
+
+        # Every result is in the response cache under the key recorded at submission
+        with open(os.path.join(state_dir, "batches", f"{batch_id}.json")) as f:
+            manifest = json.load(f)["requests"]
+        for custom_id, known in manifest.items():
+            assert await server.response_cache.get(known["cache_key"]) == results[custom_id]["text"]
+        assert server.batch_manager.get_stats()["results_cached"] == 2
+
+        # ... so resubmitting the same items sends nothing
+        content, _ = await server.execute_tool(
+            "claude_batch_submit", {"tool": "claude_optimize_config", "items": CONFIGS}
+        )
+        resubmitted = json.loads(content[0].text)
+        assert resubmitted["submitted"] == 0 and sorted(resubmitted["already_cached"]) == ["db", "web"], resubmitted
+        assert len(mock.batches) == 1
+    finally:
+        await server.http_client.close()
+        await mock.stop()
+
+
+def test_batch_results_are_cached(tmp_path, monkeypatch):
+    # Recorded so the values set by the round trip are undone afterwards
+    for name in ("ANTHROPIC_API_KEY", "ANTHROPIC_API_URL", "CLAUDE_CACHE_PATH", "CLAUDE_BATCH_DIR", "AUDIT_LOG_DIR"):
+        monkeypatch.setenv(name, "")
+    asyncio.run(run_batch_round_trip(str(tmp_path)))
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        asyncio.run(run_batch_round_trip(state_dir))
+    print("Batch round trip OK")
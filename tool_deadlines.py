@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Per-call deadlines for MCP tool calls
+Each call gets a timeout from its timeout_seconds argument or a per-tool default
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Dict, Optional
+
+TIMEOUT_ARGUMENT = "timeout_seconds"
+
+# Schema fragment added to every tool's inputSchema
+TIMEOUT_PROPERTY = {
+    "type": "number",
+    "description": "Deadline for this call in seconds; the call is aborted when it expires (default: per-tool)",
+}
+
+# Seconds; chunked reviews and planning produce long answers, batch submits upload many requests
+DEFAULT_TOOL_TIMEOUTS = {
+    "claude_code_review": 300,
+    "claude_deployment_planning": 240,
+    "claude_error_diagnosis": 180,
+    "claude_optimize_config": 180,
+    "claude_batch_submit": 120,
+    "claude_batch_status": 30,
+    "claude_batch_results": 120,
+}
+
+
+class ToolDeadlineExceeded(Exception):
+    pass
+
+
+class ToolDeadlines:
+    """Resolves and enforces call deadlines; overrides come from the TOOL_TIMEOUTS JSON mapping
+
+    Tools without an entry use default_timeout (TOOL_DEFAULT_TIMEOUT). A
+    caller's timeout_seconds may shorten the deadline but never extends it
+    beyond max_timeout (TOOL_MAX_TIMEOUT).
+    """
+
+    def __init__(
+        self,
+        default_timeout: Optional[float] = None,
+        tool_timeouts: Optional[Dict[str, float]] = None,
+        max_timeout: Optional[float] = None,
+    ):
+        self.default_timeout = default_timeout or float(os.getenv("TOOL_DEFAULT_TIMEOUT", "600"))
+        self.max_timeout = max_timeout or float(os.getenv("TOOL_MAX_TIMEOUT", "1800"))
+        self.tool_timeouts = dict(DEFAULT_TOOL_TIMEOUTS)
+        self.tool_timeouts.update(json.loads(os.getenv("TOOL_TIMEOUTS", "{}")))
+        self.tool_timeouts.update(tool_timeouts or {})
+        self.in_flight = 0
+        self.stats = {"calls": 0, "timeouts": 0, "cancelled": 0}
+
+    def timeout_for(self, tool_name: str, arguments: Dict[str, Any]) -> float:
+        requested = arguments.get(TIMEOUT_ARGUMENT)
+        if isinstance(requested, (int, float)) and not isinstance(requested, bool) and requested > 0:
+            return min(float(requested), self.max_timeout)
+        return float(self.tool_timeouts.get(tool_name, self.default_timeout))
+
+    async def run(self, tool_name: str, timeout: float, call: Awaitable[Any]) -> Any:
+        """Await call, cancelling it when the deadline passes or the caller is cancelled
+
+        Cancellation reaches everything the call is awaiting: the upstream HTTP
+        request is aborted and its scheduler slot released, queued executor
+        jobs are dropped.
+        """
+        self.stats["calls"] += 1
+        self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            return await asyncio.wait_for(call, timeout)
+        except asyncio.TimeoutError:
+            if loop.time() - started < timeout:
+                raise  # a timeout raised by the call itself, e.g. a socket read timeout
+            self.stats["timeouts"] += 1
+            raise ToolDeadlineExceeded(f"{tool_name} exceeded its {timeout:g}s deadline and was aborted")
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["in_flight"] = self.in_flight
+        stats["default_timeout"] = self.default_timeout
+        return stats
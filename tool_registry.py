@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Tool registry for the MCP deployment server
+Builds Tool definitions and argument validators once instead of per request
+"""
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from mcp.types import Tool
+
+ToolHandler = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+Validator = Callable[[Dict[str, Any]], List[str]]
+
+JSON_TYPES: Dict[str, Tuple[type, ...]] = {
+    "string": (str,),
+    "boolean": (bool,),
+    "integer": (int,),
+    "number": (int, float),
+    "object": (dict,),
+    "array": (list, tuple),
+    "null": (type(None),),
+}
+
+
+def compile_validator(schema: Dict[str, Any]) -> Validator:
+    """Turn a flat object JSON schema into a fast argument checker
+
+    Covers what the tool schemas use: required keys, per-property
+    type (single or list) and enum. Returns a list of error messages.
+    """
+    required = tuple(schema.get("required", ()))
+    checks = []
+    for prop, prop_schema in schema.get("properties", {}).items():
+        declared = prop_schema.get("type")
+        type_names = [declared] if isinstance(declared, str) else list(declared or [])
+        allowed = tuple(t for name in type_names for t in JSON_TYPES.get(name, ()))
+        # bool is an int subclass; only accept it where boolean is declared
+        reject_bool = "boolean" not in type_names
+        enum = tuple(prop_schema["enum"]) if "enum" in prop_schema else None
+        checks.append((prop, allowed, reject_bool, " or ".join(type_names), enum))
+    allow_extra = schema.get("additionalProperties", True) is not False
+    known = {prop for prop, *_ in checks}
+
+    def validate(arguments: Dict[str, Any]) -> List[str]:
+        if not isinstance(arguments, dict):
+            return ["arguments must be an object"]
+        errors = [f"missing required argument '{key}'" for key in required if key not in arguments]
+        for prop, allowed, reject_bool, type_label, enum in checks:
+            if prop not in arguments:
+                continue
+            value = arguments[prop]
+            if allowed and (not isinstance(value, allowed) or (reject_bool and isinstance(value, bool))):
+                errors.append(f"'{prop}' must be {type_label}")
+            elif enum is not None and value not in enum:
+                errors.append(f"'{prop}' must be one of {list(enum)}")
+        if not allow_extra:
+            errors.extend(f"unexpected argument '{key}'" for key in arguments if key not in known)
+        return errors
+
+    return validate
+
+
+@dataclass
+class ToolSpec:
+    name: str
+    tool: Tool
+    handler: ToolHandler
+    validate: Validator
+
+
+class ToolRegistry:
+    """Name -> handler map with a cached list_tools payload
+
+    Static tools (the claude_* tools) are registered once. Deployment tools
+    come from get_deployment_manager().get_available_tools(); their set is
+    re-fingerprinted at most every refresh_interval seconds and the cached
+    payload is rebuilt only when the fingerprint changes. Looking up a
+    static tool never builds the deployment manager, and a manager that
+    cannot be imported counts as no deployment tools.
+    """
+
+    def __init__(
+        self,
+        get_deployment_manager: Callable[[], Any],
+        deployment_handler: ToolHandler,
+        refresh_interval: Optional[float] = None,
+        common_properties: Optional[Dict[str, Any]] = None,
+    ):
+        self.get_deployment_manager = get_deployment_manager
+        self.deployment_handler = deployment_handler
+        # Properties every tool accepts on top of its own (e.g. timeout_seconds)
+        self.common_properties = dict(common_properties or {})
+        self.refresh_interval = refresh_interval if refresh_interval is not None else float(
+            os.getenv("DEPLOYMENT_TOOLS_REFRESH_INTERVAL", "30")
+        )
+        self.static_specs: Dict[str, ToolSpec] = {}
+        self.deployment_specs: Dict[str, ToolSpec] = {}
+        self.specs: Dict[str, ToolSpec] = {}
+        self.deployment_fingerprint: Optional[str] = None
+        self.checked_at = 0.0
+        self._tools_payload: Optional[List[Tool]] = None
+        self.stats = {"rebuilds": 0, "list_calls": 0, "manager_unavailable": 0}
+
+    def register(self, name: str, description: str, input_schema: Dict[str, Any], handler: ToolHandler):
+        input_schema = {**input_schema, "properties": {**input_schema.get("properties", {}), **self.common_properties}}
+        self.static_specs[name] = ToolSpec(
+            name=name,
+            tool=Tool(name=name, description=description, inputSchema=input_schema),
+            handler=handler,
+            validate=compile_validator(input_schema),
+        )
+        self._tools_payload = None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Re-read the deployment tool set; returns True if the payload was rebuilt"""
+        now = time.monotonic()
+        if not force and self._tools_payload is not None and now - self.checked_at < self.refresh_interval:
+            return False
+        self.checked_at = now
+
+        try:
+            available_tools = self.get_deployment_manager().get_available_tools()
+        except ImportError:
+            # tools.deployment_tools is not on this machine (e.g. CI): the claude_* tools still work
+            self.stats["manager_unavailable"] += 1
+            available_tools = {}
+        fingerprint = hashlib.sha256(
+            json.dumps(available_tools, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        if fingerprint == self.deployment_fingerprint and self._tools_payload is not None:
+            return False
+
+        self.deployment_fingerprint = fingerprint
+        self.deployment_specs = {}
+        for tool_name, tool_info in available_tools.items():
+            input_schema = {
+                "type": "object",
+                "properties": {**tool_info.get("parameters", {}), **self.common_properties},
+            }
+            self.deployment_specs[tool_name] = ToolSpec(
+                name=tool_name,
+                tool=Tool(name=tool_name, description=tool_info["description"], inputSchema=input_schema),
+                handler=self.deployment_handler,
+                validate=compile_validator(input_schema),
+            )
+
+        # Deployment tools first, then the static tools, as list_tools has always returned them
+        self.specs = {**self.deployment_specs, **self.static_specs}
+        self._tools_payload = [spec.tool for spec in self.specs.values()]
+        self.stats["rebuilds"] += 1
+        return True
+
+    def list_tools(self) -> List[Tool]:
+        self.stats["list_calls"] += 1
+        self.refresh()
+        return self._tools_payload
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        spec = self.static_specs.get(name)
+        if spec is not None:
+            return spec
+        if self._tools_payload is None:
+            self.refresh()
+        return self.specs.get(name)